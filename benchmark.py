@@ -0,0 +1,268 @@
+"""
+性能基准测试
+在无界面的 Qt 环境 (QT_QPA_PLATFORM=offscreen) 中依次计时打开数据库、读取结构、显示第一页、
+滚动到表的中间、排序、过滤、批量保存编辑和导出，结果写入 JSON 文件，便于比较不同版本之间的性能变化
+--headless 时不导入 PyQt5，直接通过 DBConnector 执行同样的操作（命令行 python -m cli bench 使用这种方式）
+
+    python benchmark.py bench.db --generate --orders 10000000 --seed 1 --output results.json
+    python benchmark.py bench.db --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from db_connector import DBConnector, build_filter, quote_identifier
+from edit_buffer import EditBuffer
+from exporter import EXPORT_FORMATS, export_query, table_query
+from generate_test_data import create_test_database
+
+OPERATIONS = ("open", "schema_load", "first_page", "scroll_middle", "sort", "filter", "edit_flush", "export")
+
+
+def _timed(timings, name, func):
+    start = time.perf_counter()
+    value = func()
+    timings.setdefault(name, []).append(time.perf_counter() - start)
+    return value
+
+
+def _count_rows(db, table_name):
+    with db.pool.reading() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+
+
+def _time_edit_flush(db, options, timings):
+    # 批量修改一列，在外层事务中保存后回滚，保持数据库不变
+    table_name = options["table"]
+    key_columns = db.get_row_key_columns(table_name)
+    keys, _, _ = db.fetch_page(table_name, key_columns, limit=options["edit_rows"])
+    buffer = EditBuffer()
+    for i, key in enumerate(keys):
+        buffer.set_cell(table_name, key_columns, key, options["edit_column"], f"benchmark-{i}")
+    with db.writing():
+        db.conn.execute("BEGIN")
+        try:
+            _timed(timings, "edit_flush", lambda: buffer.flush(db))
+        finally:
+            db.rollback()
+
+
+def _time_export(db, options, timings):
+    fd, export_path = tempfile.mkstemp(suffix="." + options["export_format"])
+    os.close(fd)
+    try:
+        with db.pool.reading() as conn:
+            _timed(timings, "export", lambda: export_query(
+                conn, table_query(options["table"]), export_path, options["export_format"]))
+    finally:
+        os.remove(export_path)
+
+
+def run_once_headless(db_path, options, timings):
+    """不使用界面，直接通过 DBConnector 执行一轮与 run_once 相同的操作，返回表的行数"""
+    table_name = options["table"]
+    db = _timed(timings, "open", lambda: DBConnector(db_path))
+    try:
+        if table_name not in db.get_tables():
+            raise SystemExit(f"表 {table_name} 不存在")
+
+        def load_schema():
+            db.invalidate_schema()
+            for object_type, name, _ in db.get_schema_objects():
+                if object_type in ("table", "view"):
+                    db.get_table_schema(name)
+        _timed(timings, "schema_load", load_schema)
+        total_rows = _count_rows(db, table_name)
+        key_columns = db.get_row_key_columns(table_name)
+        page_size = 500  # 与 PagedTableModel 的默认页大小相同
+
+        _timed(timings, "first_page", lambda: db.fetch_page(table_name, key_columns, limit=page_size))
+
+        def scroll_middle():
+            # 与界面中逐页 fetchMore 一样按键集读取到中间（界面中不统计行数，见 run_once）
+            after = None
+            for _ in range(total_rows // 2 // page_size + 1):
+                keys, rows, after = db.fetch_page(table_name, key_columns, after=after, limit=page_size)
+                if len(rows) < page_size:
+                    break
+        _timed(timings, "scroll_middle", scroll_middle)
+        _timed(timings, "sort", lambda: db.fetch_page(table_name, key_columns, limit=page_size,
+                                                      order_by=options["sort_column"], descending=True))
+        _timed(timings, "filter", lambda: db.fetch_page(
+            table_name, key_columns, limit=page_size,
+            filters=[build_filter(options["filter_column"], options["filter_text"])]))
+        _time_edit_flush(db, options, timings)
+        _time_export(db, options, timings)
+        return total_rows
+    finally:
+        db.close()
+
+
+def run_once(app, db_path, options, timings):
+    """按顺序执行一轮所有操作，把各操作的耗时（秒）追加到 timings 中，返回表的行数"""
+    from PyQt5.QtWidgets import QAbstractItemView
+    from dbviewer import DBViewer
+
+    table_name = options["table"]
+    viewer = DBViewer()
+    viewer.resize(1200, 800)
+    viewer.show()
+    try:
+        db = _timed(timings, "open", lambda: DBConnector(db_path))
+        viewer.open_workspace(db)
+        if table_name not in db.get_tables():
+            raise SystemExit(f"表 {table_name} 不存在")
+
+        def load_schema():
+            # 与打开数据库后一样：读取 sqlite_master 建树，并读取各表的结构
+            db.invalidate_schema()
+            viewer.refresh_tree()
+            for object_type, name, _ in db.get_schema_objects():
+                if object_type in ("table", "view"):
+                    db.get_table_schema(name)
+        _timed(timings, "schema_load", load_schema)
+        viewer.stop_count_worker()  # 后台行数统计会干扰后续计时
+
+        total_rows = _count_rows(db, table_name)
+
+        def first_page():
+            viewer.current_table = table_name
+            viewer.display_table_data(table_name)
+            # 停止后台统计行数：得到总行数后跳到中间改为按 OFFSET 读取，
+            # scroll_middle 的耗时会取决于统计是否已经完成，也与 --headless 的按键集逐页读取不可比
+            viewer.stop_table_count_worker()
+            app.processEvents()
+        _timed(timings, "first_page", first_page)
+        model = viewer.model
+
+        def scroll_middle():
+            # 与 --headless 相同：通过 fetchMore 按键集逐页加载，直到中间的行
+            middle = total_rows // 2
+            while model.rowCount() <= middle and model.canFetchMore():
+                model.fetchMore()
+            viewer.table.scrollTo(model.index(min(middle, model.rowCount() - 1), 0),
+                                  QAbstractItemView.PositionAtCenter)
+            app.processEvents()
+        _timed(timings, "scroll_middle", scroll_middle)
+
+        def sort():
+            model.set_query(order_by=options["sort_column"], descending=True)
+            app.processEvents()
+        _timed(timings, "sort", sort)
+
+        def apply_filter():
+            model.set_query(filters=[build_filter(options["filter_column"], options["filter_text"])])
+            app.processEvents()
+        _timed(timings, "filter", apply_filter)
+
+        _time_edit_flush(db, options, timings)
+        _time_export(db, options, timings)
+        return total_rows
+    finally:
+        viewer.close()
+        viewer.deleteLater()
+        app.processEvents()
+
+
+def run_benchmarks(db_path, table="orders", repeat=3, sort_column="total_amount", filter_column="status",
+                   filter_text="=已完成", edit_column="status", edit_rows=10000, export_format="csv",
+                   headless=False):
+    """执行 repeat 轮基准测试，返回可写入 JSON 的结果字典；headless 为 True 时不导入 PyQt5"""
+    options = {"table": table, "repeat": repeat, "sort_column": sort_column, "filter_column": filter_column,
+               "filter_text": filter_text, "edit_column": edit_column, "edit_rows": edit_rows,
+               "export_format": export_format, "headless": headless}
+    timings = {}
+    total_rows = 0
+    if headless:
+        for _ in range(repeat):
+            total_rows = run_once_headless(db_path, options, timings)
+    else:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv)
+        for _ in range(repeat):
+            total_rows = run_once(app, db_path, options, timings)
+
+    results = {}
+    for name in OPERATIONS:
+        runs = [seconds * 1000 for seconds in timings.get(name, [])]
+        if runs:
+            results[name] = {"runs_ms": [round(ms, 3) for ms in runs], "min_ms": round(min(runs), 3),
+                             "median_ms": round(statistics.median(runs), 3), "max_ms": round(max(runs), 3)}
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "database": {"path": os.path.abspath(db_path), "size_bytes": os.path.getsize(db_path),
+                     "table": table, "rows": total_rows},
+        "options": options,
+        "results": results,
+    }
+
+
+def compare_results(baseline, current, threshold=1.2):
+    """返回中位数比基准慢 threshold 倍以上的操作 [(操作, 基准 ms, 当前 ms)]"""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before and before["median_ms"] > 0 and result["median_ms"] > before["median_ms"] * threshold:
+            regressions.append((name, before["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DB-Viewer-Editor 性能基准测试")
+    parser.add_argument("db_path", nargs="?", default="benchmark.db", help="测试用的数据库文件")
+    parser.add_argument("--generate", action="store_true", help="先用 generate_test_data 重新生成数据库")
+    parser.add_argument("--scale", type=float, default=1000, help="生成数据时的数据量倍数")
+    parser.add_argument("--orders", type=int, help="生成数据时的订单数，覆盖 --scale")
+    parser.add_argument("--seed", type=int, default=1, help="生成数据时的随机数种子")
+    parser.add_argument("--table", default="orders", help="测试的表")
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数，结果取中位数")
+    parser.add_argument("--sort-column", default="total_amount")
+    parser.add_argument("--filter-column", default="status")
+    parser.add_argument("--filter-text", default="=已完成", help="过滤框中的文本，语法与界面相同")
+    parser.add_argument("--edit-column", default="status")
+    parser.add_argument("--edit-rows", type=int, default=10000, help="批量保存的单元格数")
+    parser.add_argument("--export-format", default="csv", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("--output", default="benchmark_results.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前的结果 JSON 比较，有操作变慢时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=1.2, help="判定变慢的倍数")
+    parser.add_argument("--headless", action="store_true", help="不使用界面，直接通过 DBConnector 计时")
+    args = parser.parse_args(argv)
+
+    if args.generate or not os.path.exists(args.db_path):
+        create_test_database(args.db_path, scale=args.scale, orders=args.orders, seed=args.seed)
+
+    report = run_benchmarks(args.db_path, table=args.table, repeat=args.repeat, sort_column=args.sort_column,
+                            filter_column=args.filter_column, filter_text=args.filter_text,
+                            edit_column=args.edit_column, edit_rows=args.edit_rows,
+                            export_format=args.export_format, headless=args.headless)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{report['database']['table']}: {report['database']['rows']} 行")
+    for name, result in report["results"].items():
+        print(f"{name:<14}{result['median_ms']:>12.1f} ms (最小 {result['min_ms']:.1f}, 最大 {result['max_ms']:.1f})")
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        for name, before, after in regressions:
+            print(f"变慢: {name} {before:.1f} ms -> {after:.1f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
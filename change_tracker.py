@@ -0,0 +1,247 @@
+import os
+import re
+import socket
+import sqlite3
+import zlib
+from collections import namedtuple
+from db_connector import DBConnector, quote_identifier, schema_prefix
+
+# 一次读取到的变化：修改过（或新增）的行的键、删除的行的键、新增的行数、修改的（不含新增的）行数；键为单元素元组
+TableChanges = namedtuple('TableChanges', 'updated deleted inserted modified')
+
+CHANGELOG_TABLE = "_dbviewer_changelog"
+TRIGGER_PREFIX = "_dbviewer_watch_"
+
+# 本进程的标识（主机名的 CRC32 加进程号），写在触发器和日志表的名字中：
+# 同一个库可能同时被多个程序监视，每个程序只删除自己的、或创建它的进程已经退出的对象
+OWNER = f"{zlib.crc32(socket.gethostname().encode()):08x}p{os.getpid()}"
+_OWNER_PATTERN = re.compile(r"[0-9a-f]{8}p\d+(?=_|$)")
+
+_CHANGELOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {prefix}{log} (
+    seq INTEGER PRIMARY KEY,
+    tbl TEXT NOT NULL,
+    op TEXT NOT NULL,   -- 'insert'、'update' 或 'delete'
+    key                 -- 行的键（rowid 或单列主键），不声明类型以保留原来的类型
+)
+"""
+
+
+class ChangeTrackingUnavailable(Exception):
+    """不能用触发器跟踪这个表（只读打开、视图或多列主键），只能轮询 data_version"""
+
+
+def trigger_names(table_name, owner=OWNER):
+    return [f"{TRIGGER_PREFIX}{owner}_{table_name}_{op}" for op in ("insert", "update", "delete")]
+
+
+def changelog_name(owner=OWNER):
+    return f"{CHANGELOG_TABLE}_{owner}"
+
+
+def _object_owner(name, prefix):
+    """从监视对象的名字中取出创建它的进程的标识，不是本程序创建的对象返回 None"""
+    match = _OWNER_PATTERN.match(name, len(prefix))
+    return match.group(0) if name.startswith(prefix) and match else None
+
+
+def _process_alive(pid):
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会结束该进程，改用 OpenProcess 查询
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # 拒绝访问：进程存在但属于其他用户
+        code = ctypes.c_ulong()
+        try:
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        finally:
+            kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_gone(owner):
+    """创建对象的进程是否确定已经退出；其他主机上的进程无法判断，按仍在运行处理"""
+    host, _, pid = owner.partition("p")
+    return host == OWNER.partition("p")[0] and owner != OWNER and not _process_alive(int(pid))
+
+
+def _like_prefix(prefix):
+    return prefix.replace("_", "\\_") + "%"
+
+
+def _watch_triggers(conn, prefix):
+    """库中所有监视触发器的 (触发器名, 表名)"""
+    return conn.execute(
+        f"SELECT name, tbl_name FROM {prefix}sqlite_master WHERE type = 'trigger' AND name LIKE ? ESCAPE '\\'",
+        (_like_prefix(TRIGGER_PREFIX),)).fetchall()
+
+
+def _changelog_tables(conn, prefix):
+    return [name for name, in conn.execute(
+        f"SELECT name FROM {prefix}sqlite_master WHERE type = 'table' AND name LIKE ? ESCAPE '\\'",
+        (_like_prefix(CHANGELOG_TABLE + "_"),))]
+
+
+def remove_stale_objects(db, keep=()):
+    """
+    删除本程序停止监视时因有未提交的修改而留下的触发器，以及创建它们的进程已经退出（异常退出）的触发器和变化日志；
+    其他仍在运行的程序的触发器不动。keep 为本程序仍在监视的表名
+    返回删除的触发器数，写连接被占用或有未提交的修改时不做任何事，返回 None
+    """
+    if db.read_only:
+        return 0
+    prefix = schema_prefix(db.schema_name)
+    try:
+        with db.writing():
+            conn = db.conn
+            if conn.in_transaction:
+                return None
+            stale = []
+            own_triggers = False
+            for name, table in _watch_triggers(conn, prefix):
+                owner = _object_owner(name, TRIGGER_PREFIX)
+                if owner == OWNER and table not in keep:
+                    stale.append(name)
+                elif owner == OWNER:
+                    own_triggers = True
+                elif owner is not None and _owner_gone(owner):
+                    stale.append(name)
+            stale_logs = []
+            for name in _changelog_tables(conn, prefix):
+                owner = _object_owner(name, CHANGELOG_TABLE + "_")
+                if owner == OWNER and not own_triggers or owner is not None and _owner_gone(owner):
+                    stale_logs.append(name)
+            if not stale and not stale_logs:
+                return 0
+            for name in stale:
+                conn.execute(f"DROP TRIGGER IF EXISTS {prefix}{quote_identifier(name)}")
+            for name in stale_logs:
+                conn.execute(f"DROP TABLE IF EXISTS {prefix}{quote_identifier(name)}")
+            conn.commit()
+    except sqlite3.OperationalError:
+        return None  # 其他程序正在写入，下次再清除
+    db.invalidate_schema()
+    return len(stale)
+
+
+class ChangeTracker:
+    """
+    用触发器记录一个表的变化：表上的 AFTER INSERT/UPDATE/DELETE 触发器把行的键写入同一个库中的变化日志表，
+    read_changes() 只读取上次之后的日志，因此开销只与变化的行数有关
+    TEMP 触发器只对创建它的连接生效，看不到其他程序的修改，所以触发器建在数据库中，
+    其他程序的写入也会触发它们（每行多写一条日志）；close() 删除触发器，没有其他表在使用时也删除日志表
+    触发器和日志表的名字带有本进程的标识 (OWNER)，同时监视同一个库的多个程序互不影响
+    触发器的创建和删除都单独提交，不并入用户未提交的修改；有未提交的修改时不能开始监视，
+    停止监视时则把触发器留到 remove_stale_objects() 清除（程序异常退出时留下的触发器也由它在打开数据库时清除）
+    """
+
+    def __init__(self, db, table_name):
+        key_columns = db.get_row_key_columns(table_name)
+        if db.read_only:
+            raise ChangeTrackingUnavailable("数据库以只读方式打开")
+        if len(key_columns) != 1:
+            raise ChangeTrackingUnavailable("表没有 rowid 或单列主键")
+        self.db = db
+        self.table_name = table_name
+        self.key_columns = key_columns
+        self._prefix = schema_prefix(db.schema_name)
+        self._log = self._prefix + quote_identifier(changelog_name())
+        self.last_seq = 0
+        self._install()
+
+    def _install(self):
+        # 触发器和日志表必须在表所在的库中；触发器内的语句不能带库名，日志表按触发器所在的库解析
+        key = DBConnector._key_expr(self.key_columns[0])
+        table = quote_identifier(self.table_name)
+        literal = "'" + self.table_name.replace("'", "''") + "'"
+        log = quote_identifier(changelog_name())
+        insert_name, update_name, delete_name = (self._prefix + quote_identifier(name)
+                                                 for name in trigger_names(self.table_name))
+        statements = [
+            _CHANGELOG_SCHEMA.format(prefix=self._prefix, log=log),
+            f"CREATE TRIGGER IF NOT EXISTS {insert_name} AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {log} (tbl, op, key) VALUES ({literal}, 'insert', NEW.{key}); END",
+            # 键被修改时记为删除旧键、新增新键
+            f"CREATE TRIGGER IF NOT EXISTS {update_name} AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {log} (tbl, op, key) SELECT {literal}, 'delete', OLD.{key} WHERE OLD.{key} IS NOT NEW.{key}; "
+            f"INSERT INTO {log} (tbl, op, key) VALUES ({literal}, "
+            f"CASE WHEN OLD.{key} IS NEW.{key} THEN 'update' ELSE 'insert' END, NEW.{key}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {delete_name} AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {log} (tbl, op, key) VALUES ({literal}, 'delete', OLD.{key}); END",
+        ]
+        with self.db.writing():
+            if self.db.conn.in_transaction:
+                # 建触发器会并入未提交的事务，放弃修改时触发器也会消失
+                raise sqlite3.OperationalError("请先保存或回滚未提交的修改，再开始监视")
+            for statement in statements:
+                self.db.conn.execute(statement)
+            self.db.conn.commit()
+            # 只关心开始监视之后的变化（沿用之前停止监视时留下的日志表时跳过其中的旧记录）
+            self.last_seq = self.db.conn.execute(f"SELECT coalesce(max(seq), 0) FROM {self._log}").fetchone()[0]
+        self.db.invalidate_schema()
+
+    def read_changes(self):
+        """
+        读取上次之后的变化，返回 TableChanges；先新增后删除的行只算作删除
+        读取后尽量清除已读的日志（写连接被占用或有未提交的修改时留到下次）
+        """
+        updated, deleted, inserted = set(), set(), set()
+        with self.db.pool.reading() as conn:
+            for seq, op, key in conn.execute(
+                    f"SELECT seq, op, key FROM {self._log} WHERE seq > ? AND tbl = ? ORDER BY seq",
+                    (self.last_seq, self.table_name)):
+                key = (key,)
+                self.last_seq = seq
+                if op == "delete":
+                    updated.discard(key)
+                    inserted.discard(key)
+                    deleted.add(key)
+                else:
+                    deleted.discard(key)
+                    updated.add(key)
+                    if op == "insert":
+                        inserted.add(key)
+        if updated or deleted:
+            self._trim()
+        return TableChanges(updated, deleted, len(inserted), len(updated - inserted))
+
+    def _trim(self):
+        try:
+            with self.db.writing():
+                if self.db.conn.in_transaction:
+                    return  # 不能并入用户未提交的事务
+                # 保留最后读到的一条：日志为空时 seq 会从 1 重新编号，比 last_seq 小的新记录会被漏掉
+                self.db.conn.execute(f"DELETE FROM {self._log} WHERE tbl = ? AND seq < ?",
+                                     (self.table_name, self.last_seq))
+                self.db.conn.commit()
+        except sqlite3.OperationalError:
+            pass  # 其他程序正在写入，下次再清除
+
+    def close(self):
+        """
+        删除本程序的触发器，本程序没有其他表在监视时删除日志表，单独提交；返回是否已删除
+        有未提交的修改时不删除（DROP 会并入这些修改，回滚后触发器又回来），返回 False，
+        留下的触发器在之后调用 remove_stale_objects() 时清除
+        """
+        names = trigger_names(self.table_name)
+        with self.db.writing():
+            conn = self.db.conn
+            if conn.in_transaction:
+                return False
+            for name in names:
+                conn.execute(f"DROP TRIGGER IF EXISTS {self._prefix}{quote_identifier(name)}")
+            conn.execute(f"DELETE FROM {self._log} WHERE tbl = ?", (self.table_name,))
+            if not any(_object_owner(name, TRIGGER_PREFIX) == OWNER for name, _ in _watch_triggers(conn, self._prefix)):
+                conn.execute(f"DROP TABLE IF EXISTS {self._log}")
+            conn.commit()
+        self.db.invalidate_schema()
+        return True
@@ -0,0 +1,415 @@
+"""
+命令行工具：在没有图形界面的服务器上使用与界面相同的查询、导出、导入和统计逻辑
+只使用 DBConnector 等不依赖 PyQt5 的模块，启动时不会加载 Qt
+
+    python -m cli query data.db "SELECT * FROM orders WHERE status = ?" --param 已完成 --format csv
+    python -m cli query data.db "SELECT * FROM orders o JOIN archive.orders a USING (id)" --attach archive=old.db
+    python -m cli export data.db orders orders.jsonl
+    python -m cli import orders.csv data.db orders --fast
+    python -m cli stats data.db --exact
+    python -m cli maintain data.db vacuum
+    python -m cli diff yesterday.db data.db orders --patch orders_patch.sql
+    python -m cli bench data.db --repeat 5 --output results.json
+    python -m cli --timing query data.db "SELECT count(*) FROM orders"
+    python -m cli --read-only stats huge.db --exact
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import unicodedata
+from contextlib import nullcontext
+from connection_pool import ConnectionSettings
+from db_connector import DBConnector, format_size, is_read_only_query, quote_identifier
+from exporter import EXPORT_FORMATS, encode_value, export_query, format_from_path, table_query
+from maintenance import MAINTENANCE_TASKS, MaintenanceProgress, describe_stats, file_stats, run_maintenance
+from table_diff import PatchWriter, compare_tables
+
+OUTPUT_FORMATS = ("table", "csv", "json")
+
+
+def _display_width(text):
+    # 终端中全角字符（中文等）占两列
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
+
+
+def _cell_text(value, max_width):
+    if value is None:
+        text = "NULL"
+    elif isinstance(value, bytes):
+        text = f"<BLOB {format_size(len(value))}>"
+    else:
+        text = str(value).replace("\n", " ")
+    if _display_width(text) <= max_width:
+        return text
+    while _display_width(text) > max_width - 1:
+        text = text[:-1]
+    return text + "…"
+
+
+def write_table(out, headers, batches, max_width=40):
+    """
+    按对齐的文本表格输出；列宽由第一批数据决定，之后的批次直接按这个宽度输出，不需要先读完整个结果
+    超过 max_width 的值被截断
+    """
+    batches = iter(batches)
+    first = next(batches, [])
+    widths = [min(max_width, max([_display_width(str(name))] +
+                                 [_display_width(_cell_text(row[i], max_width)) for row in first]))
+              for i, name in enumerate(headers)]
+
+    def line(values):
+        cells = []
+        for value, width in zip(values, widths):
+            text = _cell_text(value, width)
+            pad = " " * (width - _display_width(text))
+            cells.append(pad + text if isinstance(value, (int, float)) else text + pad)
+        return " | ".join(cells).rstrip() + "\n"
+
+    out.write(line(headers))
+    out.write("-+-".join("-" * width for width in widths) + "\n")
+    rows = 0
+    for batch in _chain_first(first, batches):
+        out.writelines(line(row) for row in batch)
+        rows += len(batch)
+    return rows
+
+
+def _chain_first(first, batches):
+    yield first
+    yield from batches
+
+
+def write_csv(out, headers, batches):
+    writer = csv.writer(out)
+    writer.writerow(headers)
+    rows = 0
+    for batch in batches:
+        writer.writerows([encode_value(value) for value in row] for row in batch)
+        rows += len(batch)
+    return rows
+
+
+def write_json(out, headers, batches):
+    """输出为 JSON 数组，逐行写出，不在内存中拼接整个结果"""
+    out.write("[")
+    rows = 0
+    for batch in batches:
+        for row in batch:
+            out.write(",\n" if rows else "\n")
+            out.write(json.dumps({name: encode_value(value) for name, value in zip(headers, row)},
+                                 ensure_ascii=False))
+            rows += 1
+    out.write("\n]\n" if rows else "]\n")
+    return rows
+
+
+def write_rows(out, headers, batches, fmt="table"):
+    """按格式把分批的行流式写到 out，返回行数"""
+    if fmt == "csv":
+        return write_csv(out, headers, batches)
+    if fmt == "json":
+        return write_json(out, headers, batches)
+    return write_table(out, headers, batches)
+
+
+def _fetch_batches(cursor, batch_size=1000, limit=None):
+    fetched = 0
+    while limit is None or fetched < limit:
+        size = batch_size if limit is None else min(batch_size, limit - fetched)
+        batch = cursor.fetchmany(size)
+        if not batch:
+            break
+        fetched += len(batch)
+        yield batch
+
+
+def _parse_param(text):
+    # 与过滤框相同：能转换为数字的参数按数字绑定
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def attach_databases(db, specs):
+    """按 库名=路径 附加数据库，之后的查询可以用 库名.表名 跨库访问"""
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep or not name or not path:
+            raise SystemExit(f"--attach 的格式应为 库名=路径: {spec}")
+        if not os.path.exists(path):
+            raise SystemExit(f"数据库文件不存在: {path}")
+        settings = ConnectionSettings().fast_read_only(os.path.getsize(path)) if db.read_only else None
+        db.attach(path, name, settings)
+
+
+def cmd_query(db, args):
+    params = [_parse_param(value) for value in args.param]
+    if is_read_only_query(args.sql):
+        with db.pool.reading() as conn:
+            cursor = conn.execute(args.sql, params)
+            return _write_cursor(cursor, args)
+    if not args.write:
+        raise SystemExit("该语句会修改数据库，需要加上 --write")
+    with db.writing():
+        cursor = db.conn.execute(args.sql, params)
+        if cursor.description is None:
+            db.conn.commit()
+            print(f"已执行，影响 {cursor.rowcount} 行", file=sys.stderr)
+            return 0
+        rows = _write_cursor(cursor, args)  # 如 INSERT ... RETURNING
+        db.conn.commit()
+        return rows
+
+
+def _write_cursor(cursor, args):
+    if cursor.description is None:
+        return 0
+    headers = [description[0] for description in cursor.description]
+    rows = write_rows(sys.stdout, headers, _fetch_batches(cursor, limit=args.limit), args.format)
+    cursor.close()
+    return rows
+
+
+def cmd_export(db, args):
+    query = args.sql or table_query(args.table)
+    fmt = args.export_format or format_from_path(args.output)
+
+    def report(rows):
+        print(f"\r已导出 {rows} 行", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    with db.pool.reading() as conn:
+        rows = export_query(conn, query, args.output, fmt, progress=report)
+    print(file=sys.stderr)
+    print(f"已导出 {rows} 行到 {args.output}，用时 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+    return rows
+
+
+def cmd_stats(db, args):
+    """每个表的行数（估计值或 --exact 时的精确值）、列数和索引数，以及数据库文件的页统计"""
+    tables = args.tables or db.get_tables()
+    estimates = db.estimate_row_counts()
+    headers = ["table", "rows", "exact", "columns", "indexes"]
+    rows = []
+    with db.pool.reading() as conn:
+        for table_name in tables:
+            schema = db.get_table_schema(table_name)
+            if args.exact:
+                count = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+            else:
+                count = estimates.get(table_name)
+                if count is None:
+                    count = db.estimate_row_count(table_name)
+            rows.append((table_name, count, bool(args.exact), len(schema.columns), len(schema.indexes)))
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    write_rows(sys.stdout, headers, [rows], args.format)
+    print(f"{db.db_path}: {format_size(page_size * page_count)}，{page_count} 页 x {page_size} B，"
+          f"空闲页 {freelist}，日志模式 {db.pool.journal_mode()}", file=sys.stderr)
+    return len(rows)
+
+
+def cmd_maintain(db, args):
+    """执行维护操作，输出执行前后的文件统计；Ctrl+C 中止时修改全部回滚"""
+    reported = []
+
+    def report(done, total, elapsed):
+        reported.append(done)
+        text = f"{done} / {total}" if total else f"已执行 {done} 步"
+        print(f"\r{text}，用时 {elapsed:.1f} 秒", end="", file=sys.stderr, flush=True)
+
+    with db.pool.reading() as conn:
+        before = file_stats(conn, db.db_path)
+    with db.writing() if MAINTENANCE_TASKS[args.task][1] else db.pool.reading() as conn:
+        messages = run_maintenance(conn, args.task, pages=args.pages, progress=MaintenanceProgress(report=report))
+    if reported:
+        print(file=sys.stderr)
+    for message in messages:
+        print(message, file=sys.stderr)
+    with db.pool.reading() as conn:
+        after = file_stats(conn, db.db_path)
+    write_rows(sys.stdout, ["item", "before", "after", "change"], [describe_stats(before, after)], args.format)
+    return 0
+
+
+def cmd_diff(db, args):
+    """
+    比较旧库（database）和新库（other，附加为 new）中的表，输出每个表的新增、修改和删除行数；
+    --rows 时在标准输出逐行输出差异（摘要改为输出到标准错误），--patch 时把差异写成在旧库上执行的 SQL 补丁
+    """
+    reported = []
+
+    def report(done, total):
+        reported.append(done)
+        print(f"\r{diff.table_name}: {done} / {total}", end="", file=sys.stderr, flush=True)
+
+    summaries = []
+    with db.pool.reading() as conn:
+        conn.execute("BEGIN")  # 两个库在同一个读事务中读取，比较的是同一时刻的快照
+        try:
+            with PatchWriter(args.patch) if args.patch else nullcontext() as patch:
+                for diff in compare_tables(conn, "main", "new", args.tables or None):
+                    if patch is not None:
+                        patch.start_table(diff)
+                    for row in diff.rows(progress=None if args.rows else report):
+                        if patch is not None:
+                            patch.write(diff, row)
+                        if args.rows:
+                            changed = diff.changed_columns(row) if row.kind == "update" else []
+                            values = row.old if row.kind == "delete" else row.new
+                            print("\t".join([diff.table_name, row.kind,
+                                             json.dumps([encode_value(v) for v in row.key], ensure_ascii=False),
+                                             ",".join(diff.headers[i] for i in changed),
+                                             json.dumps([encode_value(v) for v in values], ensure_ascii=False)]))
+                    summaries.append(diff.summary())
+        finally:
+            conn.rollback()
+    if reported:
+        print(file=sys.stderr)
+    rows = [(s.table, s.status, s.rows_old, s.rows_new, s.inserted, s.updated, s.deleted,
+             ",".join(s.only_old), ",".join(s.only_new)) for s in summaries]
+    write_rows(sys.stderr if args.rows else sys.stdout,
+               ["table", "status", "rows_old", "rows_new", "inserted", "updated", "deleted",
+                "columns_only_old", "columns_only_new"], [rows], args.format)
+    if args.patch:
+        print(f"补丁已写入 {args.patch}", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args):
+    from importer import main as import_main
+    argv = [args.file, args.database] + ([args.table] if args.table else [])
+    if args.import_format:
+        argv += ["--format", args.import_format]
+    if args.types:
+        argv += ["--types", args.types]
+    if args.fast:
+        argv.append("--fast")
+    argv += ["--chunk-size", str(args.chunk_size)]
+    import_main(argv)
+    return 0
+
+
+def cmd_bench(args):
+    import benchmark
+    return benchmark.main(["--headless"] + args.bench_args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="DB-Viewer-Editor 命令行工具（不需要图形界面）")
+    parser.add_argument("--timing", action="store_true", help="在标准错误输出启动、打开数据库和执行的耗时")
+    parser.add_argument("--read-only", action="store_true",
+                        help="以只读、不可变方式打开并内存映射数据库文件（不加锁；文件在执行期间不能被其他程序修改）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query = subparsers.add_parser("query", help="执行 SQL 并把结果输出到标准输出")
+    query.add_argument("database")
+    query.add_argument("sql")
+    query.add_argument("-p", "--param", action="append", default=[], help="按顺序绑定到 ? 的参数，可重复")
+    query.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="table")
+    query.add_argument("--limit", type=int, help="最多输出的行数")
+    query.add_argument("--write", action="store_true", help="允许执行修改数据库的语句（执行后提交）")
+    query.add_argument("--attach", action="append", default=[], metavar="NAME=PATH",
+                       help="附加其他数据库用于跨库查询，可重复")
+
+    export = subparsers.add_parser("export", help="把表或查询结果流式导出到文件")
+    export.add_argument("database")
+    export.add_argument("table", nargs="?", help="要导出的表（或使用 --sql）")
+    export.add_argument("output")
+    export.add_argument("--sql", help="导出这条查询的结果")
+    export.add_argument("--format", dest="export_format", choices=sorted(EXPORT_FORMATS),
+                        help="导出格式（默认按扩展名判断）")
+    export.add_argument("--attach", action="append", default=[], metavar="NAME=PATH",
+                        help="附加其他数据库用于跨库查询，可重复")
+
+    import_parser = subparsers.add_parser("import", help="把 CSV / JSON Lines 文件批量导入表中")
+    import_parser.add_argument("file")
+    import_parser.add_argument("database")
+    import_parser.add_argument("table", nargs="?")
+    import_parser.add_argument("--format", dest="import_format", choices=("csv", "jsonl"))
+    import_parser.add_argument("--types", help="列类型，逗号分隔（仅新建表时使用）")
+    import_parser.add_argument("--chunk-size", type=int, default=50000)
+    import_parser.add_argument("--fast", action="store_true", help="导入期间使用 synchronous=OFF 并延迟创建索引")
+
+    stats = subparsers.add_parser("stats", help="输出各表的行数、列数和索引数")
+    stats.add_argument("database")
+    stats.add_argument("tables", nargs="*", help="只统计这些表")
+    stats.add_argument("--exact", action="store_true", help="用 COUNT(*) 统计精确行数（大表较慢）")
+    stats.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="table")
+
+    maintain = subparsers.add_parser("maintain", help="执行 ANALYZE、VACUUM、完整性检查等维护操作")
+    maintain.add_argument("database")
+    maintain.add_argument("task", choices=list(MAINTENANCE_TASKS))
+    maintain.add_argument("--pages", type=int, default=0, help="incremental_vacuum 最多归还的页数（默认全部）")
+    maintain.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="table")
+
+    diff = subparsers.add_parser("diff", help="按主键比较两个数据库中的表，可生成 SQL 补丁")
+    diff.add_argument("database", help="旧库（补丁在它上面执行）")
+    diff.add_argument("other", help="新库")
+    diff.add_argument("tables", nargs="*", help="只比较这些表（默认所有表）")
+    diff.add_argument("--patch", help="把旧库变为新库的 SQL 补丁写入这个文件")
+    diff.add_argument("--rows", action="store_true", help="在标准输出逐行输出差异（表、变化、键、修改的列、值），摘要改为输出到标准错误")
+    diff.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="table")
+
+    bench = subparsers.add_parser("bench", help="不使用界面运行性能基准测试（参数与 benchmark.py 相同）")
+    bench.add_argument("bench_args", nargs=argparse.REMAINDER, help="传给 benchmark.py 的参数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    imported = time.perf_counter()
+    opened = imported
+    try:
+        if args.command == "import":
+            result = cmd_import(args)
+        elif args.command == "bench":
+            result = cmd_bench(args)
+        else:
+            if args.command == "export" and not (args.table or args.sql):
+                raise SystemExit("请指定要导出的表或 --sql")
+            if not os.path.exists(args.database):
+                raise SystemExit(f"数据库文件不存在: {args.database}")
+            if args.read_only:
+                settings = ConnectionSettings().fast_read_only(os.path.getsize(args.database))
+                db = DBConnector(args.database, settings=settings, read_only=True)
+            else:
+                db = DBConnector(args.database)
+            try:
+                attach_databases(db, getattr(args, "attach", []) +
+                                 ([f"new={args.other}"] if args.command == "diff" else []))
+                opened = time.perf_counter()
+                result = {"query": cmd_query, "export": cmd_export, "stats": cmd_stats,
+                          "maintain": cmd_maintain, "diff": cmd_diff}[args.command](db, args)
+            finally:
+                db.close()
+    except BrokenPipeError:
+        # 输出被 head 等命令提前关闭
+        sys.stderr.close()
+        return 0
+    except (sqlite3.Error, ValueError, OSError) as e:
+        # SQL 错误、文件无法读写、参数或数据格式不对：只输出错误信息，不输出调用栈
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.timing:
+            done = time.perf_counter()
+            qt = "已加载" if "PyQt5" in sys.modules else "未加载"
+            print(f"启动 {(imported - _STARTED) * 1000:.1f} ms，打开数据库 {(opened - imported) * 1000:.1f} ms，"
+                  f"执行 {(done - opened) * 1000:.1f} ms，PyQt5 {qt}", file=sys.stderr)
+    return result if args.command == "bench" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
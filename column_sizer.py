@@ -0,0 +1,111 @@
+from PyQt5.QtCore import QObject, Qt
+from PyQt5.QtGui import QFontMetrics
+
+
+class ColumnSizer(QObject):
+    """
+    按内容自动设置表格列宽
+    用 QFontMetrics 测量模型中随机抽取的若干行（只取已加载的行，不额外读取数据库），
+    结果按 (缓存键, 列名) 缓存，用户手动调整的宽度也会记入缓存；
+    只测量当前可见的列，其余列滚动到可见时再测量，因此几百列的表也能立即打开，刷新后列宽保持不变
+    """
+
+    HEADER_PADDING = 28  # 排序箭头和边距
+    CELL_PADDING = 14
+
+    def __init__(self, table_view, sample_size=200, min_width=50, max_width=400, max_chars=200, parent=None):
+        super().__init__(parent)
+        self.table_view = table_view
+        self.sample_size = sample_size
+        self.min_width = min_width
+        self.max_width = max_width
+        self.max_chars = max_chars  # 超长的值只测量前面一段，反正会被截断到 max_width
+        self._widths = {}  # (缓存键, 列名) -> 宽度
+        self._model = None
+        self._cache_key = None
+        self._sample = []  # 当前模型中抽样的行号
+        self._sized = set()  # 当前模型中已设置宽度的列
+        self._resizing = False
+
+        header = table_view.horizontalHeader()
+        header.sectionResized.connect(self._on_section_resized)
+        header.geometriesChanged.connect(self.measure_visible)
+        table_view.horizontalScrollBar().valueChanged.connect(self.measure_visible)
+
+    def clear(self):
+        """清空缓存（切换数据库时）"""
+        self._widths = {}
+
+    def apply(self, cache_key):
+        """
+        表格视图切换到新模型后调用
+        缓存中已有的列直接使用缓存的宽度，可见列中没有缓存的列立即测量
+        """
+        model = self.table_view.model()
+        self._model = model
+        self._cache_key = cache_key
+        self._sized = set()
+        self._sample = []
+        if model is None:
+            return
+        self._sample = model.sample_row_indices(self.sample_size)
+        header = self.table_view.horizontalHeader()
+        self._resizing = True
+        try:
+            for column, name in enumerate(model.headers):
+                width = self._widths.get((cache_key, name))
+                if width is not None:
+                    header.resizeSection(column, width)
+                    self._sized.add(column)
+        finally:
+            self._resizing = False
+        self.measure_visible()
+
+    def measure_visible(self, *args):
+        """测量当前可见但还没有设置宽度的列"""
+        model = self.table_view.model()
+        header = self.table_view.horizontalHeader()
+        if model is None or model is not self._model or header.model() is not model:
+            return  # 模型正在切换（列头可能已换成新模型），还没有调用 apply()
+        visual = header.visualIndexAt(0)
+        if visual < 0:
+            return
+        viewport_width = header.viewport().width()
+        self._resizing = True
+        try:
+            while visual < header.count():
+                column = header.logicalIndex(visual)
+                # 前面的列调整宽度后，后面的列位置随之变化，所以边测量边判断
+                if header.sectionViewportPosition(column) >= viewport_width:
+                    break
+                if column not in self._sized and not header.isSectionHidden(column):
+                    width = self._measure(model, column)
+                    header.resizeSection(column, width)
+                    self._widths[(self._cache_key, model.headers[column])] = width
+                    self._sized.add(column)
+                visual += 1
+        finally:
+            self._resizing = False
+
+    def _measure(self, model, column):
+        header_metrics = QFontMetrics(self.table_view.horizontalHeader().font())
+        cell_metrics = QFontMetrics(self.table_view.font())
+        title = str(model.headerData(column, Qt.Horizontal))
+        width = header_metrics.horizontalAdvance(title) + self.HEADER_PADDING
+        for row in self._sample:
+            text = model.data(model.index(row, column), Qt.DisplayRole)
+            if not isinstance(text, str):
+                continue
+            text = text[:self.max_chars].split("\n", 1)[0]
+            width = max(width, cell_metrics.horizontalAdvance(text) + self.CELL_PADDING)
+            if width >= self.max_width:
+                break
+        return max(self.min_width, min(width, self.max_width))
+
+    def _on_section_resized(self, column, old_size, new_size):
+        # 记住用户手动调整的宽度
+        model = self.table_view.model()
+        if self._resizing or model is None or model is not self._model or column >= len(model.headers):
+            return
+        self._widths[(self._cache_key, model.headers[column])] = new_size
+        self._sized.add(column)
@@ -0,0 +1,90 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QFormLayout, QSpinBox, QCheckBox, QDialogButtonBox, QLabel
+from connection_pool import ConnectionSettings
+
+
+class ConnectionSettingsDialog(QDialog):
+    """
+    连接参数设置：busy_timeout、页缓存、内存映射、WAL、只读连接数、内存上限和语句缓存
+    database 为附加数据库的名字时只能修改该库的页缓存、内存映射和 WAL，其余参数对整个工作区生效
+    read_only 为 True 时（只读快速打开的工作区）不能启用 WAL
+    """
+
+    def __init__(self, settings, parent=None, database=None, read_only=False):
+        super().__init__(parent)
+        self.setWindowTitle(f"连接设置 - {database}" if database else "连接设置")
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        self.busy_timeout = QSpinBox()
+        self.busy_timeout.setRange(0, 600000)
+        self.busy_timeout.setSingleStep(1000)
+        self.busy_timeout.setSuffix(" ms")
+        self.busy_timeout.setValue(settings.busy_timeout)
+        form.addRow("忙等待超时 (busy_timeout):", self.busy_timeout)
+
+        # cache_size 为负数时单位是 KiB，界面上统一按 MiB 设置
+        self.cache_size = QSpinBox()
+        self.cache_size.setRange(1, 65536)
+        self.cache_size.setSuffix(" MiB")
+        self.cache_size.setValue(max(1, -settings.cache_size // 1024) if settings.cache_size < 0 else 2)
+        form.addRow("每个连接的页缓存 (cache_size):", self.cache_size)
+
+        self.mmap_size = QSpinBox()
+        self.mmap_size.setRange(0, 65536)
+        self.mmap_size.setSuffix(" MiB")
+        self.mmap_size.setValue(settings.mmap_size // (1024 * 1024))
+        form.addRow("内存映射 (mmap_size):", self.mmap_size)
+
+        self.max_readers = QSpinBox()
+        self.max_readers.setRange(2, 32)
+        self.max_readers.setValue(settings.max_readers)
+        form.addRow("只读连接数上限:", self.max_readers)
+
+        self.memory_limit = QSpinBox()
+        self.memory_limit.setRange(0, 65536)
+        self.memory_limit.setSuffix(" MiB")
+        self.memory_limit.setSpecialValueText("不限制")
+        self.memory_limit.setValue(settings.memory_limit // (1024 * 1024))
+        form.addRow("SQLite 内存上限 (soft_heap_limit):", self.memory_limit)
+
+        self.cached_statements = QSpinBox()
+        self.cached_statements.setRange(0, 10000)
+        self.cached_statements.setSpecialValueText("不缓存")
+        self.cached_statements.setValue(settings.cached_statements)
+        self.cached_statements.setToolTip("命中率见性能分析面板的语句跟踪页；修改后新打开的连接生效")
+        form.addRow("每个连接的语句缓存 (cached_statements):", self.cached_statements)
+
+        if database:
+            for widget in (self.busy_timeout, self.max_readers, self.memory_limit, self.cached_statements):
+                widget.setEnabled(False)
+                widget.setToolTip("对整个工作区生效，请在主数据库的连接设置中修改")
+
+        self.wal = QCheckBox("启用 WAL（读写互不阻塞，设置会保存在数据库文件中）")
+        self.wal.setChecked(settings.wal)
+        if read_only:
+            self.wal.setChecked(False)
+            self.wal.setEnabled(False)
+            self.wal.setToolTip("数据库以只读方式打开，不能切换日志模式")
+        form.addRow("", self.wal)
+        layout.addLayout(form)
+
+        note = QLabel("修改后立即应用到当前数据库；只读连接在下次使用时生效，语句缓存在重新打开数据库后生效。"
+                      "内存上限对所有打开和附加的数据库共同生效，超过时 SQLite 会释放页缓存")
+        note.setWordWrap(True)
+        layout.addWidget(note)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def settings(self):
+        return ConnectionSettings(
+            busy_timeout=self.busy_timeout.value(),
+            cache_size=-self.cache_size.value() * 1024,
+            mmap_size=self.mmap_size.value() * 1024 * 1024,
+            wal=self.wal.isChecked(),
+            max_readers=self.max_readers.value(),
+            memory_limit=self.memory_limit.value() * 1024 * 1024,
+            cached_statements=self.cached_statements.value(),
+        )
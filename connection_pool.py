@@ -0,0 +1,297 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class WriterBusyError(sqlite3.OperationalError):
+    """写连接正被其他任务占用"""
+
+
+def _quote_name(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def has_pending_wal(path):
+    """数据库文件旁是否有未写回 (checkpoint) 的 WAL：以 immutable=1 打开时会忽略其中的修改"""
+    try:
+        return os.path.getsize(path + "-wal") > 0
+    except OSError:
+        return False
+
+
+def _schema_prefix(schema):
+    # 主库的 PRAGMA 不加前缀，附加的数据库加上 "库名".
+    if schema is None or schema == "main":
+        return ""
+    return _quote_name(schema) + "."
+
+
+class ConnectionSettings:
+    """
+    连接参数，对连接池中的所有连接生效
+    busy_timeout、只读连接数、内存上限和语句缓存对整个工作区生效（只使用主库的设置）；
+    cache_size、mmap_size 和 WAL 按数据库设置，附加的数据库可以使用各自的值
+    """
+
+    def __init__(self, busy_timeout=5000, cache_size=-20000, mmap_size=0, wal=False, max_readers=6,
+                 memory_limit=0, cached_statements=128):
+        self.busy_timeout = busy_timeout  # 毫秒
+        self.cache_size = cache_size  # 负数表示 KiB，正数表示页数
+        self.mmap_size = mmap_size  # 字节，0 表示不使用内存映射
+        self.wal = wal
+        self.max_readers = max_readers
+        # 字节，SQLite 在整个进程中的软堆上限 (soft_heap_limit)，超过时释放页缓存；0 表示不限制
+        self.memory_limit = memory_limit
+        # 每个连接缓存的预编译语句数（sqlite3.connect 的 cached_statements），只对之后打开的连接生效
+        self.cached_statements = cached_statements
+
+    def pragmas(self):
+        return [
+            f"PRAGMA busy_timeout = {int(self.busy_timeout)}",
+            f"PRAGMA soft_heap_limit = {int(self.memory_limit)}",
+        ] + self.schema_pragmas()
+
+    def schema_pragmas(self, schema=None):
+        """只对一个数据库生效的参数（缺省为主库）"""
+        prefix = _schema_prefix(schema)
+        return [
+            f"PRAGMA {prefix}cache_size = {int(self.cache_size)}",
+            f"PRAGMA {prefix}mmap_size = {int(self.mmap_size)}",
+        ]
+
+    def fast_read_only(self, file_size):
+        """
+        只读快速打开使用的参数：内存映射整个文件（SQLite 会限制在编译时的上限 SQLITE_MAX_MMAP_SIZE 以内），
+        映射范围内的页直接从操作系统的页缓存读取，不复制到 SQLite 的页缓存，因此 cache_size 只需覆盖映射之外的部分
+        busy_timeout、只读连接数、内存上限和语句缓存沿用当前设置
+        """
+        return ConnectionSettings(self.busy_timeout, cache_size=-8192, mmap_size=file_size, wal=False,
+                                  max_readers=self.max_readers, memory_limit=self.memory_limit,
+                                  cached_statements=self.cached_statements)
+
+
+class ConnectionManager:
+    """
+    数据库连接管理
+    一个写连接，所有写操作通过 writing() 串行使用；
+    若干只读连接 (mode=ro) 组成连接池，供浏览、导出、统计等读操作通过 reading() 并发使用
+    attach() 附加的数据库在所有连接上都可用（只读连接上以只读方式附加），因此可以跨库查询
+    close() 显式关闭所有连接，不依赖 __del__
+
+    read_only 为 True 时写连接也以只读方式打开 (mode=ro&immutable=1)：SQLite 不再加任何文件锁，
+    也不检查文件是否被其他连接修改，因此只适用于打开期间不会被修改的文件；
+    有未写回的 WAL 时不能使用 immutable（会读到不完整的数据），退回普通的只读方式 (mode=ro)
+    """
+
+    def __init__(self, db_path, settings=None, tracer=None, read_only=False):
+        self.db_path = db_path
+        self.settings = settings or ConnectionSettings()
+        self.tracer = tracer
+        self.read_only = read_only
+        self._immutable = {}  # 文件路径 -> 是否以 immutable=1 打开（只读打开时）
+        self.write_lock = threading.RLock()
+        self._idle_readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._settings_version = 0
+        self._reader_versions = {}  # id(连接) -> 已应用的设置版本
+        # 附加的数据库：库名 -> (文件路径, ConnectionSettings)；修改时整体替换，后台线程读取的总是完整的快照
+        self._attached = {}
+        self._closed = False
+
+        # 写连接可能在后台线程（如导入）中使用，由 write_lock 保证同一时刻只有一个线程使用
+        if read_only:
+            self.writer = self._connect(self._read_only_uri(db_path), uri=True)
+        else:
+            self.writer = self._connect(db_path)
+        self._configure(self.writer)
+        if self.settings.wal and not read_only:
+            self.writer.execute("PRAGMA journal_mode = WAL")
+
+    def is_immutable(self, path):
+        """文件 path 是否以 immutable=1 打开（只读打开且没有未写回的 WAL 时），打开时确定，之后不再改变"""
+        if not self.read_only:
+            return False
+        if path not in self._immutable:
+            self._immutable[path] = not has_pending_wal(path)
+        return self._immutable[path]
+
+    def _read_only_uri(self, path):
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        return uri + "&immutable=1" if self.is_immutable(path) else uri
+
+    def _connect(self, target, uri=False):
+        return sqlite3.connect(target, uri=uri, check_same_thread=False,
+                               cached_statements=self.settings.cached_statements)
+
+    def _configure(self, conn, read_only=False):
+        self._apply(conn, read_only)
+        if self.tracer is not None:
+            self.tracer.attach(conn)
+
+    def _apply(self, conn, read_only=False):
+        # 应用连接参数，并使附加的数据库与 self._attached 一致
+        for pragma in self.settings.pragmas():
+            conn.execute(pragma)
+        attached = self._attached
+        current = {row[1] for row in conn.execute("PRAGMA database_list")} - {"main", "temp"}
+        for name in current - set(attached):
+            conn.execute(f"DETACH DATABASE {_quote_name(name)}")
+        for name, (path, settings) in attached.items():
+            if name not in current:
+                target = self._read_only_uri(path) if read_only or self.read_only else path
+                conn.execute(f"ATTACH DATABASE ? AS {_quote_name(name)}", (target,))
+            for pragma in settings.schema_pragmas(name):
+                conn.execute(pragma)
+
+    def _open_reader(self):
+        conn = self._connect(self._read_only_uri(self.db_path), uri=True)
+        self._configure(conn, read_only=True)
+        self._reader_versions[id(conn)] = self._settings_version
+        return conn
+
+    def refresh_reader(self, conn):
+        """
+        把设置和附加数据库的变化应用到只读连接上
+        从连接池取出时自动调用；长期持有的连接（如界面浏览用的连接）在使用前调用
+        """
+        version = self._settings_version
+        if self._reader_versions.get(id(conn)) != version:
+            self._apply(conn, read_only=True)
+            self._reader_versions[id(conn)] = version
+
+    def acquire_reader(self, timeout=None):
+        """从连接池取出一个只读连接；池中没有空闲连接且已达上限时等待"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接池已关闭")
+        try:
+            conn = self._idle_readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._reader_count < self.settings.max_readers
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                try:
+                    return self._open_reader()
+                except Exception:
+                    with self._pool_lock:
+                        self._reader_count -= 1
+                    raise
+            try:
+                conn = self._idle_readers.get(timeout=timeout)
+            except queue.Empty:
+                raise sqlite3.OperationalError("没有可用的只读连接")
+        self.refresh_reader(conn)
+        return conn
+
+    def release_reader(self, conn):
+        # 清除使用者安装的进度回调，并结束可能残留的读事务
+        conn.set_progress_handler(None, 0)
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._discard_reader(conn)
+        else:
+            self._idle_readers.put(conn)
+
+    def _discard_reader(self, conn):
+        self._reader_versions.pop(id(conn), None)
+        conn.close()
+        with self._pool_lock:
+            self._reader_count -= 1
+
+    @contextmanager
+    def reading(self, timeout=None):
+        conn = self.acquire_reader(timeout)
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    @contextmanager
+    def writing(self, timeout=None):
+        """独占写连接；timeout 秒内拿不到时抛出 WriterBusyError（None 表示一直等待）"""
+        acquired = self.write_lock.acquire(timeout=-1 if timeout is None else timeout)
+        if not acquired:
+            raise WriterBusyError("写连接正被其他任务（如导入）占用，请稍后再试")
+        try:
+            yield self.writer
+        finally:
+            self.write_lock.release()
+
+    def apply_settings(self, settings, timeout=None, schema=None):
+        """
+        修改连接参数：写连接立即生效，只读连接在下次取出时生效
+        schema 为附加的库名时只修改该库的 cache_size、mmap_size 和 WAL
+        WAL 一旦启用会保存在数据库文件中，取消勾选不会切换回回滚日志模式
+        """
+        with self.writing(timeout):
+            if schema is None or schema == "main":
+                self.settings = settings
+            else:
+                self._attached = {**self._attached, schema: (self._attached[schema][0], settings)}
+            self._settings_version += 1
+            self._apply(self.writer)
+            if settings.wal and not self.read_only:
+                self.writer.execute(f"PRAGMA {_schema_prefix(schema)}journal_mode = WAL")
+
+    def attach(self, path, name, settings=None, timeout=None):
+        """
+        把另一个数据库文件以 name 附加到所有连接上：写连接立即附加，只读连接在下次使用时以只读方式附加
+        ATTACH 不能在事务中执行，写连接上有未提交的修改时抛出 OperationalError
+        """
+        settings = settings or ConnectionSettings()
+        with self.writing(timeout):
+            if name.lower() in ("main", "temp") or name in self._attached:
+                raise ValueError(f"数据库名 {name} 已被使用")
+            if self.writer.in_transaction:
+                raise sqlite3.OperationalError("请先保存或回滚未提交的修改，再附加数据库")
+            previous = self._attached
+            self._attached = {**previous, name: (path, settings)}
+            try:
+                self._apply(self.writer)
+                if settings.wal and not self.read_only:
+                    self.writer.execute(f"PRAGMA {_schema_prefix(name)}journal_mode = WAL")
+            except Exception:
+                self._attached = previous
+                self._apply(self.writer)
+                raise
+            self._settings_version += 1
+
+    def detach(self, name, timeout=None):
+        """从所有连接上分离附加的数据库（只读连接在下次使用时分离）"""
+        with self.writing(timeout):
+            if name not in self._attached:
+                return
+            if self.writer.in_transaction:
+                raise sqlite3.OperationalError("请先保存或回滚未提交的修改，再分离数据库")
+            self._attached = {key: value for key, value in self._attached.items() if key != name}
+            self._settings_version += 1
+            self._apply(self.writer)
+
+    def databases(self):
+        """返回 [(库名, 文件路径, ConnectionSettings)]，主库在最前"""
+        return [("main", self.db_path, self.settings)] + [
+            (name, path, settings) for name, (path, settings) in self._attached.items()]
+
+    def journal_mode(self, schema=None):
+        with self.writing():
+            return self.writer.execute(f"PRAGMA {_schema_prefix(schema)}journal_mode").fetchone()[0]
+
+    def close(self):
+        """关闭所有连接；正在使用中的只读连接在归还时关闭"""
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle_readers.get_nowait()
+            except queue.Empty:
+                break
+            self._discard_reader(conn)
+        with self.write_lock:
+            self.writer.close()
@@ -1,41 +1,850 @@
+import os
 import sqlite3
+from collections import namedtuple
+from contextlib import contextmanager
+from connection_pool import ConnectionManager
+from result_cache import ResultCache
+
+# 结构缓存中的条目
+ColumnInfo = namedtuple('ColumnInfo', 'name type notnull default pk')
+IndexInfo = namedtuple('IndexInfo', 'name unique columns')
+ForeignKeyInfo = namedtuple('ForeignKeyInfo', 'columns ref_table ref_columns')
+TableSchema = namedtuple('TableSchema', 'name type columns primary_key indexes foreign_keys key_columns')
+
+# 列过滤条件：SQL 片段、绑定参数、是否能利用索引
+ColumnFilter = namedtuple('ColumnFilter', 'column clause params indexable')
+
+_FILTER_OPERATORS = (">=", "<=", "!=", "<>", "=", ">", "<")
+
+# 分页读取时被截断的大值：kind 为 'blob' 或 'text'，size 为字节数（BLOB）或字符数（TEXT），
+# prefix 为 TEXT 的开头部分（BLOB 为 None）；完整的值通过 DBConnector.open_value() 按需读取
+LargeValue = namedtuple('LargeValue', 'kind size prefix')
+
+SMALL_BLOB_LIMIT = 64  # 不超过这么多字节的 BLOB 随页读取，可直接显示为十六进制
+LARGE_TEXT_LIMIT = 1024  # 超过这么多字符的 TEXT 分页时只读取开头部分
+TEXT_PREFIX_CHARS = 200
+
+_ROWID_ALIASES = ("rowid", "_rowid_", "oid")
+
+
+def quote_identifier(name):
+    """为 SQL 标识符（表名、列名）加双引号并转义"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def schema_prefix(schema_name):
+    """附加数据库中对象名的前缀 "库名".；主库返回空字符串，保持原来的 SQL 不变"""
+    if not schema_name or schema_name == "main":
+        return ""
+    return quote_identifier(schema_name) + "."
+
+
+def build_filter(column_name, text):
+    """
+    把过滤框中的文本转换为参数化的 WHERE 条件，空文本返回 None
+    支持 =x、!=x、>x、>=x、<x、<=x、NULL、NOT NULL，其余按包含匹配 (LIKE '%x%')
+    """
+    text = text.strip()
+    if not text:
+        return None
+    column = quote_identifier(column_name)
+    upper = text.upper()
+    if upper in ("NULL", "IS NULL"):
+        return ColumnFilter(column_name, f"{column} IS NULL", (), True)
+    if upper in ("NOT NULL", "IS NOT NULL", "!NULL"):
+        return ColumnFilter(column_name, f"{column} IS NOT NULL", (), True)
+    for op in _FILTER_OPERATORS:
+        if text.startswith(op):
+            return ColumnFilter(column_name, f"{column} {op} ?", (_filter_value(text[len(op):].strip()),), True)
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return ColumnFilter(column_name, f"{column} LIKE ? ESCAPE '\\'", (f"%{escaped}%",), False)
+
+
+def _filter_value(text):
+    # 数字按数值绑定：TEXT 列会按亲和性转回文本比较，无类型的列则能正确按数值比较
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def format_size(size):
+    """把字节数格式化为 B/KB/MB/GB"""
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+def in_list_slots(count):
+    """
+    IN 列表中的占位符个数：向上取到 2 的幂，多出的位置重复最后一个值（不影响结果）
+    每批行数不同时 SQL 文本也只有少数几种，能够命中连接的语句缓存，不必每次重新编译
+    """
+    slots = 1
+    while slots < count:
+        slots *= 2
+    return slots
+
+
+def may_hold_large_values(declared_type):
+    """
+    按 SQLite 的类型亲和性判断列是否可能存放大值：TEXT、BLOB 亲和性和没有声明类型的列
+    INTEGER、REAL、NUMERIC 亲和性的列分页时不做截断
+    """
+    upper = (declared_type or "").upper()
+    if "INT" in upper:
+        return False
+    if not upper or any(name in upper for name in ("CHAR", "CLOB", "TEXT", "BLOB")):
+        return True
+    return False
+
+
+def is_read_only_query(query):
+    """判断语句是否只读，只读语句才交给后台线程（只读连接）执行"""
+    first_word = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+    return first_word in ("SELECT", "WITH", "EXPLAIN", "VALUES")
+
+
+def is_rowid_key(key_columns):
+    """键列是否就是 rowid（可以用 max(rowid) 估计行数、用 blobopen 增量读写）"""
+    return len(key_columns) == 1 and key_columns[0].lower() in _ROWID_ALIASES
+
+
+def is_full_scan_step(detail):
+    """判断查询计划步骤是否为全表扫描或临时排序"""
+    if detail.startswith("SCAN ") and " INDEX " not in detail and "VIRTUAL TABLE" not in detail:
+        return True
+    return detail.startswith("USE TEMP B-TREE")
+
+
+class ValueReader:
+    """
+    按需读取一个单元格的值的任意一段，不把整个值读入内存
+    rowid 表的 TEXT/BLOB 使用 Connection.blobopen 增量读取；WITHOUT ROWID 表或没有 blobopen 的 Python 版本
+    退化为每次用 substr() 读取一块；size 和 read() 都以字节为单位（TEXT 为 UTF-8 编码）
+    kind 为 typeof() 的结果：'null'、'integer'、'real'、'text' 或 'blob'
+    schema 为表所在的数据库（主库或附加的库名）
+    """
+
+    def __init__(self, conn, table_name, column_name, key_columns, key, schema="main"):
+        if not key_columns or key is None:
+            raise ValueError(f"{table_name} 没有可用于定位行的键")
+        self.conn = conn
+        self._blob = None
+        self._data = None
+        column = quote_identifier(column_name)
+        where = " AND ".join(f"{DBConnector._key_expr(col)} = ?" for col in key_columns)
+        self._select = f"FROM {schema_prefix(schema)}{quote_identifier(table_name)} WHERE {where}"
+        self._params = tuple(key)
+
+        row = conn.execute(f"SELECT typeof({column}) {self._select}", self._params).fetchone()
+        if row is None:
+            raise ValueError("该行已不存在")
+        self.kind = row[0]
+        if self.kind not in ("text", "blob"):
+            value = conn.execute(f"SELECT {column} {self._select}", self._params).fetchone()[0]
+            self._data = b"" if value is None else str(value).encode("utf-8")
+            self.size = len(self._data)
+        elif is_rowid_key(key_columns) and hasattr(conn, "blobopen"):
+            self._blob = conn.blobopen(table_name, column_name, key[0], readonly=True, name=schema)
+            self.size = len(self._blob)
+        else:
+            self._column = f"CAST({column} AS BLOB)" if self.kind == "text" else column
+            self.size = conn.execute(f"SELECT length({self._column}) {self._select}", self._params).fetchone()[0]
+
+    def read(self, offset, length):
+        """读取从 offset 开始的 length 个字节（到末尾为止）"""
+        if self._data is not None:
+            return self._data[offset:offset + length]
+        if self._blob is not None:
+            self._blob.seek(offset)
+            return self._blob.read(length)
+        row = self.conn.execute(f"SELECT substr({self._column}, ?, ?) {self._select}",
+                                (offset + 1, length, *self._params)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else b""
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+
 
 class DBConnector:
-    def __init__(self, db_path):
+    """
+    数据库访问层
+    连接由 ConnectionManager 管理：所有写操作使用唯一的写连接 (self.conn)，
+    界面浏览使用一个保留的只读连接，后台线程通过 self.pool.reading() 借用其他只读连接
+    用完后应调用 close() 关闭所有连接
+
+    attach() 把其他数据库文件附加到同一组连接上，返回该库的 DBConnector（工作区中的一个库）：
+    它与主库共用连接、浏览连接和结果缓存，表名都带上库名前缀，因此 SQL 框中可以跨库查询；
+    关闭附加库的 DBConnector 只会分离该库
+
+    read_only 为 True 时以只读方式快速打开（见 ConnectionManager），整个工作区（包括之后附加的库）都不能修改
+    """
+
+    def __init__(self, db_path, tracer=None, settings=None, workspace=None, schema_name="main", workload=None,
+                 read_only=False):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.schema_name = schema_name
+        self.workspace = workspace  # 附加库所属的主库 DBConnector，主库为 None
+        self._prefix = schema_prefix(schema_name)
+        if workspace is None:
+            self.tracer = tracer  # 可选的语句跟踪器 (profiler.StatementTracer)
+            self.workload = workload  # 可选的查询记录 (profiler.WorkloadLog)，供索引建议使用
+            self.pool = ConnectionManager(db_path, settings, tracer, read_only=read_only)
+            self._browse_conn = self.pool.acquire_reader()
+            # SQL 框中只读查询的结果缓存，按 cache_version() 失效
+            self.result_cache = ResultCache()
+        else:
+            self.tracer = workspace.tracer
+            self.workload = workspace.workload
+            self.pool = workspace.pool
+            self._browse_conn = workspace._browse_conn
+            self.result_cache = workspace.result_cache
+        self.conn = self.pool.writer
         self.cursor = self.conn.cursor()
-        
-    def __del__(self):
-        if hasattr(self, 'conn') and self.conn:
-            # 关闭连接前不自动提交，让应用层控制提交
-            self.conn.close()
-    
+        # 结构缓存，schema_version 变化时失效
+        self._schema_version = None
+        self._schema_objects = None
+        self._table_schemas = {}
+        # 精确行数缓存：表名 -> (data_version, 行数)
+        self._row_counts = {}
+
+    def close(self):
+        """关闭所有连接，未提交的修改会被丢弃；附加库只从工作区中分离"""
+        self.result_cache.clear()
+        if self.workspace is not None:
+            self.pool.detach(self.schema_name, timeout=0)
+            self.invalidate_schema()
+            return
+        if self._browse_conn is not None:
+            self.pool.release_reader(self._browse_conn)
+            self._browse_conn = None
+        self.pool.close()
+
+    def attach(self, path, schema_name, settings=None):
+        """
+        把数据库文件以 schema_name 附加到工作区，返回该库的 DBConnector
+        有未提交的修改时不能附加（抛出 sqlite3.OperationalError）
+        """
+        self.pool.attach(path, schema_name, settings, timeout=0)
+        self.result_cache.clear()
+        return DBConnector(path, workspace=self.workspace or self, schema_name=schema_name)
+
+    @property
+    def read_only(self):
+        return self.pool.read_only
+
+    def mapped_size(self):
+        """
+        返回 (内存映射的字节数, 文件大小)：映射的部分由生效的 mmap_size（已按 SQLite 的上限截断）和文件大小决定
+        映射范围内的页直接从操作系统的页缓存读取，不复制到 SQLite 的页缓存
+        """
+        self.pool.refresh_reader(self._browse_conn)
+        limit = self._browse_conn.execute(f"PRAGMA {self._prefix}mmap_size").fetchone()[0]
+        file_size = os.path.getsize(self.db_path)
+        return min(limit, file_size), file_size
+
+    def record_statement(self, sql, params=()):
+        """把执行的查询记入工作负载（没有设置 workload 时什么也不做）"""
+        if self.workload is not None:
+            self.workload.record(sql, params)
+
+    def table_sql(self, table_name):
+        """SQL 中引用该库中的表时使用的名字：主库为 "表名"，附加库加上 "库名". 前缀"""
+        return self._prefix + quote_identifier(table_name)
+
+    def writing(self):
+        """独占写连接；写连接正被后台任务（如导入）占用时立即抛出 WriterBusyError，不阻塞界面"""
+        return self.pool.writing(timeout=0)
+
+    @contextmanager
+    def _browsing(self):
+        """
+        界面线程读取数据时使用的游标
+        写连接上有未提交的修改时从写连接读取，以便看到这些修改；否则使用保留的只读连接
+        游标用完即关闭，避免未执行完的语句一直持有读快照
+        """
+        locked = self.pool.write_lock.acquire(blocking=False)
+        try:
+            if locked and self.conn.in_transaction:
+                conn = self.conn
+            else:
+                conn = self._browse_conn
+                self.pool.refresh_reader(conn)  # 同步附加/分离的数据库和连接参数
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+        finally:
+            if locked:
+                self.pool.write_lock.release()
+
     def get_tables(self):
         # 获取所有表名
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        return [table[0] for table in self.cursor.fetchall()]
+        return [name for object_type, name, _ in self.get_schema_objects() if object_type == 'table']
     
+    def get_schema_objects(self):
+        """一次读取 sqlite_master，返回所有表、视图、索引和触发器的 (type, name, tbl_name)"""
+        self._check_schema_version()
+        if self._schema_objects is None:
+            with self._browsing() as cursor:
+                cursor.execute(
+                    f"SELECT type, name, tbl_name FROM {self._prefix}sqlite_master "
+                    "WHERE type IN ('table', 'view', 'index', 'trigger') ORDER BY type, name")
+                self._schema_objects = cursor.fetchall()
+        return self._schema_objects
+
+    def get_table_schema(self, table_name):
+        """
+        返回表或视图的缓存结构信息 (TableSchema)
+        各表的结构在第一次访问时读取，之后一直使用缓存，直到 schema_version 变化
+        """
+        self._check_schema_version()
+        schema = self._table_schemas.get(table_name)
+        if schema is None:
+            schema = self._load_table_schema(table_name)
+            self._table_schemas[table_name] = schema
+        return schema
+
     def get_columns(self, table_name):
         # 获取表列信息
-        self.cursor.execute(f"PRAGMA table_info('{table_name}')")
-        return [(row[1], row[2]) for row in self.cursor.fetchall()]  # (name, type)
+        return [(column.name, column.type) for column in self.get_table_schema(table_name).columns]  # (name, type)
     
     def get_table_data(self, table_name, limit=100):
         # 获取表数据
-        self.cursor.execute(f"SELECT * FROM '{table_name}' LIMIT {limit}")
-        data = self.cursor.fetchall()
-        headers = [description[0] for description in self.cursor.description]
+        sql, params = self.build_select(table_name, limit=limit)
+        self.record_statement(sql, params)
+        with self._browsing() as cursor:
+            cursor.execute(sql, params)
+            data = cursor.fetchall()
+            headers = [description[0] for description in cursor.description]
         return data, headers
     
-    def execute_query(self, query):
-        # 执行自定义查询
-        self.cursor.execute(query)
-        data = self.cursor.fetchall()
+    def get_primary_key(self, table_name):
+        # 获取主键列名（按主键顺序）
+        return list(self.get_table_schema(table_name).primary_key)
+
+    def get_row_key_columns(self, table_name):
+        """
+        返回用于键集分页和定位行的键列:
+        普通表使用 rowid，WITHOUT ROWID 表使用主键列，视图等无法定位行时返回空列表
+        """
+        return list(self.get_table_schema(table_name).key_columns)
+
+    def invalidate_schema(self):
+        """清空结构缓存，下次访问时重新读取"""
+        self._schema_version = None
+        self._schema_objects = None
+        self._table_schemas = {}
+
+    def _check_schema_version(self):
+        # schema_version 只读取数据库头，开销很小；只有结构变化时才丢弃缓存
+        with self._browsing() as cursor:
+            version = cursor.execute(f"PRAGMA {self._prefix}schema_version").fetchone()[0]
+        if version != self._schema_version:
+            self.invalidate_schema()
+            self._schema_version = version
+
+    def _load_table_schema(self, table_name):
+        table = quote_identifier(table_name)
+        prefix = self._prefix
+        with self._browsing() as cursor:
+            cursor.execute(f"SELECT type FROM {prefix}sqlite_master WHERE name = ?", (table_name,))
+            row = cursor.fetchone()
+            object_type = row[0] if row else None
+
+            cursor.execute(f"PRAGMA {prefix}table_info({table})")
+            columns = [ColumnInfo(row[1], row[2], bool(row[3]), row[4], row[5])
+                       for row in cursor.fetchall()]
+            primary_key = tuple(column.name for column in sorted(
+                (column for column in columns if column.pk), key=lambda column: column.pk))
+
+            indexes = []
+            cursor.execute(f"PRAGMA {prefix}index_list({table})")
+            for index_row in cursor.fetchall():
+                index_name, unique = index_row[1], bool(index_row[2])
+                cursor.execute(f"PRAGMA {prefix}index_info({quote_identifier(index_name)})")
+                index_columns = tuple(info[2] for info in cursor.fetchall())
+                indexes.append(IndexInfo(index_name, unique, index_columns))
+
+            foreign_keys = {}
+            cursor.execute(f"PRAGMA {prefix}foreign_key_list({table})")
+            for fk_row in cursor.fetchall():
+                fk_id, ref_table, from_column, to_column = fk_row[0], fk_row[2], fk_row[3], fk_row[4]
+                fk = foreign_keys.setdefault(fk_id, (ref_table, [], []))
+                fk[1].append(from_column)
+                fk[2].append(to_column)
+            foreign_keys = [ForeignKeyInfo(tuple(from_columns), ref_table, tuple(to_columns))
+                            for ref_table, from_columns, to_columns in foreign_keys.values()]
+
+            key_columns = ()
+            if object_type == 'table':  # 视图的 rowid 不稳定，不能用来分页
+                column_names = {column.name.lower() for column in columns}
+                key_columns = primary_key
+                for alias in _ROWID_ALIASES:
+                    if alias in column_names:
+                        continue  # 被同名的真实列遮蔽
+                    try:
+                        cursor.execute(f"SELECT {alias} FROM {prefix}{table} LIMIT 0")
+                        key_columns = (alias,)
+                    except sqlite3.OperationalError:
+                        pass  # WITHOUT ROWID 表
+                    break
+
+        return TableSchema(table_name, object_type, tuple(columns), primary_key,
+                           tuple(indexes), tuple(foreign_keys), key_columns)
+
+    def build_select(self, table_name, columns=None, filters=(), order_by=None, descending=False,
+                     limit=None, offset=None):
+        """
+        构造 SELECT 语句，返回 (sql, params)
+        表名和列名都加引号（附加库的表带上库名前缀），filters 为 build_filter() 返回的条件，
+        过滤值、LIMIT 和 OFFSET 全部以参数绑定：只有参数不同的查询 SQL 文本相同，可以命中语句缓存
+        """
+        column_list = ", ".join(self._key_expr(name) for name in columns) if columns else "*"
+        sql = f"SELECT {column_list} FROM {self.table_sql(table_name)}"
+        params = [value for f in filters for value in f.params]
+        if filters:
+            sql += " WHERE " + " AND ".join(f.clause for f in filters)
+        if order_by:
+            sql += f" ORDER BY {quote_identifier(order_by)}{' DESC' if descending else ''}"
+        if limit is not None or offset:
+            sql += " LIMIT ?"
+            params.append(-1 if limit is None else limit)
+        if offset:
+            sql += " OFFSET ?"
+            params.append(offset)
+        return sql, params
+
+    def key_in_condition(self, key_columns, keys):
+        """
+        按键匹配一批行的条件，返回 (条件, 参数)：单列键为 键 IN (?, ...)，多列键为 (k1, k2) IN (VALUES (?, ?), ...)
+        占位符个数按 in_list_slots() 取整，不同批次大小共用少数几条语句
+        """
+        key_exprs = [self._key_expr(col) for col in key_columns]
+        keys = list(keys)
+        keys += [keys[-1]] * (in_list_slots(len(keys)) - len(keys))
+        params = [value for key in keys for value in key]
+        if len(key_exprs) == 1:
+            return f"{key_exprs[0]} IN ({', '.join(['?'] * len(keys))})", params
+        placeholders = "(" + ", ".join(["?"] * len(key_exprs)) + ")"
+        return f"({', '.join(key_exprs)}) IN (VALUES {', '.join([placeholders] * len(keys))})", params
+
+    def build_page_query(self, table_name, key_columns, after=None, limit=500, offset=0,
+                         order_by=None, descending=False, filters=()):
+        """
+        构造分页查询，返回 (sql, params)
+        有键列时使用键集分页：按 (排序列, 键) 排序，after 为上一页最后一行的 (排序值, *键)，
+        通过 WHERE (排序列, 键) > (?, ?) 直接从索引中定位，与页所在位置无关；
+        否则退化为 LIMIT/OFFSET 分页；有键列但不知道起始游标（after 为 None）时也用 offset 直接跳到该页
+        filters 为 build_filter() 返回的条件，全部以参数绑定
+        结果行的前几列依次为排序值（如有）和键值，之后是表中的列，
+        最后是 _value_columns() 为可能存放大值的列附加的大小说明
+        """
+        table = self.table_sql(table_name)
+        values = self._value_columns(table_name)[0]
+        conditions = [f.clause for f in filters]
+        params = [value for f in filters for value in f.params]
+        sort_expr = quote_identifier(order_by) if order_by else None
+        direction = " DESC" if descending else ""
+
+        if not key_columns:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            order = f"ORDER BY {sort_expr}{direction}" if sort_expr else ""
+            return (f"SELECT {values} FROM {table} {where} {order} LIMIT ? OFFSET ?",
+                    params + [limit, offset])
+
+        key_exprs = [self._key_expr(col) for col in key_columns]
+        cursor_exprs = ([sort_expr] if sort_expr else []) + key_exprs
+        if after is not None:
+            condition, condition_params = self._after_condition(sort_expr, key_exprs, after, descending)
+            conditions.append(condition)
+            params.extend(condition_params)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = ", ".join(f"{expr}{direction}" for expr in cursor_exprs)
+        params.append(limit)
+        limit_clause = "LIMIT ?"
+        if after is None and offset:
+            limit_clause += " OFFSET ?"
+            params.append(offset)
+        return (f"SELECT {', '.join(cursor_exprs)}, {values} FROM {table} {where} ORDER BY {order} {limit_clause}",
+                params)
+
+    @staticmethod
+    def _after_condition(sort_expr, key_exprs, after, descending):
+        """
+        键集分页的条件：按 (排序列, 键) 的顺序排在游标 after 之后的行，返回 (条件, 参数)
+        没有排序列时只按键比较（descending 时按键降序）
+        """
+        key_list = ", ".join(key_exprs)
+        key_placeholders = ", ".join(["?"] * len(key_exprs))
+        if sort_expr is None:
+            return f"({key_list}) {'<' if descending else '>'} ({key_placeholders})", list(after)
+        if after[0] is None:
+            # NULL 在升序中排在最前，在降序中排在最后，行值比较无法处理 NULL，需要单独分支
+            if descending:
+                return f"({sort_expr} IS NULL AND ({key_list}) < ({key_placeholders}))", list(after[1:])
+            return (f"(({sort_expr} IS NULL AND ({key_list}) > ({key_placeholders})) OR {sort_expr} IS NOT NULL)",
+                    list(after[1:]))
+        op = "<" if descending else ">"
+        null_branch = f" OR {sort_expr} IS NULL" if descending else ""
+        return f"(({sort_expr}, {key_list}) {op} (?, {key_placeholders}){null_branch})", list(after)
+
+    def row_position(self, table_name, key_columns, key, order_by=None, descending=False, filters=()):
+        """
+        返回键为 key 的行在分页查询（同样的排序和过滤条件）中的位置（从 0 开始），行不存在或被过滤掉时返回 None
+        没有排序列时只统计键排在它之前（升序时更小，降序时更大）的行，rowid 表上只需遍历 B 树的一部分；
+        有排序列时用总行数减去排在它之后的行数
+        """
+        table = self.table_sql(table_name)
+        key_exprs = [self._key_expr(col) for col in key_columns]
+        conditions = [f.clause for f in filters]
+        params = [value for f in filters for value in f.params]
+        where = " AND ".join(conditions + [f"{expr} = ?" for expr in key_exprs])
+        sort_expr = quote_identifier(order_by) if order_by else None
+        with self._browsing() as cursor:
+            cursor.execute(f"SELECT {sort_expr or 1} FROM {table} WHERE {where}", params + list(key))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            filter_where = " AND ".join(conditions)
+            if sort_expr is None:
+                op = ">" if descending else "<"
+                condition = f"({', '.join(key_exprs)}) {op} ({', '.join(['?'] * len(key_exprs))})"
+                cursor.execute(f"SELECT count(*) FROM {table} WHERE {' AND '.join(conditions + [condition])}",
+                               params + list(key))
+                return cursor.fetchone()[0]
+            condition, condition_params = self._after_condition(sort_expr, key_exprs, (row[0], *key), descending)
+            cursor.execute(f"SELECT count(*) FROM {table} {'WHERE ' + filter_where if filter_where else ''}", params)
+            total = cursor.fetchone()[0]
+            cursor.execute(f"SELECT count(*) FROM {table} WHERE {' AND '.join(conditions + [condition])}",
+                           params + condition_params)
+            return total - cursor.fetchone()[0] - 1
+
+    def _value_columns(self, table_name):
+        """
+        分页查询中表列部分的 SELECT 列表，返回 (sql, 附加了大小说明的列序号)
+        可能存放大值的列在读取时截断：BLOB 超过 SMALL_BLOB_LIMIT 字节时只返回 NULL，
+        TEXT 超过 LARGE_TEXT_LIMIT 个字符时只返回开头部分；被截断的值在所有列之后附加一列说明
+        ('b' 或 't' 加上大小)，由 _unpack_large_values() 转换为 LargeValue
+        typeof() 和 BLOB 的 length() 只读取记录头，不会把溢出页上的内容读进来
+        """
+        exprs = []
+        notes = []
+        large_columns = []
+        for index, column in enumerate(self.get_table_schema(table_name).columns):
+            name = quote_identifier(column.name)
+            if not may_hold_large_values(column.type):
+                exprs.append(name)
+                continue
+            exprs.append(f"CASE WHEN typeof({name}) = 'blob' THEN CASE WHEN length({name}) <= {SMALL_BLOB_LIMIT} "
+                         f"THEN {name} END WHEN length({name}) > {LARGE_TEXT_LIMIT} "
+                         f"THEN substr({name}, 1, {TEXT_PREFIX_CHARS}) ELSE {name} END")
+            notes.append(f"CASE WHEN typeof({name}) = 'blob' THEN CASE WHEN length({name}) > {SMALL_BLOB_LIMIT} "
+                         f"THEN 'b' || length({name}) END WHEN length({name}) > {LARGE_TEXT_LIMIT} "
+                         f"THEN 't' || length({name}) END")
+            large_columns.append(index)
+        return ", ".join(exprs + notes), large_columns
+
+    @staticmethod
+    def _unpack_large_values(rows, column_count, large_columns):
+        # 把附加的大小说明转换为 LargeValue，并去掉说明列
+        if not large_columns:
+            return rows
+        unpacked = []
+        for row in rows:
+            notes = row[column_count:]
+            values = row[:column_count]
+            if any(notes):
+                values = list(values)
+                for index, note in zip(large_columns, notes):
+                    if note:
+                        kind = 'blob' if note[0] == 'b' else 'text'
+                        values[index] = LargeValue(kind, int(note[1:]), values[index] if kind == 'text' else None)
+                values = tuple(values)
+            unpacked.append(values)
+        return unpacked
+
+    def fetch_page(self, table_name, key_columns, after=None, limit=500, offset=0,
+                   order_by=None, descending=False, filters=()):
+        """
+        读取一页数据，返回 (keys, rows, 下一页的 after)
+        无键列时 keys 为 None，使用 offset 分页
+        """
+        sql, params = self.build_page_query(table_name, key_columns, after, limit, offset,
+                                            order_by, descending, filters)
+        self.record_statement(sql, params)
+        with self._browsing() as cursor:
+            cursor.execute(sql, params)
+            result = cursor.fetchall()
+        column_count = len(self.get_table_schema(table_name).columns)
+        large_columns = self._value_columns(table_name)[1]
+        if not key_columns:
+            return None, self._unpack_large_values(result, column_count, large_columns), None
+
+        cursor_count = len(key_columns) + (1 if order_by else 0)
+        key_start = cursor_count - len(key_columns)
+        keys = []
+        rows = []
+        next_after = after
+        for row in result:
+            keys.append(row[key_start:cursor_count])
+            rows.append(row[cursor_count:])
+            next_after = row[:cursor_count]
+        return keys, self._unpack_large_values(rows, column_count, large_columns), next_after
+
+    def fetch_rows(self, table_name, key_columns, keys, batch_size=500):
+        """
+        按键读取若干行（列与 fetch_page 相同，大值同样截断），返回 {键: 行}，已不存在的行不在结果中
+        用于只重新读取被其他连接修改过的行
+        """
+        key_exprs = [self._key_expr(col) for col in key_columns]
+        column_count = len(self.get_table_schema(table_name).columns)
+        values, large_columns = self._value_columns(table_name)
+        keys = [tuple(key) for key in keys]
+        found = {}
+        with self._browsing() as cursor:
+            for start in range(0, len(keys), batch_size):
+                condition, params = self.key_in_condition(key_columns, keys[start:start + batch_size])
+                cursor.execute(f"SELECT {', '.join(key_exprs)}, {values} FROM {self.table_sql(table_name)} "
+                               f"WHERE {condition}", params)
+                rows = cursor.fetchall()
+                for key, row in zip((row[:len(key_exprs)] for row in rows),
+                                    self._unpack_large_values([row[len(key_exprs):] for row in rows],
+                                                              column_count, large_columns)):
+                    found[key] = row
+        return found
+
+    @contextmanager
+    def open_value(self, table_name, column_name, key_columns, key):
+        """
+        打开一个单元格的值用于按需读取，返回 ValueReader（上下文管理器，退出时关闭）
+        与表格浏览使用同一个连接，因此能看到未提交的修改；读取期间持有读事务，应尽快关闭
+        """
+        with self._browsing() as cursor:
+            reader = ValueReader(cursor.connection, table_name, column_name, key_columns, key, self.schema_name)
+            try:
+                yield reader
+            finally:
+                reader.close()
+
+    def save_value_to_file(self, table_name, column_name, key_columns, key, path, chunk_size=1024 * 1024):
+        """把单元格的值按块写入文件，不把整个值读入内存，返回写入的字节数"""
+        with self.open_value(table_name, column_name, key_columns, key) as reader, open(path, "wb") as f:
+            for offset in range(0, reader.size, chunk_size):
+                f.write(reader.read(offset, chunk_size))
+            return reader.size
+
+    def write_value_from_file(self, table_name, column_name, key_columns, key, path, as_text=False,
+                              chunk_size=1024 * 1024):
+        """
+        用文件内容替换单元格的值（不提交），as_text 为 True 时按 UTF-8 文本保存
+        rowid 表先用 zeroblob() 把值设为文件的大小，再通过 blobopen 增量写入，不把整个文件读入内存；
+        WITHOUT ROWID 表不支持增量 BLOB I/O，只能读入整个文件后 UPDATE
+        """
+        size = os.path.getsize(path)
+        table = self.table_sql(table_name)
+        column = quote_identifier(column_name)
+        where = " AND ".join(f"{self._key_expr(col)} = ?" for col in key_columns)
+        with self.writing():
+            if is_rowid_key(key_columns) and hasattr(self.conn, "blobopen"):
+                placeholder = "CAST(zeroblob(?) AS TEXT)" if as_text else "zeroblob(?)"
+                # UPDATE 会开启事务，随后的增量写入属于同一个事务，保存或回滚时一起处理
+                self.cursor.execute(f"UPDATE {table} SET {column} = {placeholder} WHERE {where}", (size, *key))
+                with self.conn.blobopen(table_name, column_name, key[0], name=self.schema_name) as blob, open(path, "rb") as f:
+                    while True:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        blob.write(chunk)
+            else:
+                with open(path, "rb") as f:
+                    value = f.read()
+                if as_text:
+                    value = value.decode("utf-8")
+                self.cursor.execute(f"UPDATE {table} SET {column} = ? WHERE {where}", (value, *key))
+        return size
+
+    def explain_query_plan(self, sql, params=()):
+        """返回 EXPLAIN QUERY PLAN 的 (id, parent, detail) 列表"""
+        with self._browsing() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [(row[0], row[1], row[3]) for row in cursor.fetchall()]
+
+    def page_query_needs_full_scan(self, table_name, key_columns, order_by=None, descending=False, filters=()):
+        """
+        检查排序/过滤后的分页查询是否需要全表扫描或临时排序
+        返回需要注意的查询计划步骤列表，为空表示可以利用索引
+        """
+        steps = []
+        if filters:
+            # 过滤条件本身能否利用索引（不含分页条件）
+            where = " AND ".join(f.clause for f in filters)
+            sql = f"SELECT * FROM {self.table_sql(table_name)} WHERE {where}"
+            steps.extend(self.explain_query_plan(sql, [value for f in filters for value in f.params]))
+        if order_by:
+            # 带上分页条件检查排序，避免把首页的 LIMIT 扫描误判为全表扫描
+            after = (0,) * (len(key_columns) + 1) if key_columns else None
+            sql, params = self.build_page_query(table_name, key_columns, after=after, limit=1,
+                                                order_by=order_by, descending=descending, filters=filters)
+            steps.extend(self.explain_query_plan(sql, params))
+        return list(dict.fromkeys(detail for _, _, detail in steps if is_full_scan_step(detail)))
+
+    def data_version(self):
+        """
+        返回只读浏览连接上该库的 PRAGMA data_version
+        任何连接（包括本程序的写连接）提交修改后这个值都会变化，用作行数缓存的版本号
+        """
+        self.pool.refresh_reader(self._browse_conn)
+        return self._browse_conn.execute(f"PRAGMA {self._prefix}data_version").fetchone()[0]
+
+    def cache_version(self):
+        """
+        查询结果缓存的版本号：(工作区中各库的 data_version, 写连接的 total_changes)
+        其他连接（包括本程序的写连接）提交修改时 data_version 变化，
+        本程序在写连接上的修改（即使还没有提交）会增加 total_changes；
+        SQL 框中的查询可能跨库，因此任何一个库有变化都会使缓存失效
+        """
+        self.pool.refresh_reader(self._browse_conn)
+        versions = tuple(
+            self._browse_conn.execute(f"PRAGMA {schema_prefix(name)}data_version").fetchone()[0]
+            for name, _, _ in self.pool.databases())
+        return versions, self.conn.total_changes
+
+    def cache_result(self, sql, params, version, result):
+        """
+        把查询结果 (ChunkedResult) 放入结果缓存
+        version 为开始执行查询前读取的 cache_version()，执行期间数据有变化时不缓存；返回是否已缓存
+        """
+        if version != self.cache_version():
+            return False
+        return self.result_cache.put(sql, params, version, result)
+
+    def cached_row_count(self, table_name):
+        """返回缓存的精确行数；没有缓存或数据已变化时返回 None"""
+        entry = self._row_counts.get(table_name)
+        if entry is None or entry[0] != self.data_version():
+            return None
+        return entry[1]
+
+    def store_row_count(self, table_name, version, count):
+        # version 为开始统计前读取的 data_version，统计期间数据有变化时缓存会在下次检查时失效
+        self._row_counts[table_name] = (version, count)
+
+    def estimate_row_counts(self):
+        """从 sqlite_stat1 读取所有表的估计行数 {表名: 行数}，没有运行过 ANALYZE 时返回空字典"""
+        with self._browsing() as cursor:
+            cursor.execute(f"SELECT 1 FROM {self._prefix}sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return {}
+            cursor.execute(f"SELECT tbl, idx, stat FROM {self._prefix}sqlite_stat1")
+            rows = cursor.fetchall()
+        estimates = {}
+        for table_name, index_name, stat in rows:
+            try:
+                count = int(stat.split()[0])  # 第一个数是表（或索引）的行数
+            except (AttributeError, IndexError, ValueError):
+                continue
+            if index_name is None:
+                estimates[table_name] = count  # 表本身的统计最准确
+            elif table_name not in estimates or count > estimates[table_name]:
+                estimates[table_name] = count
+        return estimates
+
+    def estimate_row_count(self, table_name):
+        """
+        不扫描表，立即返回估计的行数；无法估计时返回 None
+        优先使用 sqlite_stat1 中的统计，其次对 rowid 表使用 max(rowid)（只读取 B 树最右端）
+        """
+        estimate = self.estimate_row_counts().get(table_name)
+        if estimate is not None:
+            return estimate
+        key_columns = self.get_row_key_columns(table_name)
+        if is_rowid_key(key_columns):
+            with self._browsing() as cursor:
+                cursor.execute(f"SELECT max({key_columns[0]}) FROM {self.table_sql(table_name)}")
+                return cursor.fetchone()[0] or 0
+        return None
+
+    def analyze(self, table_name=None, analysis_limit=1000):
+        """
+        运行 ANALYZE 更新 sqlite_stat1
+        analysis_limit 限制每个索引只抽样检查这么多行，大表上也能很快完成，0 表示完整分析
+        """
+        if table_name:
+            target = f" {self.table_sql(table_name)}"
+        else:
+            target = f" {quote_identifier(self.schema_name)}" if self._prefix else ""
+        with self.writing():
+            self.cursor.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+            try:
+                self.cursor.execute(f"ANALYZE{target}")
+            finally:
+                self.cursor.execute("PRAGMA analysis_limit = 0")
+
+    def create_index(self, table_name, column_names):
+        """为指定列创建索引，返回索引名"""
+        index_name = "idx_" + "_".join([table_name] + list(column_names))
+        columns = ", ".join(quote_identifier(name) for name in column_names)
+        with self.writing():
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self._prefix}{quote_identifier(index_name)} "
+                f"ON {quote_identifier(table_name)} ({columns})")
+        return index_name
+
+    def update_cells(self, table_name, key_columns, column_name, items):
+        """
+        批量更新同一列的多个单元格（不提交）
+        items 为 (新值, 键) 列表，通过 executemany 复用同一条预编译语句
+        """
+        where = " AND ".join(f"{self._key_expr(col)} = ?" for col in key_columns)
+        with self.writing():
+            self.cursor.executemany(
+                f"UPDATE {self.table_sql(table_name)} SET {quote_identifier(column_name)} = ? WHERE {where}",
+                ((value, *key) for value, key in items))
+
+    def delete_rows(self, table_name, key_columns, keys, batch_size=500):
+        # 按真实键批量删除行（不提交），每批一条 DELETE ... WHERE key IN (...)
+        table = self.table_sql(table_name)
+        with self.writing():
+            for start in range(0, len(keys), batch_size):
+                condition, params = self.key_in_condition(key_columns, keys[start:start + batch_size])
+                self.cursor.execute(f"DELETE FROM {table} WHERE {condition}", params)
+
+    def insert_rows(self, table_name, column_names, rows):
+        # 批量插入行（不提交）
+        columns_str = ", ".join(quote_identifier(name) for name in column_names)
+        placeholders = ", ".join(["?"] * len(column_names))
+        with self.writing():
+            self.cursor.executemany(
+                f"INSERT INTO {self.table_sql(table_name)} ({columns_str}) VALUES ({placeholders})", rows)
+
+    @staticmethod
+    def _key_expr(column_name):
+        # rowid 别名不能加引号，否则在没有同名列时会被当作字符串字面量
+        if column_name.lower() in _ROWID_ALIASES:
+            return column_name
+        return quote_identifier(column_name)
+
+    def execute_query(self, query, params=()):
+        # 执行自定义查询（在写连接上执行，可以看到未提交的修改）；params 为 ? 的参数列表或 :name 的参数字典
+        self.record_statement(query, params)
+        with self.writing():
+            self.cursor.execute(query, params)
+            data = self.cursor.fetchall()
+            description = self.cursor.description
         
         # 如果是SELECT查询，则会有description，否则为None
-        if self.cursor.description:
-            headers = [description[0] for description in self.cursor.description]
+        if description:
+            headers = [column[0] for column in description]
             return data, headers
         else:
             # 不再自动提交非SELECT查询，让应用层控制提交
@@ -43,8 +852,10 @@ class DBConnector:
     
     def commit(self):
         """提交所有待处理的事务"""
-        self.conn.commit()
+        with self.writing():
+            self.conn.commit()
     
     def rollback(self):
         """回滚所有待处理的事务"""
-        self.conn.rollback()
+        with self.writing():
+            self.conn.rollback()
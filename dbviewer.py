@@ -1,20 +1,68 @@
 import os
+import re
 import sqlite3
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QAction, QFileDialog, QTreeWidget, QTreeWidgetItem,
-                            QSplitter, QTableWidget, QTableWidgetItem, QHeaderView,
+                            QSplitter, QTableView, QHeaderView,
                             QTextEdit, QPushButton, QMessageBox, QTabWidget, QLabel,
-                            QStatusBar, QAbstractItemView, QInputDialog)
-from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt, QSize, QEvent
-from db_connector import DBConnector
+                            QStatusBar, QAbstractItemView, QInputDialog, QLineEdit,
+                            QProgressDialog, QDockWidget, QTabBar, QComboBox)
+from PyQt5.QtGui import QIcon, QFont, QCursor
+from PyQt5.QtCore import Qt, QSize, QEvent, QTimer, QElapsedTimer
+from db_connector import DBConnector, build_filter, format_size, is_read_only_query
+from table_model import DiffTableModel, PagedTableModel, ResultTableModel, is_large_value
+from query_worker import QueryWorker, RowCountWorker, ExportWorker, ImportWorker
+from import_dialog import ImportDialog
+from filter_bar import ColumnFilterBar
+from column_sizer import ColumnSizer
+from profiler import ProfileHistory, StatementTracer, WorkloadLog
+from profiler_panel import ProfilerPanel
+from exporter import EXPORT_FORMATS, format_from_path, table_query
+from edit_buffer import EditBuffer
+from connection_pool import ConnectionSettings
+from connection_dialog import ConnectionSettingsDialog
+from value_preview import ValuePreviewPanel
+from maintenance import MAINTENANCE_TASKS
+from maintenance_panel import MaintenancePanel
+from index_advisor_panel import IndexAdvisorPanel
+from search_panel import SearchPanel
+from diff_panel import DiffPanel
+from change_tracker import ChangeTracker, ChangeTrackingUnavailable, remove_stale_objects
+from saved_queries import SavedQueryStore, query_parameters, saved_queries_path
+from parameter_dialog import ParameterDialog
+from result_cache import is_cacheable_query
 
 class DBViewer(QMainWindow):
+    QUERY_CACHE_ROWS = 100000  # 结果不超过这么多行的查询才放入结果缓存
+    
     def __init__(self):
         super().__init__()
-        self.db = None
+        self.workspace = None  # 主数据库的连接器，其他数据库通过它附加 (ATTACH)
+        self.databases = {}  # 库名 -> DBConnector，包括主库 main，顺序与标签页一致
+        self.db = None  # 当前标签页的数据库
         self.current_table = None
-        self.db_modified = False  # 添加修改状态跟踪
+        self.current_tables = {}  # 库名 -> 该标签页上次打开的表
+        self.model = None
+        self.query_worker = None  # 正在后台执行的查询
+        self.count_workers = []  # 正在后台统计各库的行数
+        self.table_count_worker = None  # 正在后台统计当前表的行数
+        self.current_row_estimate = None  # 当前表的估计行数（精确行数统计完成前显示）
+        self.export_worker = None  # 正在后台导出
+        self.import_worker = None  # 正在后台导入
+        self.tree_table_items = {}  # (库名, 表名) -> 树节点，用于回填行数
+        self.table_row_counts = {}  # 库名 -> 后台统计得到的各表行数
+        self.ignored_scan_warnings = set()  # 用户选择不再提示全表扫描的 (库, 表, 列)
+        self.current_query_model = None
+        self.query_widths_adjusted = False
+        self.db_modified = False  # 连接上是否有未提交的修改（如 SQL 框中执行的写语句）
+        self.edit_buffers = {}  # 库名 -> 该库待保存的编辑
+        self.edit_buffer = EditBuffer()  # 当前数据库的表格中待保存的编辑
+        self.tracer = StatementTracer()  # 记录应用执行的所有语句
+        self.profile_history = ProfileHistory()  # 查询的历史性能数据
+        self.workload = WorkloadLog()  # 执行过的查询及其参数，供索引建议使用
+        self.connection_settings = ConnectionSettings()  # 打开（和附加）数据库时使用的连接参数
+        self.saved_queries = None  # 主数据库的命名查询 (SavedQueryStore)
+        self.parameter_texts = {}  # 参数名 -> 上次输入的文本，作为参数对话框的默认值
         self.init_ui()
 
     def init_ui(self):
@@ -27,6 +75,12 @@ class DBViewer(QMainWindow):
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage('准备就绪')
+        # 当前行位置和表的总行数
+        self.row_position_label = QLabel()
+        self.statusBar.addPermanentWidget(self.row_position_label)
+        # 正在监视的表和监视方式
+        self.watch_label = QLabel()
+        self.statusBar.addPermanentWidget(self.watch_label)
 
         # 创建菜单栏
         menubar = self.menuBar()
@@ -38,12 +92,44 @@ class DBViewer(QMainWindow):
         open_action.triggered.connect(self.open_database)
         file_menu.addAction(open_action)
         
+        # 以只读、不可变方式打开并内存映射整个文件，适合浏览很大的数据库
+        fast_open_action = QAction('只读快速打开...', self)
+        fast_open_action.setShortcut('Ctrl+Shift+O')
+        fast_open_action.triggered.connect(lambda: self.open_database(read_only=True))
+        file_menu.addAction(fast_open_action)
+        
+        # 把其他数据库附加到当前连接，可以跨库查询
+        attach_action = QAction('附加数据库...', self)
+        attach_action.triggered.connect(self.attach_database)
+        file_menu.addAction(attach_action)
+        
+        detach_action = QAction('分离数据库', self)
+        detach_action.triggered.connect(self.detach_database)
+        file_menu.addAction(detach_action)
+        
         # 添加保存操作
         save_action = QAction('保存修改', self)
         save_action.setShortcut('Ctrl+S')
         save_action.triggered.connect(self.save_changes)
         file_menu.addAction(save_action)
         
+        # 导出当前表或查询结果
+        export_action = QAction('导出...', self)
+        export_action.setShortcut('Ctrl+E')
+        export_action.triggered.connect(self.export_data)
+        file_menu.addAction(export_action)
+        
+        # 从 CSV / JSON Lines 批量导入
+        import_action = QAction('导入...', self)
+        import_action.setShortcut('Ctrl+I')
+        import_action.triggered.connect(self.import_data)
+        file_menu.addAction(import_action)
+        
+        # busy_timeout、缓存、内存映射和 WAL 等连接参数
+        connection_action = QAction('连接设置...', self)
+        connection_action.triggered.connect(self.edit_connection_settings)
+        file_menu.addAction(connection_action)
+        
         # 添加编辑菜单
         edit_menu = menubar.addMenu('编辑')
         
@@ -53,6 +139,13 @@ class DBViewer(QMainWindow):
         refresh_action.triggered.connect(self.refresh_current_table)
         edit_menu.addAction(refresh_action)
         
+        # 监视当前表：其他程序修改后只重新读取变化的行
+        self.watch_action = QAction('监视当前表的变化', self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.setShortcut('Ctrl+Shift+W')
+        self.watch_action.toggled.connect(self.toggle_watching)
+        edit_menu.addAction(self.watch_action)
+        
         # 添加表格修改操作
         add_row_action = QAction('添加行', self)
         add_row_action.triggered.connect(self.add_row_dialog)
@@ -62,6 +155,30 @@ class DBViewer(QMainWindow):
         delete_row_action.triggered.connect(self.delete_selected_rows)
         edit_menu.addAction(delete_row_action)
         
+        # 撤销/重做待保存的编辑
+        edit_menu.addSeparator()
+        undo_action = QAction('撤销', self)
+        undo_action.setShortcut('Ctrl+Z')
+        undo_action.triggered.connect(self.undo_edit)
+        edit_menu.addAction(undo_action)
+        
+        redo_action = QAction('重做', self)
+        redo_action.setShortcut('Ctrl+Y')
+        redo_action.triggered.connect(self.redo_edit)
+        edit_menu.addAction(redo_action)
+        
+        # 更新 sqlite_stat1，用于立即显示估计行数和优化查询计划
+        edit_menu.addSeparator()
+        analyze_action = QAction('更新统计信息 (ANALYZE)', self)
+        analyze_action.triggered.connect(self.analyze_database)
+        edit_menu.addAction(analyze_action)
+        # 只读打开数据库时禁用的修改操作
+        self.edit_actions = [save_action, import_action, add_row_action, delete_row_action,
+                             undo_action, redo_action, analyze_action]
+        
+        # 视图菜单
+        view_menu = menubar.addMenu('视图')
+        
         # 退出动作
         exit_action = QAction('退出', self)
         exit_action.setShortcut('Ctrl+Q')
@@ -76,27 +193,60 @@ class DBViewer(QMainWindow):
         # 创建分割器
         splitter = QSplitter(Qt.Horizontal)
         
-        # 创建左侧树状视图
+        # 创建左侧树状视图和过滤框
+        left_widget = QWidget()
+        left_layout = QVBoxLayout(left_widget)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.tree_filter = QLineEdit()
+        self.tree_filter.setPlaceholderText("过滤表名...")
+        self.tree_filter.setClearButtonEnabled(True)
+        self.tree_filter.textChanged.connect(self.filter_tree)
+        
         self.tree = QTreeWidget()
         self.tree.setHeaderLabel('数据库结构')
         self.tree.setMinimumWidth(250)
         self.tree.itemClicked.connect(self.on_tree_item_clicked)
-        splitter.addWidget(self.tree)
+        # 列信息在展开节点时才读取
+        self.tree.itemExpanded.connect(self.on_tree_item_expanded)
+        
+        left_layout.addWidget(self.tree_filter)
+        left_layout.addWidget(self.tree)
+        splitter.addWidget(left_widget)
         
         # 右侧部分
         right_widget = QWidget()
         right_layout = QVBoxLayout(right_widget)
         
-        # 创建表格视图
-        self.table = QTableWidget()
+        # 每个数据库（主库和附加的库）一个标签页
+        self.database_tabs = QTabBar()
+        self.database_tabs.setExpanding(False)
+        self.database_tabs.currentChanged.connect(self.on_database_tab_changed)
+        self.database_tabs.hide()
+        
+        # 创建表格视图（数据由模型按页懒加载）
+        self.table = QTableView()
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
-        self.table.horizontalHeader().setMinimumSectionSize(100)
+        self.table.horizontalHeader().setMinimumSectionSize(40)
         self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         # 允许编辑单元格
         self.table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
-        # 连接单元格修改信号
-        self.table.itemChanged.connect(self.on_cell_changed)
+        # 点击列头时在 SQL 中排序
+        self.table.horizontalHeader().setSortIndicatorShown(True)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.horizontalHeader().sectionClicked.connect(self.on_header_clicked)
+        self.table.verticalScrollBar().valueChanged.connect(self.update_row_indicator)
+        # BLOB 和长文本不能在表格中编辑，双击时打开值预览面板
+        self.table.doubleClicked.connect(self.on_cell_double_clicked)
+        
+        # 逐列过滤行，过滤条件转换为参数化的 WHERE 子句
+        self.filter_bar = ColumnFilterBar(self.table)
+        self.filter_bar.filtersChanged.connect(self.on_filters_changed)
+        self.filter_bar.hide()
+        
+        # 按字体实际宽度测量抽样的行来设置列宽，按表缓存
+        self.column_sizer = ColumnSizer(self.table, parent=self)
         
         # 创建 SQL 查询区域
         sql_layout = QHBoxLayout()
@@ -108,9 +258,37 @@ class DBViewer(QMainWindow):
         execute_button.clicked.connect(self.execute_query)
         execute_button.setMaximumWidth(100)
         
+        # 取消按钮，仅在后台查询执行时可用
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel_query)
+        self.cancel_button.setMaximumWidth(100)
+        self.cancel_button.setEnabled(False)
+        
+        # 命名查询：选中后载入 SQL 框，其中的 :name 参数在执行时填写
+        self.saved_query_combo = QComboBox()
+        self.saved_query_combo.setMaximumWidth(160)
+        self.saved_query_combo.setToolTip("已保存的查询")
+        self.saved_query_combo.activated.connect(self.load_saved_query)
+        save_query_button = QPushButton("保存查询...")
+        save_query_button.clicked.connect(self.save_query)
+        save_query_button.setMaximumWidth(100)
+        self.remove_query_button = QPushButton("删除查询")
+        self.remove_query_button.clicked.connect(self.remove_saved_query)
+        self.remove_query_button.setMaximumWidth(100)
+        
+        button_layout = QVBoxLayout()
+        button_layout.addWidget(execute_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(self.saved_query_combo)
+        button_layout.addWidget(save_query_button)
+        button_layout.addWidget(self.remove_query_button)
+        self.update_saved_queries()
+        
         sql_layout.addWidget(self.sql_input)
-        sql_layout.addWidget(execute_button)
+        sql_layout.addLayout(button_layout)
         
+        right_layout.addWidget(self.database_tabs)
+        right_layout.addWidget(self.filter_bar)
         right_layout.addWidget(self.table, stretch=4)
         right_layout.addLayout(sql_layout, stretch=1)
         
@@ -118,10 +296,97 @@ class DBViewer(QMainWindow):
         splitter.setSizes([250, 950])
         
         main_layout.addWidget(splitter)
+        
+        # 性能分析面板（默认隐藏，可从视图菜单打开）
+        self.profiler_panel = ProfilerPanel(self.profile_history, self.tracer)
+        self.profiler_dock = QDockWidget('性能分析', self)
+        self.profiler_dock.setWidget(self.profiler_panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.profiler_dock)
+        self.profiler_dock.hide()
+        profiler_action = self.profiler_dock.toggleViewAction()
+        profiler_action.setShortcut('F9')
+        view_menu.addAction(profiler_action)
+        
+        # 值预览面板：按需读取 BLOB/长文本，显示为十六进制、文本或图片
+        self.value_preview = ValuePreviewPanel()
+        self.value_preview.valueReplaced.connect(self.on_value_replaced)
+        self.value_preview_dock = QDockWidget('值预览', self)
+        self.value_preview_dock.setWidget(self.value_preview)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.value_preview_dock)
+        self.value_preview_dock.hide()
+        self.value_preview_dock.visibilityChanged.connect(self.update_value_preview)
+        value_preview_action = self.value_preview_dock.toggleViewAction()
+        value_preview_action.setShortcut('F10')
+        view_menu.addAction(value_preview_action)
+        
+        # 数据库维护面板：ANALYZE、VACUUM、完整性检查等在后台执行
+        self.maintenance_panel = MaintenancePanel(before_start=self.confirm_maintenance)
+        self.maintenance_panel.maintenanceFinished.connect(self.on_maintenance_finished)
+        self.maintenance_dock = QDockWidget('数据库维护', self)
+        self.maintenance_dock.setWidget(self.maintenance_panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.maintenance_dock)
+        self.maintenance_dock.hide()
+        maintenance_action = self.maintenance_dock.toggleViewAction()
+        maintenance_action.setShortcut('F11')
+        view_menu.addAction(maintenance_action)
+        
+        # 索引建议面板：分析执行过的查询，一键创建索引并对比前后耗时
+        self.index_advisor = IndexAdvisorPanel(self.workload, before_apply=self.confirm_index_creation)
+        self.index_advisor.indexCreated.connect(self.on_index_created)
+        self.index_advisor_dock = QDockWidget('索引建议', self)
+        self.index_advisor_dock.setWidget(self.index_advisor)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.index_advisor_dock)
+        self.index_advisor_dock.hide()
+        index_advisor_action = self.index_advisor_dock.toggleViewAction()
+        index_advisor_action.setShortcut('F12')
+        view_menu.addAction(index_advisor_action)
+        
+        # 全局搜索面板：在数据库文件旁的 FTS5 索引中搜索所选表的文本，双击结果跳转到该行
+        self.search_panel = SearchPanel()
+        self.search_panel.rowActivated.connect(self.jump_to_row)
+        self.search_dock = QDockWidget('全局搜索', self)
+        self.search_dock.setWidget(self.search_panel)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.search_dock)
+        self.search_dock.hide()
+        search_action = self.search_dock.toggleViewAction()
+        search_action.setShortcut('Ctrl+Shift+F')
+        search_action.triggered.connect(lambda checked: checked and self.search_panel.search_edit.setFocus())
+        view_menu.addAction(search_action)
+        
+        # 数据比较面板：按主键比较两个库中的表，差异显示在表格中，可生成 SQL 补丁
+        self.diff_panel = DiffPanel()
+        self.diff_panel.diffSelected.connect(self.show_diff)
+        self.diff_dock = QDockWidget('数据比较', self)
+        self.diff_dock.setWidget(self.diff_panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.diff_dock)
+        self.diff_dock.hide()
+        diff_action = self.diff_dock.toggleViewAction()
+        diff_action.setShortcut('Ctrl+Shift+D')
+        view_menu.addAction(diff_action)
+        
+        # 后台查询执行期间定时刷新状态栏中的行数和耗时
+        self.query_clock = QElapsedTimer()
+        self.query_status_timer = QTimer(self)
+        self.query_status_timer.setInterval(200)
+        self.query_status_timer.timeout.connect(self.update_query_status)
+        
+        # 监视表时定时检查 data_version，只有其他连接提交过修改时才读取变化
+        self.change_tracker = None
+        self.watched_table = None  # (DBConnector, 表名)
+        self.watch_version = None
+        self.stale_watch_triggers = False  # 停止监视时有未提交的修改，触发器留到提交后删除
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(500)
+        self.watch_timer.timeout.connect(self.check_table_changes)
     
-    def open_database(self):
+    def open_database(self, read_only=False):
+        """
+        打开数据库文件作为新的工作区
+        read_only 为 True 时只读快速打开：mode=ro&immutable=1 并内存映射整个文件，浏览时不加任何锁，
+        页直接从操作系统的页缓存读取；所有修改操作被禁用
+        """
         # 在打开新数据库前检查是否有未保存的修改
-        if self.db is not None and self.db_modified:
+        if self.db is not None and self.has_unsaved_changes():
             reply = QMessageBox.question(self, '未保存的修改', 
                                         '当前数据库有未保存的修改，是否保存？',
                                         QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
@@ -142,55 +407,426 @@ class DBViewer(QMainWindow):
         
         if file_name:
             try:
-                self.db = DBConnector(file_name)
-                self.db_modified = False  # 重置修改状态
+                self.close_database()
+                settings = self.connection_settings
+                if read_only:
+                    settings = settings.fast_read_only(os.path.getsize(file_name))
+                self.open_workspace(DBConnector(file_name, tracer=self.tracer, settings=settings,
+                                                workload=self.workload, read_only=read_only))
                 self.refresh_tree()
-                self.statusBar.showMessage(f'已连接到数据库: {os.path.basename(file_name)}')
+                if read_only:
+                    self.statusBar.showMessage(f'已只读打开 {os.path.basename(file_name)}，'
+                                               f'{self.read_only_status(self.workspace)}')
+                else:
+                    self.statusBar.showMessage(f'已连接到数据库: {os.path.basename(file_name)}')
             except Exception as e:
                 QMessageBox.critical(self, "错误", f"无法打开数据库: {str(e)}")
     
+    def close_database(self):
+        """停止所有使用当前数据库的后台任务，然后关闭它的全部连接"""
+        self.stop_query_worker()
+        self.stop_count_worker()
+        self.stop_table_count_worker()
+        self.stop_export_worker()
+        self.stop_import_worker()
+        if self.change_tracker is not None:
+            try:
+                # 未保存的修改本来就会丢弃；先回滚，删除触发器才不会并入这些修改被一起丢弃
+                self.workspace.rollback()
+            except Exception:
+                pass
+        self.stop_watching()
+        self.maintenance_panel.set_database(None)
+        self.index_advisor.set_database(None)
+        self.search_panel.stop()
+        self.search_panel.set_databases({})
+        self.diff_panel.set_databases({})
+        if self.workspace is not None:
+            self.set_model(None)
+            self.current_table = None
+            self.workspace.close()  # 附加的库使用同一组连接，一起关闭
+            self.workspace = None
+            self.db = None
+            self.databases = {}
+            self.edit_buffers = {}
+            self.edit_buffer = EditBuffer()
+            self.current_tables = {}
+            self.database_tabs.blockSignals(True)
+            while self.database_tabs.count():
+                self.database_tabs.removeTab(0)
+            self.database_tabs.blockSignals(False)
+            self.database_tabs.hide()
+            self.column_sizer.clear()
+        self.saved_queries = None
+        self.update_saved_queries()
+        self.set_edit_actions_enabled(True)
+    
+    def read_only_status(self, db):
+        """只读打开的数据库的映射情况，如 "不可变，已映射 1.2 GB / 1.2 GB" """
+        mapped, file_size = db.mapped_size()
+        if db.pool.is_immutable(db.db_path):
+            mode = "不可变"
+        else:
+            mode = "有未写回的 WAL，使用普通只读方式（可以看到 WAL 中的修改）"
+        return f"{mode}，已映射 {format_size(mapped)} / {format_size(file_size)}"
+    
+    def set_edit_actions_enabled(self, enabled):
+        for action in self.edit_actions:
+            action.setEnabled(enabled)
+    
+    def open_workspace(self, db):
+        """以 db 为主数据库建立工作区（之前打开的数据库应已通过 close_database() 关闭）"""
+        self.workspace = db
+        self.db_modified = False  # 重置修改状态
+        self.workload.clear()  # 记录的语句属于之前的数据库
+        self.index_advisor.set_database(db)
+        self.set_edit_actions_enabled(not db.read_only)
+        self.load_saved_queries(db.db_path)
+        self.add_database(db)
+        self.search_panel.set_databases(self.databases)
+        self.diff_panel.set_databases(self.databases)
+        self.select_database("main")
+    
+    def add_database(self, db):
+        """登记工作区中的一个数据库：各自的编辑缓冲区和标签页"""
+        name = db.schema_name
+        remove_stale_objects(db)  # 上次异常退出时留下的监视触发器
+        self.databases[name] = db
+        self.edit_buffers[name] = EditBuffer()
+        self.database_tabs.blockSignals(True)
+        read_only = "（只读）" if db.read_only else ""
+        index = self.database_tabs.addTab(f"{name}: {os.path.basename(db.db_path)}{read_only}")
+        self.database_tabs.setTabData(index, name)
+        self.database_tabs.setTabToolTip(index, db.db_path)
+        self.database_tabs.blockSignals(False)
+        self.database_tabs.show()
+    
+    def select_database(self, name, restore_table=True):
+        """切换到数据库 name 的标签页；restore_table 为 True 时重新打开该库上次打开的表"""
+        db = self.databases[name]
+        self.maintenance_panel.set_database(db)
+        if db is not self.db:
+            self.db = db
+            self.edit_buffer = self.edit_buffers[name]
+            self.current_table = self.current_tables.get(name)
+            if restore_table:
+                if self.current_table:
+                    self.display_table_data(self.current_table)
+                else:
+                    self.stop_table_count_worker()
+                    self.set_model(None)
+        for index in range(self.database_tabs.count()):
+            if self.database_tabs.tabData(index) == name:
+                self.database_tabs.blockSignals(True)
+                self.database_tabs.setCurrentIndex(index)
+                self.database_tabs.blockSignals(False)
+    
+    def on_database_tab_changed(self, index):
+        name = self.database_tabs.tabData(index)
+        if name in self.databases:
+            self.select_database(name)
+    
+    def attach_database(self):
+        """ATTACH 另一个数据库文件：在树中作为单独的根节点，在 SQL 中用 库名.表名 跨库查询"""
+        if self.workspace is None:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "附加数据库文件", "", "数据库文件 (*.db *.sqlite *.sqlite3);;所有文件 (*)")
+        if not file_name:
+            return
+        default_name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(file_name))[0]) or "db"
+        if default_name[0].isdigit():
+            default_name = "db_" + default_name
+        suffix = 2
+        candidate = default_name
+        while candidate.lower() in {name.lower() for name in self.databases} | {"temp"}:
+            candidate = f"{default_name}_{suffix}"
+            suffix += 1
+        name, ok = QInputDialog.getText(self, "附加数据库", "数据库名（在 SQL 中作为表名前缀）:", text=candidate)
+        name = name.strip()
+        if not ok or not name:
+            return
+        settings = self.connection_settings
+        if self.workspace.read_only:
+            settings = settings.fast_read_only(os.path.getsize(file_name))
+        try:
+            db = self.workspace.attach(file_name, name, settings=settings)
+        except Exception as e:
+            QMessageBox.warning(self, "无法附加数据库", str(e))
+            return
+        self.add_database(db)
+        self.search_panel.set_databases(self.databases)
+        self.diff_panel.set_databases(self.databases)
+        self.refresh_tree()
+        self.select_database(name)
+        message = f"已附加 {os.path.basename(file_name)}，在 SQL 中使用 {name}.表名 访问其中的表"
+        if db.read_only:
+            message += f"（只读，{self.read_only_status(db)}）"
+        self.statusBar.showMessage(message)
+    
+    def detach_database(self):
+        """分离当前标签页的附加数据库"""
+        db = self.db
+        if db is None or db.workspace is None:
+            QMessageBox.information(self, "提示", "请先切换到要分离的附加数据库的标签页（主数据库不能分离）")
+            return
+        name = db.schema_name
+        if self.has_unsaved_changes():
+            # DETACH 不能在事务中执行
+            reply = QMessageBox.question(self, '未保存的修改', '分离数据库前需要先保存当前的修改，是否保存？',
+                                        QMessageBox.Save | QMessageBox.Cancel, QMessageBox.Save)
+            if reply != QMessageBox.Save:
+                return
+            self.save_changes()
+            if self.has_unsaved_changes():
+                return
+        # 后台任务可能正在读取这个库
+        self.stop_query_worker()
+        self.stop_count_worker()
+        self.stop_table_count_worker()
+        self.stop_export_worker()
+        if self.watched_table is not None and self.watched_table[0] is db:
+            self.stop_watching()
+        self.maintenance_panel.set_database(None)
+        self.index_advisor.stop()
+        remaining = {other: other_db for other, other_db in self.databases.items() if other != name}
+        self.search_panel.set_databases(remaining)
+        self.diff_panel.set_databases(remaining)
+        try:
+            db.close()
+        except Exception as e:
+            QMessageBox.warning(self, "无法分离数据库", str(e))
+            return
+        del self.databases[name]
+        del self.edit_buffers[name]
+        self.current_tables.pop(name, None)
+        self.table_row_counts.pop(name, None)
+        self.database_tabs.blockSignals(True)
+        for index in range(self.database_tabs.count()):
+            if self.database_tabs.tabData(index) == name:
+                self.database_tabs.removeTab(index)
+                break
+        self.database_tabs.blockSignals(False)
+        self.select_database("main")
+        self.refresh_tree()
+        self.statusBar.showMessage(f"已分离数据库 {name}")
+    
+    def edit_connection_settings(self):
+        """
+        主数据库的设置对整个工作区生效，也作为之后附加的数据库的初始设置；
+        当前标签页是附加的数据库时只修改它的页缓存、内存映射和 WAL；
+        只读快速打开的工作区使用自己的参数（映射整个文件），修改它们不影响之后打开的数据库
+        """
+        db = self.db
+        if db is None or db.workspace is None:
+            read_only = db is not None and db.read_only
+            dialog = ConnectionSettingsDialog(db.pool.settings if read_only else self.connection_settings, self,
+                                              read_only=read_only)
+            if dialog.exec_() != ConnectionSettingsDialog.Accepted:
+                return
+            settings = dialog.settings()
+            if not read_only:
+                self.connection_settings = settings
+            if db is None:
+                return
+            schema_name = None
+        else:
+            schema_name = db.schema_name
+            current = next(settings for name, _, settings in db.pool.databases() if name == schema_name)
+            main = db.pool.settings
+            shown = ConnectionSettings(main.busy_timeout, current.cache_size, current.mmap_size, current.wal,
+                                       main.max_readers, main.memory_limit, main.cached_statements)
+            dialog = ConnectionSettingsDialog(shown, self, database=schema_name, read_only=db.read_only)
+            if dialog.exec_() != ConnectionSettingsDialog.Accepted:
+                return
+            settings = dialog.settings()
+        try:
+            db.pool.apply_settings(settings, timeout=0, schema=schema_name)
+            self.statusBar.showMessage(f"连接设置已应用，日志模式: {db.pool.journal_mode(schema_name)}")
+        except Exception as e:
+            QMessageBox.warning(self, "无法应用连接设置", str(e))
+    
     def save_changes(self):
         """保存所有数据库修改"""
         if self.db is None:
             return
             
-        if not self.db_modified:
+        if not self.has_unsaved_changes():
             self.statusBar.showMessage('没有需要保存的修改')
             return
             
         try:
-            self.db.commit()
+            # 先把各库缓冲区中的编辑批量写入，再和其他未提交的修改一起提交（同一个写连接上的一个事务）
+            touched = {name: buffer.touched_rows() for name, buffer in self.edit_buffers.items()}
+            sql_modified = self.db_modified  # 执行过修改数据的 SQL，不知道改了哪些表
+            had_edits = self.flush_edit_buffers()
+            self.workspace.commit()
             self.db_modified = False
+            self.remove_stale_watch_triggers()
+            # 搜索索引只重建编辑过的行所在的块，其他的留到下次搜索时同步
+            self.search_panel.sync_saved(touched, sql_modified)
+            if had_edits:
+                self.refresh_current_table()
             self.statusBar.showMessage('所有修改已保存')
         except Exception as e:
             QMessageBox.critical(self, "保存失败", f"无法保存修改: {str(e)}")
     
+    def flush_edit_buffers(self):
+        """把各库缓冲区中的编辑写入写连接上的事务（不提交），返回当前库的缓冲区是否有编辑"""
+        had_edits = not self.edit_buffer.is_empty()
+        for name, buffer in self.edit_buffers.items():
+            if not buffer.is_empty():
+                buffer.flush(self.databases[name])
+                self.db_modified = True  # 已写入但还没有提交
+        return had_edits
+    
+    def has_unsaved_changes(self):
+        return self.db_modified or any(not buffer.is_empty() for buffer in self.edit_buffers.values())
+    
+    def pending_changes_text(self):
+        updates, deletes, inserts = self.edit_buffer.counts()
+        return f"待保存: 修改 {updates} 个单元格, 删除 {deletes} 行, 插入 {inserts} 行"
+    
     def refresh_tree(self):
+        """每个数据库一个根节点，其下是表、视图、索引和触发器分组"""
         if not self.db:
             return
             
+        self.stop_count_worker()
         self.tree.clear()
+        self.tree_table_items = {}
+        self.table_row_counts = {}
         
-        # 添加表
-        tables_item = QTreeWidgetItem(self.tree)
-        tables_item.setText(0, "表")
-        tables_item.setExpanded(True)
+        for name, db in self.databases.items():
+            root = QTreeWidgetItem(self.tree)
+            root.setText(0, f"{name} ({os.path.basename(db.db_path)})")
+            root.setToolTip(0, db.db_path)
+            root.setData(0, Qt.UserRole, {"type": "database", "name": name, "database": name})
+            self.populate_database_tree(root, db)
+            root.setExpanded(True)
         
-        for table in self.db.get_tables():
-            table_item = QTreeWidgetItem(tables_item)
-            table_item.setText(0, table)
-            table_item.setData(0, Qt.UserRole, {"type": "table", "name": table})
-            
-            # 添加列
-            columns = self.db.get_columns(table)
-            for column in columns:
-                col_item = QTreeWidgetItem(table_item)
+        self.filter_tree(self.tree_filter.text())
+    
+    def populate_database_tree(self, root, db):
+        # 只读取一次 sqlite_master，列信息在展开节点时才读取
+        objects = db.get_schema_objects()
+        
+        groups = {}
+        for object_type, title in (("table", "表"), ("view", "视图"), ("index", "索引"), ("trigger", "触发器")):
+            group_item = QTreeWidgetItem(root)
+            group_item.setText(0, title)
+            groups[object_type] = group_item
+        
+        table_items = {}
+        for object_type, name, table_name in objects:
+            item = QTreeWidgetItem(groups[object_type])
+            item.setData(0, Qt.UserRole, {"type": object_type, "name": name, "database": db.schema_name})
+            if object_type in ("table", "view"):
+                item.setText(0, name)
+                # 显示展开箭头，但不预先读取列
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                if object_type == "table":
+                    table_items[name] = item
+                    self.tree_table_items[(db.schema_name, name)] = item
+            else:
+                item.setText(0, f"{name} ({table_name})")
+        
+        for object_type, group_item in groups.items():
+            group_item.setText(0, f"{group_item.text(0)} ({group_item.childCount()})")
+        groups["table"].setExpanded(True)
+        
+        # 先显示缓存的精确行数或 sqlite_stat1 中的估计行数，没有缓存的表在后台统计
+        estimates = db.estimate_row_counts()
+        row_counts = self.row_counts(db)
+        to_count = []
+        for name, item in table_items.items():
+            count = db.cached_row_count(name)
+            if count is not None:
+                row_counts[name] = count
+                item.setText(0, f"{name} ({count} 行)")
+                continue
+            if name in estimates:
+                item.setText(0, f"{name} (≈{estimates[name]} 行)")
+            to_count.append(name)
+        if to_count:
+            self.count_workers.append(self.start_count_worker(db, to_count))
+    
+    def row_counts(self, db=None):
+        """后台统计得到的 db（默认为当前数据库）各表的行数"""
+        return self.table_row_counts.setdefault((db or self.db).schema_name, {})
+    
+    def start_count_worker(self, db, table_names):
+        worker = RowCountWorker(db, table_names, data_version=db.data_version(), parent=self)
+        worker.countReady.connect(self.on_table_count_ready)
+        worker.start()
+        return worker
+    
+    def stop_count_worker(self):
+        for worker in self.count_workers:
+            self._stop_row_count_worker(worker)
+        self.count_workers = []
+    
+    def stop_table_count_worker(self):
+        self.table_count_worker = self._stop_row_count_worker(self.table_count_worker)
+    
+    def _stop_row_count_worker(self, worker):
+        if worker is not None:
+            worker.countReady.disconnect()
+            worker.cancel()
+            worker.wait()
+            worker.deleteLater()
+        return None
+    
+    def on_table_count_ready(self, table_name, count):
+        worker = self.sender()
+        db = self.db
+        if isinstance(worker, RowCountWorker):
+            db = worker.db
+            db.store_row_count(table_name, worker.data_version, count)
+        self.row_counts(db)[table_name] = count
+        item = self.tree_table_items.get((db.schema_name, table_name))
+        if item is not None:
+            item.setText(0, f"{table_name} ({count} 行)")
+        model = self.model
+        if isinstance(model, PagedTableModel) and model.db is db and model.table_name == table_name:
+            model.set_table_rows(count)
+            self.update_row_indicator()
+    
+    def on_tree_item_expanded(self, item):
+        data = item.data(0, Qt.UserRole)
+        if not data or data["type"] not in ("table", "view") or data.get("loaded"):
+            return
+        data["loaded"] = True
+        item.setData(0, Qt.UserRole, data)
+        try:
+            for column in self.databases[data["database"]].get_columns(data["name"]):
+                col_item = QTreeWidgetItem(item)
                 col_item.setText(0, f"{column[0]} ({column[1]})")
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"无法读取列信息: {str(e)}")
+        item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+    
+    def filter_tree(self, text):
+        """按名称过滤树节点，只切换可见性，不重建树"""
+        text = text.strip().lower()
+        for root_index in range(self.tree.topLevelItemCount()):
+            root = self.tree.topLevelItem(root_index)
+            for group_index in range(root.childCount()):
+                group_item = root.child(group_index)
+                for child_index in range(group_item.childCount()):
+                    item = group_item.child(child_index)
+                    name = item.data(0, Qt.UserRole)["name"]
+                    item.setHidden(bool(text) and text not in name.lower())
         
     def on_tree_item_clicked(self, item):
         data = item.data(0, Qt.UserRole)
-        if data and data["type"] == "table":
+        if data and data["type"] == "database":
+            self.select_database(data["name"])
+        elif data and data["type"] in ("table", "view"):
+            self.select_database(data["database"], restore_table=False)
             self.current_table = data["name"]
+            self.current_tables[data["database"]] = data["name"]
             self.display_table_data(data["name"])
             
     def refresh_current_table(self):
@@ -202,60 +838,378 @@ class DBViewer(QMainWindow):
             return
             
         try:
-            # 断开itemChanged信号，避免加载数据时触发更新
-            self.table.itemChanged.disconnect(self.on_cell_changed)
-            
-            data, headers = self.db.get_table_data(table_name)
-            
-            self.table.clear()
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-            
-            self.table.setRowCount(len(data))
-            
-            for row_idx, row in enumerate(data):
-                for col_idx, value in enumerate(row):
-                    item = QTableWidgetItem(str(value))
-                    self.table.setItem(row_idx, col_idx, item)
+            model = PagedTableModel(self.db, table_name, self.edit_buffer)
+            # 单元格修改由模型按真实键记录到编辑缓冲区，保存时批量写入
+            model.cellEdited.connect(self.on_cell_changed)
+            # 先读取第一页，后续页在滚动时由视图通过 fetchMore 加载
+            model.fetchMore()
+            # 已知精确行数时按总行数设置滚动条，否则先显示估计值并在后台统计
+            self.stop_table_count_worker()
+            self.current_row_estimate = self.db.estimate_row_count(table_name)
+            count = self.db.cached_row_count(table_name)
+            if count is not None:
+                model.set_table_rows(count)
+            elif model.canFetchMore():
+                self.table_count_worker = self.start_count_worker(self.db, [table_name])
+            else:
+                model.set_table_rows(model.rowCount())  # 第一页就是全部
+            self.set_model(model)
+            self.table.scrollToTop()
+            self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.filter_bar.set_columns(model.headers)
+            self.filter_bar.show()
             
-            # 添加：根据内容自动调整列宽
-            self.auto_adjust_column_widths(data, headers)
-                    
-            self.statusBar.showMessage(f"表 '{table_name}' 已加载 ({len(data)} 行)")
+            # 根据内容自动调整列宽（有缓存时直接使用缓存的宽度）
+            self.column_sizer.apply(("table", self.db.schema_name, table_name))
             
-            # 重新连接itemChanged信号
-            self.table.itemChanged.connect(self.on_cell_changed)
+            more = "+" if model.canFetchMore() else ""
+            self.statusBar.showMessage(f"表 '{table_name}' 已加载 ({model.rowCount()}{more} 行)")
+            self.start_watching()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法加载表数据: {str(e)}")
-            # 确保信号重新连接
-            self.table.itemChanged.connect(self.on_cell_changed)
     
-    def on_cell_changed(self, item):
-        if not self.db or not self.current_table:
+    def toggle_watching(self, checked):
+        if checked:
+            self.start_watching()
+        else:
+            self.stop_watching()
+    
+    def start_watching(self):
+        """
+        监视当前显示的表：优先在表上建触发器记录变化的行的键，只重新读取这些行；
+        不能建触发器时（只读打开、视图、多列主键或有未提交的修改）轮询 data_version，有变化时重新读取缓存的页
+        """
+        model = self.model
+        if not self.watch_action.isChecked() or not isinstance(model, PagedTableModel):
             return
-            
-        row = item.row()
-        col = item.column()
-        new_value = item.text()
-        
+        tracker = self.change_tracker
+        if tracker is not None and (tracker.db is not model.db or tracker.table_name != model.table_name):
+            self.stop_watching()
+            tracker = None
+        if tracker is not None:
+            tracker.read_changes()  # 表刚重新加载，已包含这些变化
+            mode = "触发器"
+        else:
+            self.remove_stale_watch_triggers()
+            try:
+                self.change_tracker = ChangeTracker(model.db, model.table_name)
+                mode = "触发器"
+            except (ChangeTrackingUnavailable, sqlite3.Error) as e:
+                mode = "轮询"
+                self.statusBar.showMessage(f"无法用触发器监视 {model.table_name}（{e}），改为轮询数据库版本")
+        self.watched_table = (model.db, model.table_name)
+        self.watch_version = model.db.data_version()
+        self.watch_label.setText(f"监视中: {model.table_name}（{mode}）")
+        self.watch_timer.start()
+    
+    def stop_watching(self):
+        """停止监视并删除触发器"""
+        self.watch_timer.stop()
+        self.watched_table = None
+        self.watch_label.clear()
+        tracker, self.change_tracker = self.change_tracker, None
+        if tracker is not None:
+            try:
+                if not tracker.close():
+                    self.stale_watch_triggers = True
+            except sqlite3.Error as e:
+                self.stale_watch_triggers = True
+                self.statusBar.showMessage(f"无法删除监视触发器（稍后再删除）: {e}")
+    
+    def remove_stale_watch_triggers(self):
+        """删除之前停止监视时没能删除的触发器（当时有未提交的修改或写连接被占用）"""
+        if not self.stale_watch_triggers:
+            return
+        self.stale_watch_triggers = False
+        tracker = self.change_tracker
+        for db in self.databases.values():
+            keep = (tracker.table_name,) if tracker is not None and tracker.db is db else ()
+            if remove_stale_objects(db, keep) is None:
+                self.stale_watch_triggers = True  # 仍有未提交的修改，下次提交后再删除
+    
+    def check_table_changes(self):
+        """data_version 变化（其他连接提交过修改）时把变化应用到当前表格"""
+        if self.watched_table is None:
+            return
+        db, table_name = self.watched_table
         try:
-            # 获取主键，假设是第一列（实际应该查询数据库获取真正的主键）
-            headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-            primary_key_col = 0  # 假设第一列是主键
-            primary_key_val = self.table.item(row, primary_key_col).text()
-            column_name = headers[col]
-            
-            # 构建更新SQL
-            query = f"UPDATE {self.current_table} SET {column_name} = ? WHERE {headers[primary_key_col]} = ?"
-            
-            # 执行更新但不提交
-            self.db.cursor.execute(query, (new_value, primary_key_val))
-            self.db_modified = True  # 标记为已修改
-            
-            self.statusBar.showMessage(f"已更新 {self.current_table}.{column_name} (未保存)")
+            version = db.data_version()
+        except sqlite3.Error:
+            return
+        if version == self.watch_version:
+            return
+        self.watch_version = version
+        model = self.model
+        if not (isinstance(model, PagedTableModel) and model.db is db and model.table_name == table_name):
+            return  # 正在显示查询结果等，重新打开表时会重新加载
+        if self.change_tracker is None:
+            model.reload_pages()
+            self.statusBar.showMessage(f"数据库已被修改，已重新读取 {table_name} 的当前页（新增的行按 F5 显示）")
+            return
+        try:
+            changes = self.change_tracker.read_changes()
+            if not (changes.updated or changes.deleted):
+                return
+            hidden = model.apply_changes(changes)
+        except sqlite3.Error as e:
+            self.statusBar.showMessage(f"无法读取 {table_name} 的变化: {e}")
+            return
+        message = f"{table_name} 被修改: 新增 {changes.inserted} 行，修改 {changes.modified} 行，删除 {len(changes.deleted)} 行"
+        if hidden:
+            message += f"（其中 {hidden} 行新增的行按 F5 刷新后显示）"
+        self.statusBar.showMessage(message)
+    
+    def jump_to_row(self, schema_name, table_name, key):
+        """打开库 schema_name 中的表 table_name（保留当前的排序和过滤条件），选中键为 key 的行"""
+        if schema_name not in self.databases:
+            return
+        self.select_database(schema_name, restore_table=False)
+        model = self.model
+        if not (isinstance(model, PagedTableModel) and model.db is self.db and model.table_name == table_name):
+            self.current_table = table_name
+            self.current_tables[schema_name] = table_name
+            self.display_table_data(table_name)
+            model = self.model
+        if not isinstance(model, PagedTableModel):
+            return
+        try:
+            row = model.locate(tuple(key))
         except Exception as e:
-            QMessageBox.warning(self, "更新失败", str(e))
-            self.refresh_current_table()  # 刷新以恢复原始数据
+            QMessageBox.warning(self, "无法定位行", str(e))
+            return
+        if row is None:
+            self.statusBar.showMessage(f"{table_name} 中没有找到该行（可能已被删除、被过滤掉，或索引需要更新）")
+            return
+        index = model.index(row, 0)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        self.table.setCurrentIndex(index)
+        self.table.selectRow(row)
+    
+    def show_diff(self, title, headers, key_columns, rows):
+        """在表格中显示数据比较面板选中的表的差异"""
+        self.stop_table_count_worker()
+        self.set_model(DiffTableModel(headers, key_columns, rows))
+        self.column_sizer.apply(("diff", tuple(headers)))
+        self.statusBar.showMessage(title)
+    
+    def set_model(self, model):
+        """切换表格视图的数据模型，并释放旧模型"""
+        old_model = self.model
+        self.model = model
+        self.table.setModel(model)
+        if old_model is not None:
+            old_model.deleteLater()
+        if model is not None:
+            self.table.selectionModel().currentChanged.connect(self.update_row_indicator)
+            self.table.selectionModel().currentChanged.connect(self.update_value_preview)
+            model.rowsInserted.connect(self.update_row_indicator)
+            model.modelReset.connect(self.update_row_indicator)
+        if not isinstance(model, PagedTableModel):
+            # 查询结果不支持排序和过滤
+            self.filter_bar.hide()
+            self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.update_row_indicator()
+        self.value_preview.clear()
+    
+    def update_value_preview(self, *args):
+        """值预览面板可见时预览当前单元格"""
+        if not self.value_preview_dock.isVisible():
+            return
+        index = self.table.currentIndex()
+        model = self.model
+        if model is None or not index.isValid():
+            self.value_preview.clear()
+            return
+        column_name = model.headers[index.column()]
+        if isinstance(model, PagedTableModel):
+            key = model.row_key(index.row()) if model.has_row(index.row()) else None
+            if key is None:
+                self.value_preview.clear(f"{model.table_name} 没有可用于定位行的键，无法预览")
+                return
+            self.value_preview.show_cell(self.db, model.table_name, column_name, model.key_columns, key,
+                                         editable=model.editable)
+        else:
+            self.value_preview.show_value(column_name, model.value(index.row(), index.column()))
+    
+    def on_cell_double_clicked(self, index):
+        model = self.model
+        if isinstance(model, PagedTableModel):
+            value = model.raw_value(index) if model.has_row(index.row()) else None
+        elif model is not None:
+            value = model.value(index.row(), index.column())
+        else:
+            return
+        if is_large_value(value):
+            self.value_preview_dock.show()
+            self.update_value_preview()
+    
+    def on_value_replaced(self, table_name):
+        # 写回在未提交的事务中进行，需要保存才会写入数据库文件
+        self.db_modified = True
+        if isinstance(self.model, PagedTableModel) and self.model.table_name == table_name:
+            self.model.reload_pages()
+        self.statusBar.showMessage(f"已替换 {table_name} 中的值 (未保存)")
+    
+    def update_row_indicator(self, *args):
+        """在状态栏右侧显示 "第 X 行 / 共 Y 行"：X 为当前行（没有当前行时为第一个可见行）"""
+        model = self.model
+        if model is None:
+            self.row_position_label.clear()
+            return
+        rows = model.rowCount()
+        current = self.table.currentIndex()
+        row = current.row() if current.isValid() else max(self.table.rowAt(0), 0)
+        position = f"第 {min(row + 1, rows)} 行"
+        if not isinstance(model, PagedTableModel) or not model.canFetchMore():
+            total = f"共 {rows} 行"
+        elif model.filters:
+            total = f"已加载 {rows}+ 行"
+        elif self.current_row_estimate is not None:
+            total = f"约 {self.current_row_estimate} 行（统计中）"
+        else:
+            total = f"已加载 {rows}+ 行（统计中）"
+        self.row_position_label.setText(f"{position} / {total}")
+    
+    def analyze_database(self):
+        """运行 ANALYZE（抽样），刷新估计行数"""
+        if not self.db:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        try:
+            self.db.analyze()
+        except Exception as e:
+            QMessageBox.warning(self, "ANALYZE 失败", str(e))
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        if self.db.conn.in_transaction:
+            self.db_modified = True  # 统计信息在未提交的事务中写入
+        self.refresh_tree()
+        self.statusBar.showMessage("统计信息已更新")
+    
+    def on_header_clicked(self, column):
+        """点击列头：升序 -> 降序 -> 取消排序，排序由 SQL 的 ORDER BY 完成"""
+        model = self.model
+        if not isinstance(model, PagedTableModel):
+            return
+        column_name = model.headers[column]
+        if model.order_by != column_name:
+            order_by, descending = column_name, False
+        elif not model.descending:
+            order_by, descending = column_name, True
+        else:
+            order_by, descending = None, False
+        self.apply_table_query(order_by, descending, model.filters)
+    
+    def on_filters_changed(self, texts):
+        model = self.model
+        if not isinstance(model, PagedTableModel):
+            return
+        filters = [build_filter(name, text) for name, text in texts.items()]
+        self.apply_table_query(model.order_by, model.descending, [f for f in filters if f is not None])
+    
+    def apply_table_query(self, order_by, descending, filters):
+        """在数据库中重新执行带排序和过滤条件的分页查询"""
+        model = self.model
+        try:
+            if not self.confirm_full_scan(model, order_by, descending, filters):
+                self.update_sort_indicator()
+                return
+            model.set_query(order_by, descending, filters)
+        except Exception as e:
+            QMessageBox.warning(self, "查询失败", str(e))
+            return
+        self.update_sort_indicator()
+        
+        parts = []
+        if order_by:
+            parts.append(f"按 {order_by} {'降序' if descending else '升序'}排序")
+        if filters:
+            parts.append(f"{len(filters)} 个过滤条件")
+        more = "+" if model.canFetchMore() else ""
+        detail = f" ({', '.join(parts)})" if parts else ""
+        self.statusBar.showMessage(f"表 '{model.table_name}' 已加载 ({model.rowCount()}{more} 行){detail}")
+    
+    def update_sort_indicator(self):
+        model = self.model
+        header = self.table.horizontalHeader()
+        if model.order_by is None:
+            header.setSortIndicator(-1, Qt.AscendingOrder)
+        else:
+            header.setSortIndicator(model.headers.index(model.order_by),
+                                    Qt.DescendingOrder if model.descending else Qt.AscendingOrder)
+    
+    def confirm_full_scan(self, model, order_by, descending, filters):
+        """
+        用 EXPLAIN QUERY PLAN 检查排序/过滤是否需要全表扫描，
+        需要时提示用户，并提供为相关列创建索引的选项；返回 False 表示用户取消
+        """
+        if not order_by and not filters:
+            return True
+        # 小表的全表扫描代价很低，不必提示
+        if self.row_counts().get(model.table_name, float("inf")) < 10000:
+            return True
+        steps = self.db.page_query_needs_full_scan(model.table_name, model.key_columns,
+                                                   order_by, descending, filters)
+        if not steps:
+            return True
+        
+        # 等值/范围过滤列在前，排序列在后，组成建议的索引
+        index_columns = list(dict.fromkeys(
+            [f.column for f in filters if f.indexable] + ([order_by] if order_by else [])))
+        warning_key = (self.db.schema_name, model.table_name, tuple(index_columns))
+        if warning_key in self.ignored_scan_warnings:
+            return True
+        
+        message = f"该操作需要扫描整个表 {model.table_name}:\n" + "\n".join(f"  {step}" for step in steps)
+        box = QMessageBox(QMessageBox.Warning, "全表扫描", message, parent=self)
+        create_button = None
+        if index_columns:
+            box.setInformativeText(f"是否为 ({', '.join(index_columns)}) 创建索引？")
+            create_button = box.addButton("创建索引", QMessageBox.AcceptRole)
+        run_button = box.addButton("仍然执行", QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.exec_()
+        
+        clicked = box.clickedButton()
+        if clicked is run_button:
+            self.ignored_scan_warnings.add(warning_key)
+            return True
+        if create_button is not None and clicked is create_button:
+            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+            try:
+                index_name = self.db.create_index(model.table_name, index_columns)
+            finally:
+                QApplication.restoreOverrideCursor()
+            if self.db.conn.in_transaction:
+                self.db_modified = True  # 索引在未提交的事务中创建
+            self.refresh_tree()
+            self.statusBar.showMessage(f"已创建索引 {index_name}")
+            return True
+        return False
+    
+    def on_cell_changed(self, table_name, column_name):
+        self.statusBar.showMessage(f"已更新 {table_name}.{column_name} (未保存) - {self.pending_changes_text()}")
+    
+    def undo_edit(self):
+        table_name = self.edit_buffer.undo()
+        if table_name is None:
+            self.statusBar.showMessage("没有可撤销的编辑")
+            return
+        self.on_pending_changes_changed(f"已撤销 {table_name} 的编辑")
+    
+    def redo_edit(self):
+        table_name = self.edit_buffer.redo()
+        if table_name is None:
+            self.statusBar.showMessage("没有可重做的编辑")
+            return
+        self.on_pending_changes_changed(f"已重做 {table_name} 的编辑")
+    
+    def on_pending_changes_changed(self, message):
+        if isinstance(self.model, PagedTableModel):
+            self.model.refresh_pending()
+        self.statusBar.showMessage(f"{message} - {self.pending_changes_text()}")
     
     def add_row_dialog(self):
         if not self.current_table or not self.db:
@@ -267,10 +1221,6 @@ class DBViewer(QMainWindow):
             columns = self.db.get_columns(self.current_table)
             column_names = [col[0] for col in columns]
             
-            # 构建插入SQL
-            placeholders = ", ".join(["?"] * len(column_names))
-            columns_str = ", ".join(column_names)
-            
             values = []
             for col_name in column_names:
                 value, ok = QInputDialog.getText(self, f"添加行", f"请输入 {col_name} 的值:")
@@ -278,14 +1228,10 @@ class DBViewer(QMainWindow):
                     return  # 用户取消
                 values.append(value)
             
-            # 执行插入但不提交
-            query = f"INSERT INTO {self.current_table} ({columns_str}) VALUES ({placeholders})"
-            self.db.cursor.execute(query, values)
-            self.db_modified = True  # 标记为已修改
-            
-            # 刷新表格
-            self.refresh_current_table()
-            self.statusBar.showMessage(f"已向表 {self.current_table} 添加新行 (未保存)")
+            # 记录到编辑缓冲区，保存时写入
+            self.edit_buffer.insert_row(self.current_table, column_names, values)
+            self.statusBar.showMessage(
+                f"已向表 {self.current_table} 添加新行 (未保存) - {self.pending_changes_text()}")
         except Exception as e:
             QMessageBox.warning(self, "添加失败", str(e))
     
@@ -294,7 +1240,14 @@ class DBViewer(QMainWindow):
             QMessageBox.warning(self, "警告", "请先选择一个表")
             return
             
-        selected_rows = set(item.row() for item in self.table.selectedItems())
+        if not isinstance(self.model, PagedTableModel):
+            QMessageBox.warning(self, "警告", "查询结果不能直接删除，请先选择一个表")
+            return
+        if not self.model.editable:
+            QMessageBox.warning(self, "警告", f"{self.current_table} 没有可用于定位行的键，无法删除")
+            return
+            
+        selected_rows = set(index.row() for index in self.table.selectionModel().selectedRows())
         if not selected_rows:
             QMessageBox.information(self, "提示", "请先选择要删除的行")
             return
@@ -306,24 +1259,10 @@ class DBViewer(QMainWindow):
             return
             
         try:
-            # 获取主键列（假设是第一列）
-            headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-            primary_key_col = 0
-            
-            # 执行删除操作
-            deleted_count = 0
-            for row in sorted(selected_rows, reverse=True):  # 从后向前删除，避免索引变化
-                primary_key_val = self.table.item(row, primary_key_col).text()
-                self.db.cursor.execute(f"DELETE FROM {self.current_table} WHERE {headers[primary_key_col]} = ?", 
-                                      (primary_key_val,))
-                deleted_count += 1
-                
-            # 标记为已修改但不提交
-            self.db_modified = True
-            
-            # 刷新表格
-            self.refresh_current_table()
-            self.statusBar.showMessage(f"已从表 {self.current_table} 删除 {deleted_count} 行 (未保存)")
+            # 按真实键（rowid 或主键）标记删除，保存时批量执行
+            keys = [self.model.row_key(row) for row in sorted(selected_rows)]
+            self.edit_buffer.delete_rows(self.current_table, self.model.key_columns, keys)
+            self.on_pending_changes_changed(f"已从表 {self.current_table} 标记删除 {len(keys)} 行 (未保存)")
         except Exception as e:
             QMessageBox.warning(self, "删除失败", str(e))
     
@@ -335,26 +1274,48 @@ class DBViewer(QMainWindow):
         query = self.sql_input.toPlainText().strip()
         if not query:
             return
+        
+        # 命名参数 (:name) 在对话框中填写，以参数绑定执行
+        params = ()
+        names = query_parameters(query)
+        if names:
+            dialog = ParameterDialog(names, self.parameter_texts, parent=self)
+            if dialog.exec_() != ParameterDialog.Accepted:
+                return
+            self.parameter_texts.update(dialog.texts())
+            params = dialog.values()
+        
+        # 表格中未保存的编辑先写入写连接上的事务（不提交），查询才能看到它们
+        try:
+            if self.flush_edit_buffers():
+                self.refresh_current_table()
+        except Exception as e:
+            QMessageBox.critical(self, "SQL 错误", f"无法写入未保存的编辑: {str(e)}")
+            return
+        
+        # 只读查询在后台线程执行，结果分批流式显示；数据没有变化时直接使用缓存的结果
+        # （调用 random()、'now' 等结果每次可能不同的查询不缓存，见 is_cacheable_query()）
+        # 有未提交的修改时连接池中的只读连接和结果缓存都看不到这些修改，改为在写连接上执行
+        if is_read_only_query(query) and not self.db.conn.in_transaction:
+            cached = self.db.result_cache.get(query, params, self.db.cache_version())
+            if cached is not None:
+                self.stop_query_worker()
+                self.set_model(ResultTableModel(cached.headers, query=query, result=cached))
+                self.column_sizer.apply(("query", query))
+                self.statusBar.showMessage(f"查询已执行，返回 {cached.row_count} 行（缓存命中）")
+                return
+            self.start_query_worker(query, params)
+            return
             
         try:
-            data, headers = self.db.execute_query(query)
+            data, headers = self.db.execute_query(query, params)
             
-            self.table.clear()
             if headers:
-                self.table.setColumnCount(len(headers))
-                self.table.setHorizontalHeaderLabels(headers)
-                
-                self.table.setRowCount(len(data))
+                self.set_model(ResultTableModel(headers, data, query=query))
+                self.column_sizer.apply(("query", query))
                 
-                for row_idx, row in enumerate(data):
-                    for col_idx, value in enumerate(row):
-                        item = QTableWidgetItem(str(value))
-                        self.table.setItem(row_idx, col_idx, item)
-                
-                # 添加：自动调整列宽
-                self.auto_adjust_column_widths(data, headers)
-                
-                self.statusBar.showMessage(f"查询已执行，返回 {len(data)} 行")
+                pending = "（包含未保存的修改）" if self.db.conn.in_transaction else ""
+                self.statusBar.showMessage(f"查询已执行，返回 {len(data)} 行{pending}")
             else:
                 # 如果是非查询操作（如INSERT、UPDATE、DELETE），标记为已修改
                 if self.current_table and query.upper().startswith(("INSERT", "UPDATE", "DELETE")):
@@ -364,28 +1325,309 @@ class DBViewer(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "SQL 错误", str(e))
             
-    def auto_adjust_column_widths(self, data, headers):
-        """根据内容自动调整列宽"""
-        # 设置列宽基于头部文本和样本数据
-        for col_idx, header in enumerate(headers):
-            # 先计算标题宽度
-            header_width = len(header) * 10 + 30  # 粗略估计标题所需宽度
-            
-            # 评估前10行数据的宽度
-            sample_width = 0
-            for row_idx in range(min(10, len(data))):
-                if row_idx < len(data) and col_idx < len(data[row_idx]):
-                    cell_content = str(data[row_idx][col_idx])
-                    content_width = len(cell_content) * 8 + 20  # 粗略估计内容宽度
-                    sample_width = max(sample_width, content_width)
-            
-            # 设置列宽为标题宽度和样本数据宽度的最大值
-            column_width = max(header_width, sample_width, 100)  # 至少100像素宽
-            self.table.setColumnWidth(col_idx, min(column_width, 300))  # 限制最大宽度为300
+    def load_saved_queries(self, db_path):
+        """读取主数据库文件旁的命名查询"""
+        try:
+            self.saved_queries = SavedQueryStore(saved_queries_path(db_path))
+        except (OSError, ValueError) as e:
+            self.saved_queries = None
+            self.statusBar.showMessage(f"无法读取保存的查询: {e}")
+        self.update_saved_queries()
+    
+    def update_saved_queries(self, current=None):
+        combo = self.saved_query_combo
+        combo.clear()
+        combo.addItem("已保存的查询", None)
+        if self.saved_queries is not None:
+            for name in self.saved_queries.names():
+                combo.addItem(name, name)
+        index = combo.findData(current) if current is not None else -1
+        combo.setCurrentIndex(max(index, 0))
+        self.remove_query_button.setEnabled(combo.count() > 1)
+    
+    def load_saved_query(self, index):
+        name = self.saved_query_combo.itemData(index)
+        query = self.saved_queries.get(name) if name is not None and self.saved_queries is not None else None
+        if query is not None:
+            self.sql_input.setPlainText(query.sql)
+    
+    def save_query(self):
+        """把 SQL 框中的语句保存为命名查询（同名时覆盖）"""
+        query = self.sql_input.toPlainText().strip()
+        if self.saved_queries is None or not query:
+            QMessageBox.information(self, "提示", "请先打开数据库并在 SQL 框中输入要保存的查询")
+            return
+        name, ok = QInputDialog.getText(self, "保存查询", "查询名称（可以使用 :name 形式的参数）:",
+                                        QLineEdit.Normal, self.saved_query_combo.currentData() or "")
+        name = name.strip()
+        if not ok or not name:
+            return
+        try:
+            self.saved_queries.save(name, query)
+        except OSError as e:
+            QMessageBox.warning(self, "无法保存查询", str(e))
+            return
+        self.update_saved_queries(name)
+        self.statusBar.showMessage(f"查询 {name} 已保存到 {os.path.basename(self.saved_queries.path)}")
+    
+    def remove_saved_query(self):
+        name = self.saved_query_combo.currentData()
+        if name is None or self.saved_queries is None:
+            return
+        try:
+            self.saved_queries.remove(name)
+        except OSError as e:
+            QMessageBox.warning(self, "无法删除查询", str(e))
+            return
+        self.update_saved_queries()
+        self.statusBar.showMessage(f"已删除查询 {name}")
+    
+    def start_query_worker(self, query, params=()):
+        self.stop_query_worker()
+        
+        worker = QueryWorker(self.db, query, params, row_counts=self.row_counts(),
+                             cache_rows=self.QUERY_CACHE_ROWS if is_cacheable_query(query) else 0,
+                             parent=self)
+        worker.cache_version = self.db.cache_version()
+        worker.resultReady.connect(self.on_query_result)
+        worker.headersReady.connect(self.on_query_headers)
+        worker.rowsReady.connect(self.on_query_rows)
+        worker.finished_ok.connect(self.on_query_finished)
+        worker.cancelled.connect(self.on_query_cancelled)
+        worker.failed.connect(self.on_query_failed)
+        worker.profiled.connect(self.profiler_panel.show_profile)
+        worker.finished.connect(self.on_query_worker_done)
+        self.query_worker = worker
+        
+        self.cancel_button.setEnabled(True)
+        self.query_clock.start()
+        self.query_status_timer.start()
+        self.statusBar.showMessage("查询执行中...")
+        worker.start()
+    
+    def cancel_query(self):
+        if self.query_worker is not None:
+            self.query_worker.cancel()
+            self.statusBar.showMessage("正在取消查询...")
+    
+    def stop_query_worker(self):
+        """取消并等待正在执行的后台查询结束"""
+        worker = self.query_worker
+        if worker is None:
+            return
+        for signal in (worker.headersReady, worker.rowsReady, worker.finished_ok, worker.cancelled,
+                       worker.failed, worker.profiled, worker.resultReady, worker.finished):
+            signal.disconnect()
+        worker.cancel()
+        worker.wait()
+        self.clear_query_worker()
+    
+    def on_query_headers(self, headers):
+        self.current_query_model = ResultTableModel(headers, query=self.query_worker.query)
+        self.set_model(self.current_query_model)
+        self.query_widths_adjusted = False
+    
+    def on_query_rows(self, rows):
+        self.current_query_model.append_rows(rows)
+        if not self.query_widths_adjusted:
+            # 收到第一批数据后调整列宽
+            self.column_sizer.apply(("query", self.current_query_model.query))
+            self.query_widths_adjusted = True
+    
+    def update_query_status(self):
+        if self.query_worker is None:
+            return
+        elapsed = self.query_clock.elapsed() / 1000
+        self.statusBar.showMessage(
+            f"查询执行中... 已读取 {self.query_worker.rows_fetched} 行，用时 {elapsed:.1f} 秒")
+    
+    def on_query_result(self, result):
+        worker = self.sender()
+        self.db.cache_result(worker.query, worker.params, worker.cache_version, result)
+    
+    def on_query_finished(self, row_count, elapsed):
+        cache_note = "未命中缓存" if is_cacheable_query(self.sender().query) else "结果每次可能不同，不缓存"
+        self.statusBar.showMessage(f"查询已执行，返回 {row_count} 行，用时 {elapsed:.2f} 秒（{cache_note}）")
+    
+    def on_query_cancelled(self, row_count, elapsed):
+        self.statusBar.showMessage(f"查询已取消，已读取 {row_count} 行，用时 {elapsed:.2f} 秒")
+    
+    def on_query_failed(self, message):
+        self.statusBar.showMessage("查询失败")
+        QMessageBox.critical(self, "SQL 错误", message)
+    
+    def on_query_worker_done(self):
+        if self.sender() is self.query_worker:
+            self.clear_query_worker()
+    
+    def clear_query_worker(self):
+        self.query_worker.deleteLater()
+        self.query_worker = None
+        self.query_status_timer.stop()
+        self.cancel_button.setEnabled(False)
+    
+    def export_data(self):
+        """把当前表或当前查询结果流式导出到文件"""
+        if not self.db:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        if self.export_worker is not None:
+            QMessageBox.information(self, "提示", "已有导出任务正在进行")
+            return
+        
+        table_name = None
+        if isinstance(self.model, PagedTableModel):
+            table_name = self.model.table_name
+            query = table_query(table_name, self.db.schema_name)
+            default_name = table_name
+        elif isinstance(self.model, ResultTableModel) and self.model.query:
+            query = self.model.query
+            default_name = "query_result"
+        else:
+            QMessageBox.warning(self, "警告", "请先打开一个表或执行一个查询")
+            return
+        
+        filters = {"CSV (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl", "Parquet (*.parquet)": "parquet"}
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self, "导出数据", default_name + EXPORT_FORMATS["csv"], ";;".join(filters))
+        if not path:
+            return
+        fmt = format_from_path(path, filters.get(selected_filter, "csv"))
+        if not path.lower().endswith(EXPORT_FORMATS[fmt]):
+            path += EXPORT_FORMATS[fmt]
+        
+        progress_dialog = QProgressDialog(f"正在导出到 {os.path.basename(path)}...", "取消", 0, 0, self)
+        progress_dialog.setWindowTitle("导出")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+        
+        estimated_rows = self.db.estimate_row_count(table_name) if table_name is not None else None
+        worker = ExportWorker(self.db, query, path, fmt, estimated_rows, parent=self)
+        worker.totalKnown.connect(progress_dialog.setMaximum)
+        worker.progress.connect(progress_dialog.setValue)
+        worker.progress.connect(lambda rows: progress_dialog.setLabelText(f"已导出 {rows} 行..."))
+        progress_dialog.canceled.connect(worker.cancel)
+        worker.finished_ok.connect(lambda rows, elapsed: self.statusBar.showMessage(
+            f"已导出 {rows} 行到 {path}，用时 {elapsed:.1f} 秒"))
+        worker.cancelled.connect(lambda: self.statusBar.showMessage("导出已取消"))
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "导出失败", message))
+        worker.finished.connect(progress_dialog.close)
+        worker.finished.connect(self.on_export_worker_done)
+        self.export_worker = worker
+        if self.has_unsaved_changes():
+            self.statusBar.showMessage("注意: 导出只包含已保存的数据")
+        worker.start()
+    
+    def on_export_worker_done(self):
+        if self.export_worker is not None:
+            self.export_worker.deleteLater()
+            self.export_worker = None
+    
+    def stop_export_worker(self):
+        if self.export_worker is not None:
+            self.export_worker.cancel()
+            self.export_worker.wait()
+            self.on_export_worker_done()
+    
+    def stop_import_worker(self):
+        if self.import_worker is not None:
+            # 取消导入，已提交的部分会保留
+            self.import_worker.cancel()
+            self.import_worker.wait()
+            self.on_import_worker_done()
+    
+    def import_data(self):
+        """从 CSV / JSON Lines 文件批量导入数据"""
+        if not self.db:
+            QMessageBox.warning(self, "警告", "请先打开数据库")
+            return
+        if self.import_worker is not None:
+            QMessageBox.information(self, "提示", "已有导入任务正在进行")
+            return
+        if self.has_unsaved_changes():
+            # 导入在共享的写连接上开启自己的事务，不能夹带未提交的修改
+            reply = QMessageBox.question(self, '未保存的修改', '导入前需要先保存当前的修改，是否保存？',
+                                        QMessageBox.Save | QMessageBox.Cancel, QMessageBox.Save)
+            if reply != QMessageBox.Save:
+                return
+            self.save_changes()
+            if self.has_unsaved_changes():
+                return
+        
+        # 导入总是写入主数据库
+        dialog = ImportDialog(self.workspace.get_tables(), self)
+        if dialog.exec_() != ImportDialog.Accepted:
+            return
+        options = dialog.options()
+        
+        progress_dialog = QProgressDialog(f"正在导入 {os.path.basename(options['path'])}...", "取消", 0, 0, self)
+        progress_dialog.setWindowTitle("导入")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+        
+        worker = ImportWorker(self.workspace, parent=self, **options)
+        worker.progress.connect(lambda rows, rate: progress_dialog.setLabelText(
+            f"已导入 {rows} 行 ({rate:.0f} 行/秒)..."))
+        progress_dialog.canceled.connect(worker.cancel)
+        worker.finished_ok.connect(lambda rows, elapsed: self.statusBar.showMessage(
+            f"已导入 {rows} 行到 {options['table_name']}，用时 {elapsed:.1f} 秒 "
+            f"({rows / elapsed if elapsed > 0 else 0:.0f} 行/秒)"))
+        worker.cancelled.connect(lambda rows: self.statusBar.showMessage(f"导入已取消，已保留 {rows} 行"))
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "导入失败", message))
+        worker.finished.connect(progress_dialog.close)
+        worker.finished.connect(self.on_import_worker_done)
+        self.import_worker = worker
+        worker.start()
+    
+    def on_import_worker_done(self):
+        if self.import_worker is not None:
+            table_name = self.import_worker.table_name
+            self.import_worker.deleteLater()
+            self.import_worker = None
+            self.refresh_tree()
+            self.search_panel.sync("main")
+            if self.db is self.workspace and table_name == self.current_table:
+                self.refresh_current_table()
+    
+    def confirm_maintenance(self, task):
+        """修改数据库的维护操作要求先保存：它们不能在事务中执行，VACUUM 还可能重新编号 rowid"""
+        if not MAINTENANCE_TASKS[task][1]:
+            return True
+        return self.save_before('执行维护操作前需要先保存当前的修改，是否保存？')
+    
+    def confirm_index_creation(self):
+        """建议的索引在自动提交模式下创建，才能在只读连接上对比前后耗时，因此要求先保存"""
+        return self.save_before('创建索引前需要先保存当前的修改，是否保存？')
+    
+    def save_before(self, question):
+        """有未保存的修改时询问是否保存，返回保存后是否可以继续"""
+        if not self.has_unsaved_changes():
+            return True
+        reply = QMessageBox.question(self, '未保存的修改', question,
+                                    QMessageBox.Save | QMessageBox.Cancel, QMessageBox.Save)
+        if reply != QMessageBox.Save:
+            return False
+        self.save_changes()
+        return not self.has_unsaved_changes()
+    
+    def on_index_created(self, create_sql):
+        self.refresh_tree()
+        self.statusBar.showMessage(f"已创建索引: {create_sql}")
+    
+    def on_maintenance_finished(self, task):
+        if not MAINTENANCE_TASKS[task][1]:
+            return  # 检查不修改数据库
+        # ANALYZE 更新了估计行数；VACUUM 可能重新编号没有 INTEGER PRIMARY KEY 的表的 rowid，需要重新加载
+        self.refresh_tree()
+        if task in ("vacuum", "vacuum_incremental"):
+            self.refresh_current_table()
     
     def closeEvent(self, event):
         """在关闭窗口前检查是否有未保存的修改"""
-        if self.db is not None and self.db_modified:
+        self.stop_count_worker()
+        self.stop_export_worker()
+        self.stop_import_worker()
+        if self.db is not None and self.has_unsaved_changes():
             reply = QMessageBox.question(self, '未保存的修改', 
                                         '是否保存对数据库的修改？',
                                         QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
@@ -393,10 +1635,9 @@ class DBViewer(QMainWindow):
             
             if reply == QMessageBox.Save:
                 self.save_changes()
-                event.accept()
-            elif reply == QMessageBox.Discard:
-                event.accept()
-            else:
+            elif reply != QMessageBox.Discard:
                 event.ignore()  # 取消关闭
-        else:
-            event.accept()
+                return
+        # 显式关闭所有连接，未保存的修改随之丢弃
+        self.close_database()
+        event.accept()
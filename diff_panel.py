@@ -0,0 +1,184 @@
+import os
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QComboBox, QPushButton,
+                             QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog)
+from PyQt5.QtCore import pyqtSignal
+from query_worker import TableDiffWorker
+
+_STATUS_TEXT = {"compared": "已比较", "only_old": "只在旧库（已删除的表）", "only_new": "只在新库（新建的表）"}
+
+
+class DiffPanel(QWidget):
+    """
+    数据比较面板：比较工作区中两个库（如附加的昨天的副本和当前文件）的表，按主键找出新增、修改和删除的行，
+    可同时生成把旧库变为新库的 SQL 补丁；选中一个表后它的差异显示在主窗口的表格中
+    """
+
+    diffSelected = pyqtSignal(str, list, list, list)  # 标题, 列名, 键列, DiffRow 列表
+
+    MAX_ROWS = 100000  # 每个表最多在表格中显示的差异行数（补丁中包含全部差异）
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.databases = {}  # 库名 -> DBConnector
+        self.worker = None
+        self.results = []  # [(DiffSummary, 列名, 键列, DiffRow 列表)]
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        form = QFormLayout()
+        self.old_combo = QComboBox()
+        self.new_combo = QComboBox()
+        self.table_combo = QComboBox()
+        self.old_combo.currentIndexChanged.connect(self.update_tables)
+        self.new_combo.currentIndexChanged.connect(self.update_tables)
+        form.addRow("旧库:", self.old_combo)
+        form.addRow("新库:", self.new_combo)
+        form.addRow("表:", self.table_combo)
+        layout.addLayout(form)
+
+        button_layout = QHBoxLayout()
+        self.patch_check = QCheckBox("同时生成 SQL 补丁")
+        self.compare_button = QPushButton("比较")
+        self.compare_button.clicked.connect(self.compare)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel)
+        button_layout.addWidget(self.patch_check, stretch=1)
+        button_layout.addWidget(self.compare_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        self.summary_table = QTableWidget(0, 7)
+        self.summary_table.setHorizontalHeaderLabels(["表", "状态", "旧库行数", "新库行数", "新增", "修改", "删除"])
+        self.summary_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.summary_table.horizontalHeader().setStretchLastSection(True)
+        self.summary_table.verticalHeader().hide()
+        self.summary_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.summary_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.summary_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.summary_table.itemSelectionChanged.connect(self.show_selected)
+        layout.addWidget(self.summary_table)
+        self.update_controls()
+
+    def set_databases(self, databases):
+        """设置工作区中的数据库 {库名: DBConnector}，空字典表示已关闭；正在进行的比较被取消"""
+        self.stop()
+        self.databases = dict(databases)
+        for combo in (self.old_combo, self.new_combo):
+            current = combo.currentData()
+            combo.blockSignals(True)
+            combo.clear()
+            for name, db in self.databases.items():
+                combo.addItem(f"{name}: {os.path.basename(db.db_path)}", name)
+            index = combo.findData(current)
+            combo.setCurrentIndex(index if index >= 0 else 0)
+            combo.blockSignals(False)
+        if self.new_combo.currentData() == self.old_combo.currentData() and self.new_combo.count() > 1:
+            # 默认把最后附加的库（通常是旧的副本）作为旧库，与主库比较
+            self.old_combo.setCurrentIndex(self.old_combo.count() - 1)
+            self.new_combo.setCurrentIndex(0)
+        self.update_tables()
+
+    def update_tables(self):
+        self.table_combo.clear()
+        old, new = self.databases.get(self.old_combo.currentData()), self.databases.get(self.new_combo.currentData())
+        if old is None or new is None:
+            self.update_controls()
+            return
+        self.table_combo.addItem("（所有表）", None)
+        for name in sorted(set(old.get_tables()) | set(new.get_tables())):
+            self.table_combo.addItem(name, name)
+        self.update_controls()
+
+    def update_controls(self):
+        running = self.worker is not None
+        ready = (self.table_combo.count() > 0 and self.old_combo.currentData() != self.new_combo.currentData())
+        self.compare_button.setEnabled(ready and not running)
+        self.cancel_button.setEnabled(running)
+        for widget in (self.old_combo, self.new_combo, self.table_combo, self.patch_check):
+            widget.setEnabled(not running)
+
+    def compare(self):
+        if self.worker is not None or not self.compare_button.isEnabled():
+            return
+        old_schema, new_schema = self.old_combo.currentData(), self.new_combo.currentData()
+        table = self.table_combo.currentData()
+        patch_path = None
+        if self.patch_check.isChecked():
+            patch_path, _ = QFileDialog.getSaveFileName(self, "保存 SQL 补丁", f"{table or old_schema}_patch.sql",
+                                                        "SQL 脚本 (*.sql);;所有文件 (*)")
+            if not patch_path:
+                return
+        # 附加库与主库共用连接池，任意一个库的 DBConnector 都可以读取两个库
+        worker = TableDiffWorker(self.databases[new_schema], old_schema, new_schema,
+                                 [table] if table else None, patch_path, self.MAX_ROWS, parent=self)
+        worker.progress.connect(lambda name, done, total: self.status_label.setText(
+            f"正在比较 {name}: {done} / {total} 行..."))
+        worker.tableDone.connect(self.on_table_done)
+        worker.finished_ok.connect(lambda elapsed: self.status_label.setText(
+            f"比较完成，用时 {elapsed:.1f} 秒" + (f"，补丁已写入 {patch_path}" if patch_path else "")))
+        worker.cancelled.connect(lambda: self.status_label.setText("已取消"))
+        worker.failed.connect(lambda message: self.status_label.setText(f"比较失败: {message}"))
+        worker.finished.connect(self.on_worker_done)
+        self.results = []
+        self.summary_table.setRowCount(0)
+        self.worker = worker
+        self.status_label.setText("正在比较...")
+        self.update_controls()
+        worker.start()
+
+    def on_table_done(self, summary, headers, key_columns, rows):
+        self.results.append((summary, headers, key_columns, rows))
+        row = self.summary_table.rowCount()
+        self.summary_table.insertRow(row)
+        values = [summary.table, _STATUS_TEXT[summary.status], summary.rows_old, summary.rows_new,
+                  summary.inserted, summary.updated, summary.deleted]
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            if summary.only_old or summary.only_new:
+                item.setToolTip(f"只在旧库的列: {', '.join(summary.only_old) or '无'}\n"
+                                f"只在新库的列: {', '.join(summary.only_new) or '无'}\n这些列不参与比较")
+            self.summary_table.setItem(row, column, item)
+        # 自动显示第一个有差异的表
+        if self.selected_result() is None and (summary.inserted or summary.updated or summary.deleted):
+            self.summary_table.selectRow(row)
+
+    def selected_result(self):
+        rows = self.summary_table.selectionModel().selectedRows()
+        if not rows or rows[0].row() >= len(self.results):
+            return None
+        return self.results[rows[0].row()]
+
+    def show_selected(self):
+        result = self.selected_result()
+        if result is None:
+            return
+        summary, headers, key_columns, rows = result
+        changes = summary.inserted + summary.updated + summary.deleted
+        title = f"{summary.table}: 新增 {summary.inserted}，修改 {summary.updated}，删除 {summary.deleted}"
+        if changes > len(rows):
+            title += f"（表格中只显示前 {len(rows)} 行）"
+        self.diffSelected.emit(title, headers, key_columns, rows)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText("正在取消...")
+
+    def stop(self):
+        """取消并等待正在进行的比较结束"""
+        worker = self.worker
+        if worker is None:
+            return
+        worker.blockSignals(True)
+        worker.cancel()
+        worker.wait()
+        self.on_worker_done()
+
+    def on_worker_done(self):
+        if self.worker is not None:
+            self.worker.deleteLater()
+            self.worker = None
+        self.update_controls()
@@ -0,0 +1,205 @@
+class EditBuffer:
+    """
+    待保存修改的缓冲区
+    单元格修改、删除和插入先记录在这里（按真实键 rowid/主键 定位行），
+    保存时按表和列分组，通过 executemany 和 DELETE ... IN (...) 批量写入同一个事务；
+    每次操作都会压入撤销栈，支持撤销/重做
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._tables = {}  # 表名 -> _TableChanges
+        self._undo_stack = []
+        self._redo_stack = []
+
+    def is_empty(self):
+        return not any(changes.count() for changes in self._tables.values())
+
+    def counts(self):
+        """返回待保存的 (更新单元格数, 删除行数, 插入行数)"""
+        updates = sum(len(columns) for changes in self._tables.values() for columns in changes.updates.values())
+        deletes = sum(len(changes.deletes) for changes in self._tables.values())
+        inserts = sum(len(changes.inserts) for changes in self._tables.values())
+        return updates, deletes, inserts
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    # ---- 记录修改 ----
+
+    def set_cell(self, table_name, key_columns, key, column_name, value):
+        changes = self._changes(table_name, key_columns)
+        row_updates = changes.updates.get(key, {})
+        had_pending = column_name in row_updates
+        op = ("update", table_name, key, column_name, had_pending, row_updates.get(column_name), value)
+        self._apply(op)
+        self._push(op)
+
+    def delete_rows(self, table_name, key_columns, keys):
+        changes = self._changes(table_name, key_columns)
+        new_keys = [key for key in dict.fromkeys(keys) if key not in changes.deletes]
+        if not new_keys:
+            return
+        op = ("delete", table_name, new_keys)
+        self._apply(op)
+        self._push(op)
+
+    def insert_row(self, table_name, column_names, values):
+        self._changes(table_name, None)
+        op = ("insert", table_name, tuple(column_names), tuple(values))
+        self._apply(op)
+        self._push(op)
+
+    # ---- 查询待保存状态，供表格模型显示 ----
+
+    def pending_value(self, table_name, key, column_name):
+        """返回 (是否有待保存的修改, 修改后的值)"""
+        changes = self._tables.get(table_name)
+        if changes is None:
+            return False, None
+        row_updates = changes.updates.get(key)
+        if row_updates is None or column_name not in row_updates:
+            return False, None
+        return True, row_updates[column_name]
+
+    def is_deleted(self, table_name, key):
+        changes = self._tables.get(table_name)
+        return changes is not None and key in changes.deletes
+
+    def has_changes(self, table_name):
+        changes = self._tables.get(table_name)
+        return changes is not None and changes.count() > 0
+
+    # ---- 撤销/重做 ----
+
+    def undo(self):
+        if not self._undo_stack:
+            return None
+        op = self._undo_stack.pop()
+        self._revert(op)
+        self._redo_stack.append(op)
+        return op[1]
+
+    def redo(self):
+        if not self._redo_stack:
+            return None
+        op = self._redo_stack.pop()
+        self._apply(op)
+        self._undo_stack.append(op)
+        return op[1]
+
+    def touched_rows(self):
+        """
+        {表名: (保存后内容会变化的行的键集合, 插入的行 [(列名元组, 值元组)])}，应在 flush() 之前调用
+        修改了键列的行同时包含旧键和新键；插入的行没有键（可能由数据库分配），单独列出
+        """
+        touched = {}
+        for table_name, changes in self._tables.items():
+            if not changes.count():
+                continue
+            keys = set(changes.updates) | changes.deletes
+            for key, row_updates in changes.updates.items():
+                if any(column in row_updates for column in changes.key_columns):
+                    keys.add(tuple(row_updates.get(column, value) for column, value in zip(changes.key_columns, key)))
+            touched[table_name] = (keys, list(changes.inserts))
+        return touched
+
+    # ---- 保存 ----
+
+    def flush(self, db):
+        """
+        把所有待保存的修改写入数据库（不提交，由调用方提交或回滚）
+        没有未提交的事务时先 BEGIN：事务外的 SAVEPOINT 会自己开始事务，RELEASE 时就提交了
+        在一个保存点内执行，任何语句失败都会回滚到保存前的状态并保留缓冲区
+        整个过程独占写连接，写连接正被后台导入占用时抛出 WriterBusyError
+        """
+        if self.is_empty():
+            return
+        with db.writing():
+            if not db.conn.in_transaction:
+                db.conn.execute("BEGIN")
+            db.conn.execute("SAVEPOINT edit_buffer")
+            try:
+                for table_name, changes in self._tables.items():
+                    # 已删除行上的单元格修改无需写入
+                    by_column = {}
+                    for key, row_updates in changes.updates.items():
+                        if key in changes.deletes:
+                            continue
+                        for column_name, value in row_updates.items():
+                            by_column.setdefault(column_name, []).append((value, key))
+                    for column_name, items in by_column.items():
+                        db.update_cells(table_name, changes.key_columns, column_name, items)
+
+                    if changes.deletes:
+                        db.delete_rows(table_name, changes.key_columns, list(changes.deletes))
+
+                    by_columns = {}
+                    for column_names, values in changes.inserts:
+                        by_columns.setdefault(column_names, []).append(values)
+                    for column_names, rows in by_columns.items():
+                        db.insert_rows(table_name, column_names, rows)
+            except Exception:
+                db.conn.execute("ROLLBACK TO edit_buffer")
+                db.conn.execute("RELEASE edit_buffer")
+                raise
+            db.conn.execute("RELEASE edit_buffer")
+        self.clear()
+
+    # ---- 内部实现 ----
+
+    def _changes(self, table_name, key_columns):
+        changes = self._tables.get(table_name)
+        if changes is None:
+            changes = self._tables[table_name] = _TableChanges()
+        if key_columns:
+            changes.key_columns = tuple(key_columns)
+        return changes
+
+    def _push(self, op):
+        self._undo_stack.append(op)
+        self._redo_stack.clear()
+
+    def _apply(self, op):
+        changes = self._tables[op[1]]
+        if op[0] == "update":
+            _, _, key, column_name, _, _, value = op
+            changes.updates.setdefault(key, {})[column_name] = value
+        elif op[0] == "delete":
+            changes.deletes.update(op[2])
+        else:
+            changes.inserts.append((op[2], op[3]))
+
+    def _revert(self, op):
+        changes = self._tables[op[1]]
+        if op[0] == "update":
+            _, _, key, column_name, had_pending, old_value, _ = op
+            row_updates = changes.updates[key]
+            if had_pending:
+                row_updates[column_name] = old_value
+            else:
+                del row_updates[column_name]
+                if not row_updates:
+                    del changes.updates[key]
+        elif op[0] == "delete":
+            changes.deletes.difference_update(op[2])
+        else:
+            changes.inserts.pop()
+
+
+class _TableChanges:
+    """单个表的待保存修改"""
+
+    def __init__(self):
+        self.key_columns = ()
+        self.updates = {}  # 键 -> {列名: 新值}
+        self.deletes = set()  # 待删除行的键
+        self.inserts = []  # (列名元组, 值元组)
+
+    def count(self):
+        return len(self.updates) + len(self.deletes) + len(self.inserts)
@@ -0,0 +1,253 @@
+import base64
+import csv
+import json
+import os
+from db_connector import quote_identifier, schema_prefix
+
+# 支持的导出格式: 格式名 -> 文件扩展名
+EXPORT_FORMATS = {
+    "csv": ".csv",
+    "jsonl": ".jsonl",
+    "parquet": ".parquet",
+}
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+def format_from_path(path, default="csv"):
+    # 根据文件扩展名推断导出格式
+    lower = path.lower()
+    for fmt, ext in EXPORT_FORMATS.items():
+        if lower.endswith(ext):
+            return fmt
+    return default
+
+
+def table_query(table_name, schema_name=None):
+    return f"SELECT * FROM {schema_prefix(schema_name)}{quote_identifier(table_name)}"
+
+
+def export_query(conn, query, path, fmt="csv", params=(), batch_size=5000,
+                 progress=None, should_cancel=None):
+    """
+    把查询结果流式写入文件，返回写入的行数
+    直接从游标按 fetchmany 分批读取，每批写完即丢弃，内存占用与结果集大小无关
+    progress(rows_written) 在每批写入后调用；should_cancel() 返回 True 时抛出 ExportCancelled
+    结果只读取一遍：Parquet 的列类型按第一批的值确定，之后的批次出现不兼容的值时再放宽（见 _ParquetWriter）
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    cursor = conn.execute(query, params)
+    if cursor.description is None:
+        raise ValueError("该语句没有返回结果集，无法导出")
+    headers = [description[0] for description in cursor.description]
+    writer = {"csv": _CsvWriter, "jsonl": _JsonLinesWriter, "parquet": _ParquetWriter}[fmt](path, headers)
+
+    rows_written = 0
+    with writer:
+        while True:
+            if should_cancel is not None and should_cancel():
+                raise ExportCancelled()
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            writer.write_batch(batch)
+            rows_written += len(batch)
+            if progress is not None:
+                progress(rows_written)
+    return rows_written
+
+
+# 超出 float64 能精确表示的整数范围时，与小数混在一起的列只能导出为文本
+_FLOAT_EXACT_INT = 2 ** 53
+
+
+class _LargeInt:
+    """_add_value_types() 中表示出现过超出 ±2**53 的整数"""
+
+
+def _add_value_types(seen, columns):
+    # 把一批数据（按列）中出现的值类型加入每列的类型集合（不含 NULL）
+    for types, column in zip(seen, columns):
+        batch_types = set(map(type, column))
+        if int in batch_types and _LargeInt not in types:
+            ints = [value for value in column if type(value) is int]
+            if max(ints) > _FLOAT_EXACT_INT or min(ints) < -_FLOAT_EXACT_INT:
+                types.add(_LargeInt)
+        types |= batch_types
+        types.discard(type(None))
+
+
+def encode_value(value):
+    """BLOB 用 base64 编码，其他类型 json/csv 可以直接表示"""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
+
+
+class _CsvWriter:
+    def __init__(self, path, headers):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+
+    def write_batch(self, rows):
+        self._writer.writerows(
+            [encode_value(value) for value in row] if any(isinstance(value, bytes) for value in row) else row
+            for row in rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+class _JsonLinesWriter:
+    def __init__(self, path, headers):
+        self._file = open(path, "w", encoding="utf-8")
+        self._headers = headers
+
+    def write_batch(self, rows):
+        headers = self._headers
+        self._file.writelines(
+            json.dumps({name: encode_value(value) for name, value in zip(headers, row)},
+                       ensure_ascii=False) + "\n"
+            for row in rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """
+    Parquet 写入（需要安装 pyarrow），每批写成一个 row group
+    列类型由目前为止实际出现的值类型决定：只有整数为 int64，整数和小数混合为 float64
+    （有超出 ±2**53 的整数时为文本），只有 BLOB 为 binary，其余为文本（BLOB 按 base64）；
+    值只做无损转换，不使用 Arrow 的不安全转换
+    类型按第一批确定，之后的批次使某列的类型改变时，把已写入的 row group 从临时文件读回、转换为新的类型重写一遍，
+    因此结果只需读取一遍；float64 列记录哪些值原来是整数，改为文本时仍写成整数的形式
+    先写入同目录下的临时文件，成功后才替换为目标文件，失败或取消时删除，不留下不完整的文件
+    """
+
+    def __init__(self, path, headers):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出 Parquet 需要安装 pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._temp_path = path + ".part"
+        self._headers = headers
+        self._seen = [set() for _ in headers]
+        self._schema = None
+        self._writer = None
+        self._rows = 0
+        self._int_flags = None  # float64 列中每行的值原来是否为整数（其他类型的列为 None）
+
+    def _arrow_type(self, types):
+        pa = self._pa
+        if types == {int} or types == {int, _LargeInt}:
+            return pa.int64()
+        if types and types <= {int, float}:
+            return pa.float64()
+        if types == {bytes}:
+            return pa.binary()
+        return pa.string()
+
+    def _current_schema(self):
+        return self._pa.schema([(name, self._arrow_type(types)) for name, types in zip(self._headers, self._seen)])
+
+    def write_batch(self, rows):
+        pa = self._pa
+        columns = list(zip(*rows))
+        _add_value_types(self._seen, columns)
+        schema = self._current_schema()
+        if self._writer is None:
+            self._schema = schema
+            self._int_flags = [bytearray() if field.type == pa.float64() else None for field in schema]
+            self._writer = self._pq.ParquetWriter(self._temp_path, schema)
+        elif not schema.equals(self._schema):
+            self._promote(schema)
+        arrays = []
+        for i, (values, field) in enumerate(zip(columns, self._schema)):
+            if field.type == pa.float64():
+                self._int_flags[i].extend(type(value) is int for value in values)
+            arrays.append(pa.array(self._convert(values, field.type), type=field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._rows += len(rows)
+
+    def _promote(self, schema):
+        # 已写入的数据按新的列类型重写：从临时文件逐个 row group 读回转换，内存占用仍只有一批
+        pa = self._pa
+        changed = [i for i, (old, new) in enumerate(zip(self._schema, schema)) if old.type != new.type]
+        flags = {i: self._int_flags[i] for i in changed}
+        for i in changed:
+            new_type = schema.field(i).type
+            if new_type != pa.float64():
+                self._int_flags[i] = None
+            elif self._schema.field(i).type == pa.int64():
+                self._int_flags[i] = bytearray(b"\x01") * self._rows  # 之前只有整数
+            else:
+                self._int_flags[i] = bytearray(self._rows)  # 之前只有 NULL
+        self._writer.close()
+        self._writer = None
+        # ParquetWriter 不能追加到已有文件，重写到另一个临时文件后继续在其中写入
+        old_path = self._temp_path
+        self._temp_path = old_path[:-len(".tmp")] if old_path.endswith(".tmp") else old_path + ".tmp"
+        writer = self._pq.ParquetWriter(self._temp_path, schema)
+        try:
+            with self._pq.ParquetFile(old_path) as source:
+                offset = 0
+                for group in range(source.num_row_groups):
+                    table = source.read_row_group(group)
+                    for i in changed:
+                        field = schema.field(i)
+                        values = table.column(i).to_pylist()
+                        if flags[i] is not None and field.type == pa.string():
+                            is_int = flags[i][offset:offset + len(values)]
+                            values = [int(value) if value is not None and is_int[n] else value
+                                      for n, value in enumerate(values)]
+                        column = pa.array(self._convert(values, field.type), type=field.type)
+                        table = table.set_column(i, field, column)
+                    writer.write_table(table)
+                    offset += table.num_rows
+        except BaseException:
+            writer.close()
+            os.remove(old_path)
+            raise
+        os.remove(old_path)
+        self._writer = writer
+        self._schema = schema
+
+    def _convert(self, values, arrow_type):
+        # SQLite 是动态类型，同一列中可能混有其他类型的值
+        pa = self._pa
+        if arrow_type == pa.string():
+            return [value if value is None or type(value) is str else str(encode_value(value)) for value in values]
+        if arrow_type == pa.float64():
+            return [None if value is None else float(value) for value in values]
+        return values
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._writer is None and exc_info[0] is None:
+                # 结果为空：没有值可以确定类型，所有列都是文本
+                self._writer = self._pq.ParquetWriter(self._temp_path, self._current_schema())
+            if self._writer is not None:
+                self._writer.close()
+        finally:
+            if exc_info[0] is None:
+                os.replace(self._temp_path, self._path)
+            elif os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
@@ -0,0 +1,72 @@
+from PyQt5.QtWidgets import QWidget, QLineEdit
+from PyQt5.QtCore import pyqtSignal
+
+
+class ColumnFilterBar(QWidget):
+    """
+    表格上方的逐列过滤行
+    每列一个输入框，位置和宽度跟随表头的列，按回车后发出 filtersChanged 信号
+    """
+
+    filtersChanged = pyqtSignal(dict)  # 列名 -> 过滤文本
+
+    def __init__(self, table_view, parent=None):
+        super().__init__(parent)
+        self.table_view = table_view
+        self.headers = []
+        self.editors = []
+        self.setFixedHeight(QLineEdit().sizeHint().height())
+
+        header = table_view.horizontalHeader()
+        header.sectionResized.connect(self.reposition)
+        header.sectionMoved.connect(self.reposition)
+        header.geometriesChanged.connect(self.reposition)
+        table_view.horizontalScrollBar().valueChanged.connect(self.reposition)
+
+    def set_columns(self, headers):
+        for editor in self.editors:
+            editor.deleteLater()
+        self.headers = list(headers)
+        self.editors = []
+        for name in self.headers:
+            editor = QLineEdit(self)
+            editor.setPlaceholderText("过滤")
+            editor.setToolTip(f"过滤 {name}: 输入文本按包含匹配，或使用 =x、!=x、>x、>=x、<x、<=x、NULL、NOT NULL")
+            editor.setClearButtonEnabled(True)
+            editor.returnPressed.connect(self.emit_filters)
+            editor.textChanged.connect(self.on_text_changed)
+            editor.show()
+            self.editors.append(editor)
+        self.reposition()
+
+    def filters(self):
+        return {name: editor.text() for name, editor in zip(self.headers, self.editors) if editor.text().strip()}
+
+    def clear(self):
+        for editor in self.editors:
+            editor.blockSignals(True)
+            editor.clear()
+            editor.blockSignals(False)
+
+    def emit_filters(self):
+        self.filtersChanged.emit(self.filters())
+
+    def on_text_changed(self, text):
+        # 点击清除按钮后立即取消该列的过滤
+        if not text:
+            self.emit_filters()
+
+    def reposition(self, *args):
+        header = self.table_view.horizontalHeader()
+        offset = self.table_view.verticalHeader().width() + self.table_view.frameWidth()
+        for col, editor in enumerate(self.editors):
+            if header.isSectionHidden(col):
+                editor.hide()
+                continue
+            editor.setGeometry(offset + header.sectionViewportPosition(col), 0,
+                               header.sectionSize(col), self.height())
+            editor.show()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.reposition()
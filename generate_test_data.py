@@ -1,21 +1,40 @@
+import argparse
 import sqlite3
 import os
 import random
+import time
 from datetime import datetime, timedelta
 
-def create_test_database(db_path='test_database.db'):
+# scale=1 时的数据量
+BASE_USERS = 50
+BASE_ORDERS = 100
+
+
+def create_test_database(db_path='test_database.db', scale=1, users=None, orders=None, seed=None,
+                         chunk_size=50000, verbose=True):
     """
     创建测试数据库并填充示例数据
+    用户数和订单数按 scale 倍数放大（也可以用 users / orders 直接指定），订单明细约为订单数的 3 倍
+    指定 seed 时使用固定的随机数种子和固定的基准时间，相同参数生成的数据库内容完全相同
+    大批量数据边生成边按 chunk_size 行一批用 executemany 写入，内存占用与数据量无关
     """
+    num_users = users if users is not None else max(1, int(BASE_USERS * scale))
+    num_orders = orders if orders is not None else max(1, int(BASE_ORDERS * scale))
+    rng = random.Random(seed)
+    log = print if verbose else (lambda *args: None)
+    start = time.perf_counter()
+
     # 如果文件已存在，则先删除
     if os.path.exists(db_path):
         os.remove(db_path)
     
-    # 创建数据库连接
+    # 创建数据库连接；新建的测试库无需崩溃保护，关闭同步写盘以加快生成
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
     cursor = conn.cursor()
     
-    print(f"正在创建测试数据库: {db_path}")
+    log(f"正在创建测试数据库: {db_path}")
     
     # 创建用户表
     cursor.execute('''
@@ -80,36 +99,30 @@ def create_test_database(db_path='test_database.db'):
     )
     ''')
     
-    print("表结构已创建")
+    log("表结构已创建")
     
     # 生成用户数据
-    usernames = ["user" + str(i) for i in range(1, 51)]
-    emails = [f"user{i}@example.com" for i in range(1, 51)]
-    password_hashes = ["hash_" + str(random.randint(10000, 99999)) for _ in range(50)]
-    
-    now = datetime.now()
-    registration_dates = [(now - timedelta(days=random.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S') for _ in range(50)]
-    last_logins = [(now - timedelta(days=random.randint(0, 30))).strftime('%Y-%m-%d %H:%M:%S') for _ in range(50)]
-    is_actives = [random.choice([0, 1]) for _ in range(50)]
-    
-    users_data = []
-    for i in range(50):
-        users_data.append((
-            i+1, 
-            usernames[i], 
-            emails[i], 
-            password_hashes[i], 
-            registration_dates[i], 
-            last_logins[i], 
-            is_actives[i]
-        ))
-    
-    cursor.executemany(
+    now = datetime(2024, 1, 1) if seed is not None else datetime.now()
+    
+    def user_rows():
+        for i in range(1, num_users + 1):
+            yield (
+                i,
+                f"user{i}",
+                f"user{i}@example.com",
+                "hash_" + str(rng.randint(10000, 99999)),
+                (now - timedelta(days=rng.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S'),
+                (now - timedelta(days=rng.randint(0, 30))).strftime('%Y-%m-%d %H:%M:%S'),
+                rng.choice([0, 1])
+            )
+    
+    _insert_chunked(
+        cursor,
         "INSERT INTO users (id, username, email, password_hash, registration_date, last_login, is_active) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        users_data
+        user_rows(), chunk_size
     )
     
-    print("已添加 50 个用户数据")
+    log(f"已添加 {num_users} 个用户数据")
     
     # 生成产品分类数据
     main_categories = [
@@ -142,7 +155,7 @@ def create_test_database(db_path='test_database.db'):
         main_categories + sub_categories
     )
     
-    print(f"已添加 {len(main_categories) + len(sub_categories)} 个产品分类")
+    log(f"已添加 {len(main_categories) + len(sub_categories)} 个产品分类")
     
     # 生成产品数据
     products = []
@@ -164,7 +177,7 @@ def create_test_database(db_path='test_database.db'):
     ]
     
     product_descriptions = [f"{name}的详细描述，这是一个示例文本。" for name in product_names]
-    product_prices = [random.uniform(10.0, 9999.9) for _ in range(len(product_names))]
+    product_prices = [rng.uniform(10.0, 9999.9) for _ in range(len(product_names))]
     product_prices = [round(price, 2) for price in product_prices]
     
     # 将产品分配到适当的分类
@@ -199,8 +212,8 @@ def create_test_database(db_path='test_database.db'):
         else:
             category_ids.append(19)  # 杂志
     
-    stocks = [random.randint(0, 1000) for _ in range(len(product_names))]
-    created_dates = [(now - timedelta(days=random.randint(1, 500))).strftime('%Y-%m-%d %H:%M:%S') for _ in range(len(product_names))]
+    stocks = [rng.randint(0, 1000) for _ in range(len(product_names))]
+    created_dates = [(now - timedelta(days=rng.randint(1, 500))).strftime('%Y-%m-%d %H:%M:%S') for _ in range(len(product_names))]
     
     for i in range(len(product_names)):
         products.append((
@@ -218,40 +231,31 @@ def create_test_database(db_path='test_database.db'):
         products
     )
     
-    print(f"已添加 {len(products)} 个产品数据")
+    log(f"已添加 {len(products)} 个产品数据")
     
-    # 生成订单数据
-    orders = []
+    # 生成订单和订单明细数据
+    # 先生成每个订单的明细再算出总金额，订单行一次写入，不再逐个 UPDATE
     order_statuses = ["已下单", "已支付", "已发货", "已完成", "已取消"]
-    
-    for i in range(1, 101):  # 创建100个订单
-        user_id = random.randint(1, 50)
-        order_date = (now - timedelta(days=random.randint(1, 60))).strftime('%Y-%m-%d %H:%M:%S')
-        # 总金额暂时为0，后面会更新
-        status = random.choice(order_statuses)
-        
-        orders.append((i, user_id, order_date, 0, status))
-    
-    cursor.executemany(
-        "INSERT INTO orders (id, user_id, order_date, total_amount, status) VALUES (?, ?, ?, ?, ?)",
-        orders
-    )
-    
-    print("已创建 100 个订单")
-    
-    # 生成订单明细数据
+    orders_sql = "INSERT INTO orders (id, user_id, order_date, total_amount, status) VALUES (?, ?, ?, ?, ?)"
+    items_sql = "INSERT INTO order_items (id, order_id, product_id, quantity, price_per_unit) VALUES (?, ?, ?, ?, ?)"
+    # 订单日期只有 60 种，预先格式化，避免对每个订单调用 strftime
+    order_dates = [(now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S') for days in range(61)]
+    order_rows = []
     order_items = []
     item_id = 1
     
-    # 更新订单总金额
-    for order_id in range(1, 101):
+    for order_id in range(1, num_orders + 1):
+        user_id = rng.randint(1, num_users)
+        order_date = order_dates[rng.randint(1, 60)]
+        status = rng.choice(order_statuses)
+        
         # 每个订单有1-5个商品
-        num_items = random.randint(1, 5)
+        num_items = rng.randint(1, 5)
         order_total = 0
         
         for _ in range(num_items):
-            product_id = random.randint(1, len(products))
-            quantity = random.randint(1, 5)
+            product_id = rng.randint(1, len(products))
+            quantity = rng.randint(1, 5)
             price_per_unit = products[product_id-1][3]  # 获取产品价格
             
             order_items.append((item_id, order_id, product_id, quantity, price_per_unit))
@@ -259,24 +263,55 @@ def create_test_database(db_path='test_database.db'):
             
             order_total += quantity * price_per_unit
         
-        # 更新订单总金额
-        cursor.execute("UPDATE orders SET total_amount = ? WHERE id = ?", (round(order_total, 2), order_id))
+        order_rows.append((order_id, user_id, order_date, round(order_total, 2), status))
+        if len(order_rows) >= chunk_size:
+            cursor.executemany(orders_sql, order_rows)
+            cursor.executemany(items_sql, order_items)
+            order_rows = []
+            order_items = []
+            if order_id % (chunk_size * 20) == 0:
+                log(f"已生成 {order_id} / {num_orders} 个订单")
     
-    cursor.executemany(
-        "INSERT INTO order_items (id, order_id, product_id, quantity, price_per_unit) VALUES (?, ?, ?, ?, ?)",
-        order_items
-    )
+    cursor.executemany(orders_sql, order_rows)
+    cursor.executemany(items_sql, order_items)
     
-    print(f"已添加 {len(order_items)} 条订单明细")
+    log(f"已创建 {num_orders} 个订单，{item_id - 1} 条订单明细")
     
     # 提交更改并关闭连接
     conn.commit()
     conn.close()
     
-    print(f"测试数据库创建完成: {db_path}")
+    log(f"测试数据库创建完成: {db_path}，用时 {time.perf_counter() - start:.1f} 秒")
     return db_path
 
-if __name__ == "__main__":
-    db_path = create_test_database()
+
+def _insert_chunked(cursor, sql, rows, chunk_size):
+    # 从生成器中每次取 chunk_size 行，用一次 executemany 写入
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            cursor.executemany(sql, chunk)
+            chunk = []
+    if chunk:
+        cursor.executemany(sql, chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成用于测试和性能基准的示例数据库")
+    parser.add_argument("db_path", nargs="?", default="test_database.db", help="输出的数据库文件")
+    parser.add_argument("--scale", type=float, default=1, help=f"数据量倍数（1 倍为 {BASE_USERS} 个用户、{BASE_ORDERS} 个订单）")
+    parser.add_argument("--users", type=int, help="用户数，覆盖 --scale")
+    parser.add_argument("--orders", type=int, help="订单数，覆盖 --scale，例如 10000000")
+    parser.add_argument("--seed", type=int, help="随机数种子，指定后生成结果可重复")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="每次 executemany 写入的行数")
+    args = parser.parse_args(argv)
+
+    db_path = create_test_database(args.db_path, scale=args.scale, users=args.users, orders=args.orders,
+                                   seed=args.seed, chunk_size=args.chunk_size)
     print(f"测试数据库已生成在: {os.path.abspath(db_path)}")
     print("现在您可以在数据库查看器中打开这个数据库文件进行测试。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, QPushButton,
+                             QComboBox, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QDialogButtonBox, QFileDialog, QLabel, QMessageBox)
+from importer import IMPORT_FORMATS, COLUMN_TYPES, format_from_path, read_chunks, infer_column_types
+
+
+class ImportDialog(QDialog):
+    """批量导入向导：选择文件、目标表，预览并调整推断出的列类型"""
+
+    def __init__(self, existing_tables, parent=None):
+        super().__init__(parent)
+        self.existing_tables = set(existing_tables)
+        self.headers = []
+        self.setWindowTitle("导入数据")
+        self.resize(520, 480)
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        file_layout = QHBoxLayout()
+        self.file_input = QLineEdit()
+        self.file_input.setReadOnly(True)
+        browse_button = QPushButton("浏览...")
+        browse_button.clicked.connect(self.choose_file)
+        file_layout.addWidget(self.file_input)
+        file_layout.addWidget(browse_button)
+        form.addRow("文件:", file_layout)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(sorted(IMPORT_FORMATS))
+        self.format_combo.currentTextChanged.connect(self.load_preview)
+        form.addRow("格式:", self.format_combo)
+
+        self.table_input = QLineEdit()
+        self.table_input.textChanged.connect(self.update_table_hint)
+        form.addRow("目标表:", self.table_input)
+
+        self.fast_check = QCheckBox("快速导入（synchronous=OFF、导入后再建索引）")
+        self.fast_check.setChecked(True)
+        form.addRow("", self.fast_check)
+        layout.addLayout(form)
+
+        self.table_hint = QLabel()
+        layout.addWidget(self.table_hint)
+
+        # 列类型映射，新建表时使用
+        self.types_table = QTableWidget(0, 2)
+        self.types_table.setHorizontalHeaderLabels(["列", "类型"])
+        self.types_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.types_table)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "选择要导入的文件", "",
+            "数据文件 (*.csv *.tsv *.txt *.jsonl *.ndjson *.json);;所有文件 (*)")
+        if not path:
+            return
+        self.file_input.setText(path)
+        if not self.table_input.text():
+            self.table_input.setText(os.path.splitext(os.path.basename(path))[0])
+        self.format_combo.setCurrentText(format_from_path(path))
+        self.load_preview()
+
+    def load_preview(self):
+        """读取文件第一块中的样本行，推断列类型"""
+        path = self.file_input.text()
+        if not path:
+            return
+        try:
+            headers, chunks = read_chunks(path, self.format_combo.currentText(), chunk_size=1000)
+            sample = next(chunks, [])
+            chunks.close()
+        except Exception as e:
+            QMessageBox.warning(self, "无法读取文件", str(e))
+            return
+
+        self.headers = headers
+        self.types_table.setRowCount(len(headers))
+        for row, (name, col_type) in enumerate(zip(headers, infer_column_types(headers, sample))):
+            self.types_table.setItem(row, 0, QTableWidgetItem(name))
+            combo = QComboBox()
+            combo.addItems(COLUMN_TYPES)
+            combo.setCurrentText(col_type)
+            self.types_table.setCellWidget(row, 1, combo)
+        self.update_table_hint()
+
+    def update_table_hint(self):
+        exists = self.table_input.text() in self.existing_tables
+        self.types_table.setEnabled(not exists)
+        self.table_hint.setText("表已存在，将按列名追加数据" if exists else "将新建表，列类型如下")
+
+    def column_types(self):
+        return [self.types_table.cellWidget(row, 1).currentText() for row in range(self.types_table.rowCount())]
+
+    def accept(self):
+        if not self.file_input.text() or not self.table_input.text().strip():
+            QMessageBox.warning(self, "警告", "请选择文件并填写目标表名")
+            return
+        super().accept()
+
+    def options(self):
+        """返回导入参数字典"""
+        table_name = self.table_input.text().strip()
+        return {
+            "path": self.file_input.text(),
+            "table_name": table_name,
+            "fmt": self.format_combo.currentText(),
+            "column_types": None if table_name in self.existing_tables else self.column_types(),
+            "fast": self.fast_check.isChecked(),
+        }
@@ -0,0 +1,289 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+from db_connector import quote_identifier
+
+# 支持的导入格式: 格式名 -> 文件扩展名
+IMPORT_FORMATS = {
+    "csv": (".csv", ".tsv", ".txt"),
+    "jsonl": (".jsonl", ".ndjson", ".json"),
+}
+
+COLUMN_TYPES = ("INTEGER", "REAL", "TEXT", "BLOB")
+
+
+class ImportCancelled(Exception):
+    """导入被用户取消"""
+
+
+def format_from_path(path, default="csv"):
+    # 根据文件扩展名推断导入格式
+    lower = path.lower()
+    for fmt, extensions in IMPORT_FORMATS.items():
+        if lower.endswith(extensions):
+            return fmt
+    return default
+
+
+def read_chunks(path, fmt=None, chunk_size=50000):
+    """
+    分块读取 CSV 或 JSON Lines 文件，返回 (表头, 行块生成器)
+    整个文件不会一次读入内存
+    """
+    fmt = fmt or format_from_path(path)
+    if fmt == "csv":
+        return _read_csv_chunks(path, chunk_size)
+    if fmt == "jsonl":
+        return _read_jsonl_chunks(path, chunk_size)
+    raise ValueError(f"不支持的导入格式: {fmt}")
+
+
+def _read_csv_chunks(path, chunk_size):
+    file = open(path, newline="", encoding="utf-8-sig")
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(file, dialect)
+    headers = next(reader, None)
+    if headers is None:
+        file.close()
+        raise ValueError("文件为空")
+
+    def chunks():
+        with file:
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    break
+                yield chunk
+
+    return headers, chunks()
+
+
+def _read_jsonl_chunks(path, chunk_size):
+    file = open(path, encoding="utf-8")
+    lines = (line for line in file if line.strip())
+    first_line = next(lines, None)
+    if first_line is None:
+        file.close()
+        raise ValueError("文件为空")
+    first = json.loads(first_line)
+    headers = list(first)
+
+    def to_row(record):
+        return tuple(_json_to_sql(record.get(name)) for name in headers)
+
+    def chunks():
+        with file:
+            chunk = [to_row(first)]
+            for line in lines:
+                chunk.append(to_row(json.loads(line)))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    return headers, chunks()
+
+
+def _json_to_sql(value):
+    # 嵌套的对象和数组以 JSON 文本保存
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def infer_column_types(headers, rows):
+    """根据样本行推断每列的类型 (INTEGER / REAL / TEXT)"""
+    types = []
+    for col_idx in range(len(headers)):
+        inferred = "INTEGER"
+        seen_value = False
+        for row in rows:
+            value = row[col_idx] if col_idx < len(row) else None
+            if value is None or value == "":
+                continue
+            seen_value = True
+            if isinstance(value, str):
+                if inferred == "INTEGER":
+                    try:
+                        int(value)
+                        continue
+                    except ValueError:
+                        inferred = "REAL"
+                try:
+                    float(value)
+                except ValueError:
+                    inferred = "TEXT"
+                    break
+            elif isinstance(value, float) and inferred == "INTEGER":
+                inferred = "REAL"
+            elif not isinstance(value, (int, float)):
+                inferred = "TEXT"
+                break
+        types.append(inferred if seen_value else "TEXT")
+    return types
+
+
+def import_file(db_path, path, table_name, fmt=None, column_types=None, chunk_size=50000,
+                rows_per_transaction=500000, fast=False, progress=None, should_cancel=None, conn=None):
+    """
+    把 CSV / JSON Lines 文件批量导入到表中，返回 (导入行数, 用时秒数)
+    表不存在时按 column_types（缺省为推断结果）建表；表已存在时按列名匹配文件中的列
+    数据分块读取，每块用一次 executemany 插入，每 rows_per_transaction 行提交一次
+    fast=True 时在导入期间使用 synchronous=OFF，并先删除表上的普通索引、导入后再重建；journal_mode 保持不变：
+    其他连接打开着数据库时无法退出 WAL，切换到 WAL 会使文件永久留在 WAL 模式
+    UNIQUE 和主键索引保留，重复的键仍会在插入时报错，不会先写入再在重建索引时才发现
+    progress(已导入行数, 每秒行数) 在每块插入后调用；should_cancel() 返回 True 时抛出 ImportCancelled，
+    已提交的部分会保留
+    conn 为调用方提供的写连接（如 ConnectionManager.writer），不能处于事务中，用完后不会关闭；
+    缺省时按 db_path 打开独立连接
+    """
+    start = time.perf_counter()
+    headers, chunks = read_chunks(path, fmt, chunk_size)
+    first_chunk = next(chunks, [])
+
+    owns_conn = conn is None
+    if owns_conn:
+        conn = sqlite3.connect(db_path, isolation_level=None)  # 手动控制事务
+        conn.execute("PRAGMA busy_timeout = 5000")
+    elif conn.in_transaction:
+        raise ValueError("导入前需要先提交或回滚写连接上的事务")
+    table = quote_identifier(table_name)
+    saved_synchronous = None
+    dropped_indexes = []
+    rows_imported = 0
+    try:
+        if fast:
+            # synchronous 只对这个连接生效，不能在事务中修改，先在事务外设置
+            saved_synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+            conn.execute("PRAGMA synchronous = OFF")
+            # 导入完成后再统一建索引，比逐行维护索引快得多；只删除 CREATE INDEX 建立的非唯一索引
+            unique = {row[1] for row in conn.execute(f"PRAGMA index_list({table})") if row[2]}
+            dropped_indexes = [(name, sql) for name, sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table_name,)) if name not in unique]
+            for index_name, _ in dropped_indexes:
+                conn.execute(f"DROP INDEX {quote_identifier(index_name)}")
+
+        conn.execute("BEGIN")
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if existing:
+            # 按列名匹配已有表中的列（不区分大小写）
+            lookup = {name.lower(): name for name in existing}
+            positions = [i for i, name in enumerate(headers) if name.lower() in lookup]
+            if not positions:
+                raise ValueError(f"文件中没有与表 {table_name} 匹配的列")
+            target_columns = [lookup[headers[i].lower()] for i in positions]
+            target_types = [None] * len(positions)
+        else:
+            types = list(column_types or infer_column_types(headers, first_chunk[:1000]))
+            column_defs = ", ".join(f"{quote_identifier(name)} {col_type}" for name, col_type in zip(headers, types))
+            conn.execute(f"CREATE TABLE {table} ({column_defs})")
+            positions = list(range(len(headers)))
+            target_columns = list(headers)
+            target_types = types
+
+        columns_str = ", ".join(quote_identifier(name) for name in target_columns)
+        placeholders = ", ".join(["?"] * len(target_columns))
+        insert_sql = f"INSERT INTO {table} ({columns_str}) VALUES ({placeholders})"
+        # 非文本列中的空字符串按 NULL 处理，其余值交给列亲和性转换
+        null_if_empty = [col_type not in ("TEXT", None) for col_type in target_types]
+        width = len(headers)
+
+        def convert(chunk):
+            for row in chunk:
+                if len(row) < width:
+                    row = list(row) + [None] * (width - len(row))
+                yield tuple(None if null_if_empty[i] and row[pos] == "" else row[pos]
+                            for i, pos in enumerate(positions))
+
+        in_transaction_rows = 0
+        chunk = first_chunk
+        while chunk:
+            if should_cancel is not None and should_cancel():
+                raise ImportCancelled()
+            conn.executemany(insert_sql, convert(chunk))
+            rows_imported += len(chunk)
+            in_transaction_rows += len(chunk)
+            if in_transaction_rows >= rows_per_transaction:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                in_transaction_rows = 0
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                progress(rows_imported, rows_imported / elapsed if elapsed > 0 else 0.0)
+            chunk = next(chunks, None)
+        conn.execute("COMMIT")
+    except BaseException as e:
+        if conn.in_transaction:
+            # 取消时保留已导入的部分，出错时回滚当前事务
+            conn.execute("COMMIT" if isinstance(e, ImportCancelled) else "ROLLBACK")
+        raise
+    finally:
+        try:
+            failed_indexes = _recreate_indexes(conn, dropped_indexes)
+        finally:
+            try:
+                if saved_synchronous is not None:
+                    conn.execute(f"PRAGMA synchronous = {int(saved_synchronous)}")
+            finally:
+                if owns_conn:
+                    conn.close()
+                chunks.close()
+    if failed_indexes:
+        raise sqlite3.OperationalError(
+            f"数据已导入，但无法重建索引: " + "; ".join(f"{name}: {error}" for name, error in failed_indexes))
+    return rows_imported, time.perf_counter() - start
+
+
+def _recreate_indexes(conn, indexes):
+    # 逐个重建导入前删除的索引，一个失败不影响其余的；返回 [(索引名, 错误)]
+    failed = []
+    for index_name, index_sql in indexes:
+        try:
+            conn.execute(index_sql)
+        except sqlite3.Error as e:
+            failed.append((index_name, e))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 CSV / JSON Lines 文件批量导入 SQLite 数据库")
+    parser.add_argument("file", help="要导入的 CSV 或 JSON Lines 文件")
+    parser.add_argument("database", help="目标 SQLite 数据库文件")
+    parser.add_argument("table", nargs="?", help="目标表名（默认使用文件名）")
+    parser.add_argument("--format", choices=sorted(IMPORT_FORMATS), help="文件格式（默认按扩展名判断）")
+    parser.add_argument("--types", help="列类型，逗号分隔，例如 INTEGER,TEXT,REAL（仅新建表时使用）")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="每次 executemany 插入的行数")
+    parser.add_argument("--fast", action="store_true",
+                        help="导入期间使用 synchronous=OFF 并延迟创建索引")
+    args = parser.parse_args(argv)
+
+    table_name = args.table or os.path.splitext(os.path.basename(args.file))[0]
+    column_types = [t.strip().upper() for t in args.types.split(",")] if args.types else None
+
+    def report(rows, rate):
+        print(f"\r已导入 {rows} 行 ({rate:.0f} 行/秒)", end="", file=sys.stderr, flush=True)
+
+    rows, elapsed = import_file(args.database, args.file, table_name, fmt=args.format,
+                                column_types=column_types, chunk_size=args.chunk_size,
+                                fast=args.fast, progress=report)
+    print(file=sys.stderr)
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(f"导入完成: {rows} 行 -> {table_name}，用时 {elapsed:.2f} 秒 ({rate:.0f} 行/秒)")
+
+
+if __name__ == "__main__":
+    main()
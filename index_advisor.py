@@ -0,0 +1,583 @@
+import re
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from db_connector import is_full_scan_step, is_read_only_query, is_rowid_key, quote_identifier, schema_prefix
+from profiler import StepCounter
+
+# 一条索引建议：columns 为索引列，covering 表示索引包含受益语句读取的该表所有列；
+# statements 为受益的 LoggedStatement，executions 为它们的执行次数之和；
+# rows_before / rows_after 为按统计信息估计的每次执行读取该表的行数（无法估计时为 None）；
+# plan_before / plan_after 为第一条受益语句在建索引前后的查询计划（detail 列表）
+IndexSuggestion = namedtuple('IndexSuggestion', 'schema table columns covering create_sql statements executions '
+                                                'rows_before rows_after removes_sort plan_before plan_after')
+
+# 单个表的引用：alias 为 SQL 中使用的名字（没有别名时为表名），schema 为 None 表示没有写库名
+TableRef = namedtuple('TableRef', 'alias schema table')
+
+SAMPLE_ROWS = 100000  # 估计候选索引的选择性时抽样的行数
+SAMPLE_BLOCKS = 100  # 抽样分成这么多段，均匀分布在整个表中
+MAX_INDEX_COLUMNS = 6  # 覆盖索引最多包含的列数
+
+_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*'|[xX]'[0-9a-fA-F]*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+  | (?P<param>\?\d*|[:@$]\w+)
+  | (?P<op><=|>=|==|!=|<>|\|\||<<|>>|[-+*/%<>=(),.;~&|])
+""", re.VERBOSE | re.DOTALL)
+
+_KEYWORDS = frozenset("""
+    ALL AND AS ASC BETWEEN BY CASE CAST COLLATE CROSS DELETE DESC DISTINCT ELSE END ESCAPE EXCEPT EXISTS
+    FILTER FIRST FROM FULL GLOB GROUP HAVING IN INDEXED INNER INSERT INTERSECT INTO IS JOIN LAST LEFT LIKE
+    LIMIT MATCH NATURAL NOT NOTNULL NULL NULLS OFFSET ON OR ORDER OUTER OVER PARTITION RECURSIVE REGEXP
+    RETURNING RIGHT SELECT SET THEN UNION UPDATE USING VALUES WHEN WHERE WINDOW WITH
+""".split())
+
+# 决定其后的列属于哪个子句的关键字
+_CLAUSES = ("SELECT", "FROM", "WHERE", "ON", "GROUP", "ORDER", "HAVING", "LIMIT", "SET", "VALUES", "RETURNING")
+_EQUALITY_OPS = ("=", "==", "IS", "IN")
+_RANGE_OPS = ("<", ">", "<=", ">=", "BETWEEN")
+_SEARCH_STEP = re.compile(r"^SEARCH (\S+) USING (?:COVERING )?INDEX (\S+) \((.*)\)$")
+
+
+class IndexAdvisorCancelled(Exception):
+    """索引分析或计时被用户取消"""
+
+
+class _Token(namedtuple('_Token', 'kind text')):
+    @property
+    def upper(self):
+        return self.text.upper() if self.kind == "word" else self.text
+
+    @property
+    def is_identifier(self):
+        return self.kind == "quoted" or (self.kind == "word" and self.text.upper() not in _KEYWORDS)
+
+    @property
+    def name(self):
+        # 去掉标识符的引号
+        if self.kind == "quoted":
+            if self.text[0] == '"':
+                return self.text[1:-1].replace('""', '"')
+            return self.text[1:-1]
+        return self.text
+
+
+def tokenize(sql):
+    """把 SQL 切分为记号，去掉注释；只用于找出语句中的表和列，不检查语法"""
+    return [_Token(match.lastgroup, match.group()) for match in _TOKEN.finditer(sql)
+            if match.lastgroup != "comment"]
+
+
+class _ColumnUsage:
+    # 语句中一个表引用的各列的用法
+    def __init__(self):
+        self.equality = []  # WHERE / ON 中的等值条件 (=, IS, IN)
+        self.range = []  # 范围条件 (<, >, BETWEEN)
+        self.order = []  # ORDER BY 或 GROUP BY 的列（全部是该表的列时才有意义）
+        self.columns = set()  # 语句中引用的该表的所有列
+        self.star = False  # SELECT * 或 alias.*
+
+
+class StatementColumns:
+    """
+    从一条语句中找出引用的表（含别名）和各表的列在 WHERE / ON / ORDER BY / GROUP BY 中的用法
+    只做记号级别的分析：子查询和 CTE 中的列也按所在的子句归类，结果只作为候选索引，最终由查询计划验证
+    table_columns(schema, table) 返回表的列名列表，不存在时返回 None
+    """
+
+    def __init__(self, sql, table_columns):
+        self.tokens = tokenize(sql)
+        self.refs = []
+        self.usage = {}
+        self.sorted_by = None  # ORDER BY / GROUP BY 的列都属于同一个表时为该表的别名
+        self.is_select = bool(self.tokens) and self.tokens[0].upper in ("SELECT", "WITH", "VALUES")
+        self._table_columns = table_columns
+        self._columns = {}
+        consumed = self._find_tables()
+        self._find_columns(consumed)
+
+    def _clauses(self):
+        # 逐个返回 (位置, 记号, 当前子句)；子句按括号层次分别记录
+        stack = [None]
+        for i, token in enumerate(self.tokens):
+            if token.text == "(":
+                stack.append(None)
+            elif token.text == ")":
+                if len(stack) > 1:
+                    stack.pop()
+            elif token.upper in _CLAUSES:
+                stack[-1] = token.upper
+            elif token.upper in ("JOIN", "UPDATE") or (token.upper == "INTO" and stack[-1] is None):
+                stack[-1] = "FROM"
+            yield i, token, stack[-1]
+
+    def _find_tables(self):
+        consumed = set()
+        tokens = self.tokens
+        for i, token, clause in self._clauses():
+            starts_ref = token.upper in ("FROM", "JOIN", "UPDATE", "INTO") or (token.text == "," and clause == "FROM")
+            if not starts_ref or i + 1 >= len(tokens) or not tokens[i + 1].is_identifier:
+                continue
+            j = i + 1
+            schema, table = None, tokens[j].name
+            if j + 2 < len(tokens) and tokens[j + 1].text == "." and tokens[j + 2].is_identifier:
+                schema, table = table, tokens[j + 2].name
+                j += 2
+            if j + 1 < len(tokens) and tokens[j + 1].text == "(":
+                continue  # 表值函数
+            consumed.update(range(i + 1, j + 1))
+            alias = table
+            if j + 2 < len(tokens) and tokens[j + 1].upper == "AS" and tokens[j + 2].is_identifier:
+                alias = tokens[j + 2].name
+                consumed.update((j + 1, j + 2))
+            elif j + 1 < len(tokens) and tokens[j + 1].is_identifier:
+                alias = tokens[j + 1].name
+                consumed.add(j + 1)
+            columns = self._table_columns(schema, table)
+            if columns is None:
+                continue  # CTE、视图以外不存在的表
+            ref = TableRef(alias, schema, table)
+            self.refs.append(ref)
+            self.usage[ref.alias.lower()] = _ColumnUsage()
+            self._columns[ref.alias.lower()] = {name.lower(): name for name in columns}
+        return consumed
+
+    def _resolve(self, qualifier, name):
+        # 返回列所属的表引用的别名和列的原名
+        lower = name.lower()
+        if qualifier is not None:
+            qualifier = qualifier.lower()
+            for ref in self.refs:
+                if qualifier in (ref.alias.lower(), ref.table.lower()):
+                    columns = self._columns[ref.alias.lower()]
+                    if lower in columns:
+                        return ref.alias.lower(), columns[lower]
+                    if is_rowid_key((name,)):
+                        return ref.alias.lower(), name
+            return None, None
+        for ref in self.refs:
+            columns = self._columns[ref.alias.lower()]
+            if lower in columns:
+                return ref.alias.lower(), columns[lower]
+        if is_rowid_key((name,)) and len(self.refs) == 1:
+            return self.refs[0].alias.lower(), name
+        return None, None
+
+    def _find_columns(self, consumed):
+        tokens = self.tokens
+        skip_until = -1
+        order_terms = []
+        order_complex = False
+        for i, token, clause in self._clauses():
+            if i <= skip_until or i in consumed:
+                continue
+            prev = tokens[i - 1] if i > 0 else None
+            if token.text == "*" and clause == "SELECT" and prev is not None and (
+                    prev.upper in ("SELECT", "DISTINCT", "ALL") or prev.text == ","):
+                for usage in self.usage.values():
+                    usage.star = True
+                continue
+            if not token.is_identifier or (prev is not None and prev.upper == "AS"):
+                continue
+            qualifier, name, end = None, token.name, i
+            if i + 2 < len(tokens) and tokens[i + 1].text == ".":
+                if tokens[i + 2].text == "*":
+                    usage = self.usage.get(token.name.lower())
+                    if usage is not None:
+                        usage.star = True
+                    skip_until = i + 2
+                    continue
+                if tokens[i + 2].is_identifier:
+                    qualifier, name, end = token.name, tokens[i + 2].name, i + 2
+                    if end + 2 < len(tokens) and tokens[end + 1].text == "." and tokens[end + 2].is_identifier:
+                        qualifier, name, end = name, tokens[end + 2].name, end + 2  # 库名.表名.列名
+            skip_until = end
+            if end + 1 < len(tokens) and tokens[end + 1].text == "(":
+                continue  # 函数名
+            alias, column = self._resolve(qualifier, name)
+            following = tokens[end + 1] if end + 1 < len(tokens) else None
+            if clause in ("ORDER", "GROUP"):
+                if prev is not None and (prev.upper == "BY" or prev.text == ",") and (
+                        following is None or following.text in (",", ")", ";")
+                        or following.upper in ("ASC", "DESC", "NULLS", "COLLATE", "LIMIT", "HAVING",
+                                               "ORDER", "WINDOW")):
+                    order_terms.append((alias, column))
+                else:
+                    order_complex = True
+            if alias is None:
+                continue
+            usage = self.usage[alias]
+            usage.columns.add(column)
+            if clause in ("WHERE", "ON"):
+                after = following.upper if following is not None else None
+                if after == "IS" and end + 2 < len(tokens) and tokens[end + 2].upper == "NOT":
+                    after = None
+                if after in _EQUALITY_OPS or (prev is not None and prev.upper in ("=", "==", "IS")):
+                    usage.equality.append(column)
+                elif after in _RANGE_OPS or (prev is not None and prev.text in ("<", ">", "<=", ">=")):
+                    usage.range.append(column)
+        owners = {alias for alias, _ in order_terms}
+        if order_terms and not order_complex and len(owners) == 1 and None not in owners:
+            self.sorted_by = owners.pop()
+            self.usage[self.sorted_by].order = [column for _, column in order_terms]
+
+    def ref(self, name):
+        """按查询计划中的名字（别名、表名或 库名.表名）找到表引用"""
+        lower = name.lower()
+        for ref in self.refs:
+            if lower in (ref.alias.lower(), f"{ref.schema or ''}.{ref.table}".lower()):
+                return ref
+        for ref in self.refs:
+            if lower.rsplit(".", 1)[-1] == ref.table.lower():
+                return ref
+        return None
+
+    def candidate(self, ref, all_columns, rowid_column=None):
+        """
+        返回为表引用建议的 (索引列, 是否覆盖)，没有可用的列时返回 None
+        等值条件的列在前，其后是第一个范围条件的列，没有范围条件时是排序列；
+        语句不是 SELECT * 并且引用的列不多时，再把其余引用的列加到末尾，得到覆盖索引
+        """
+        usage = self.usage[ref.alias.lower()]
+
+        def useful(column):
+            return not is_rowid_key((column,)) and column != rowid_column
+
+        if rowid_column is not None and rowid_column in usage.equality:
+            return None  # 已经可以按 rowid 定位
+        equality = [column for column in dict.fromkeys(usage.equality) if useful(column)]
+        ranges = [column for column in usage.range if useful(column) and column not in equality][:1]
+        order = [column for column in usage.order if column not in equality]
+        if order and not all(useful(column) for column in order[:-1]):
+            order = []
+        tail = ranges or [column for column in order if useful(column)]
+        columns = list(dict.fromkeys(equality + tail))
+        if not columns:
+            return None
+        if not self.is_select or usage.star:
+            return columns, False
+        extra = sorted(column for column in usage.columns if useful(column) and column not in columns)
+        width = len([column for column in all_columns if useful(column)])
+        if len(columns) + len(extra) > min(MAX_INDEX_COLUMNS, max(2, width // 2)):
+            return columns, not extra
+        return columns + extra, True
+
+
+class _WhatIfDatabase:
+    """
+    只有结构和统计信息、没有数据的内存数据库（与 .expert 的做法相同）：
+    复制工作区中各库的表、索引、视图和 sqlite_stat1，在事务中创建候选索引并写入它的统计，
+    用 EXPLAIN QUERY PLAN 查看查询规划器是否会使用它，之后回滚
+    """
+
+    def __init__(self, conn):
+        self.conn = sqlite3.connect("file::memory:", uri=True, isolation_level=None, check_same_thread=False)
+        self._attached = []  # 附加的内存库的连接，保持它们存在
+        for seq, name, _ in conn.execute("PRAGMA database_list").fetchall():
+            if name == "temp":
+                continue
+            if name == "main":
+                target = self.conn
+            else:
+                uri = f"file:whatif-{id(self)}-{seq}?mode=memory&cache=shared"
+                target = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+                self._attached.append(target)
+            self._copy_schema(conn, schema_prefix(name), target)
+            if target is not self.conn:
+                self.conn.execute(f"ATTACH DATABASE ? AS {quote_identifier(name)}", (uri,))
+
+    @staticmethod
+    def _copy_schema(conn, prefix, target):
+        rows = conn.execute(
+            f"SELECT type, name, tbl_name, sql FROM {prefix}sqlite_master "
+            "WHERE sql IS NOT NULL AND type IN ('table', 'index', 'view') AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type <> 'table', rowid").fetchall()
+        for _, _, _, sql in rows:
+            try:
+                target.execute(sql)
+            except sqlite3.Error:
+                pass  # 虚拟表的影子表等已由虚拟表自动创建
+        target.execute("ANALYZE")  # 创建 sqlite_stat1
+        target.execute("DELETE FROM sqlite_stat1")
+        if conn.execute(f"SELECT 1 FROM {prefix}sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            target.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)",
+                               conn.execute(f"SELECT tbl, idx, stat FROM {prefix}sqlite_stat1"))
+        target.execute("ANALYZE sqlite_master")  # 重新加载统计信息
+
+    def close(self):
+        self.conn.close()
+        for conn in self._attached:
+            conn.close()
+
+    def plans_with_index(self, schema, table, columns, stats, statements):
+        """在假设存在索引（统计为 stats）的情况下返回各语句的查询计划，无法分析的语句为 None"""
+        prefix = schema_prefix(schema)
+        name = "whatif_" + "_".join([table] + list(columns))
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute(f"CREATE INDEX {prefix}{quote_identifier(name)} ON {quote_identifier(table)} "
+                              f"({', '.join(quote_identifier(column) for column in columns)})")
+            self.conn.execute(f"INSERT INTO {prefix}sqlite_stat1 VALUES (?, ?, ?)",
+                              (table, name, " ".join(str(value) for value in stats)))
+            if self.conn.execute(f"SELECT 1 FROM {prefix}sqlite_stat1 WHERE tbl = ? AND idx IS NULL",
+                                 (table,)).fetchone() is None:
+                self.conn.execute(f"INSERT INTO {prefix}sqlite_stat1 VALUES (?, NULL, ?)", (table, str(stats[0])))
+            self.conn.execute(f"ANALYZE {prefix}sqlite_master")
+            plans = []
+            for statement in statements:
+                try:
+                    plans.append([row[3] for row in self.conn.execute(
+                        f"EXPLAIN QUERY PLAN {statement.sql}", statement.params)])
+                except sqlite3.Error:
+                    plans.append(None)
+            return name, plans
+        finally:
+            self.conn.execute("ROLLBACK")
+
+
+def _sample_rows(conn, schema, table, columns):
+    """
+    抽样读取表中的 SAMPLE_ROWS 行：rowid 表在 rowid 范围内均匀取 SAMPLE_BLOCKS 段连续的行，
+    避免只取开头的行时受插入顺序的影响；WITHOUT ROWID 表只取开头的行
+    """
+    select = (f"SELECT {', '.join(quote_identifier(column) for column in columns)} "
+              f"FROM {schema_prefix(schema)}{quote_identifier(table)}")
+    try:
+        low, high = conn.execute(f"SELECT min(rowid), max(rowid) FROM {schema_prefix(schema)}"
+                                 f"{quote_identifier(table)}").fetchone()
+    except sqlite3.OperationalError:
+        low = high = None  # WITHOUT ROWID 表
+    if low is None or high - low + 1 <= SAMPLE_ROWS:
+        return conn.execute(f"{select} LIMIT {SAMPLE_ROWS}").fetchall()
+    step = (high - low + 1) / SAMPLE_BLOCKS
+    rows = []
+    for block in range(SAMPLE_BLOCKS):
+        rows.extend(conn.execute(f"{select} WHERE rowid >= ? ORDER BY rowid LIMIT ?",
+                                 (low + int(block * step), SAMPLE_ROWS // SAMPLE_BLOCKS)))
+    return rows
+
+
+def _index_stats(conn, schema, table, columns, row_count):
+    """
+    按 sqlite_stat1 的格式估计候选索引的统计："总行数 前1列每个值的平均行数 前2列... "
+    不同值的个数按抽样用 Haas-Stokes 的 Duj1 估计：D = n·d / (n - f1 + f1·n / N)，
+    其中 n 为样本行数，d 为样本中不同值的个数，f1 为样本中只出现一次的值的个数，N 为总行数
+    """
+    sample = _sample_rows(conn, schema, table, columns)
+    total = max(row_count, len(sample), 1)
+    stats = [total]
+    for k in range(1, len(columns) + 1):
+        counts = Counter(row[:k] for row in sample)
+        n, d = len(sample), len(counts)
+        if not n:
+            stats.append(1)
+            continue
+        f1 = sum(1 for count in counts.values() if count == 1)
+        distinct = n * d / (n - f1 + f1 * n / total)
+        stats.append(max(1, round(total / distinct)))
+    return stats
+
+
+def _row_count(conn, schema, table):
+    # sqlite_stat1 中有统计时直接使用，否则 COUNT(*)
+    prefix = schema_prefix(schema)
+    if conn.execute(f"SELECT 1 FROM {prefix}sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        row = conn.execute(f"SELECT stat FROM {prefix}sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+        if row is not None and row[0]:
+            try:
+                return int(row[0].split()[0])
+            except ValueError:
+                pass
+    return conn.execute(f"SELECT count(*) FROM {prefix}{quote_identifier(table)}").fetchone()[0]
+
+
+def _estimated_rows(plan, ref_name, index_name, stats):
+    # 按 SEARCH 步骤中使用的等值/范围条件估计读取的行数；范围条件按 SQLite 的默认估计取四分之一
+    for detail in plan:
+        match = _SEARCH_STEP.match(detail)
+        if match and match.group(2) == index_name and match.group(1).rsplit(".", 1)[-1].lower() == ref_name.lower():
+            terms = match.group(3).split(" AND ")
+            equality = sum(1 for term in terms if term.endswith("=?") and not term.endswith(("<=?", ">=?")))
+            rows = stats[min(equality, len(stats) - 1)]
+            if any(op in term for term in terms for op in ("<", ">")):
+                rows = max(1, rows // 4)
+            return rows
+    return None
+
+
+def _scan_names(plan):
+    # 查询计划中全表扫描的表（别名或 库名.表名）
+    return [detail.split()[1] for detail in plan if detail.startswith("SCAN ") and is_full_scan_step(detail)]
+
+
+def suggest_indexes(conn, statements, progress=None, should_cancel=None):
+    """
+    分析记录的语句 (LoggedStatement 列表)，返回按估计收益排序的 IndexSuggestion 列表
+    对每条语句执行 EXPLAIN QUERY PLAN，为全表扫描或需要临时排序的表生成候选索引，
+    再在只有结构和统计信息的内存数据库中验证查询规划器确实会使用它
+    conn 为只读连接；progress(已分析, 总数) 报告进度，should_cancel() 返回 True 时抛出 IndexAdvisorCancelled
+    """
+    def cancelled():
+        return should_cancel is not None and should_cancel()
+
+    steps = StepCounter(should_cancel=should_cancel)
+    steps.attach(conn)
+    databases = [name for _, name, _ in conn.execute("PRAGMA database_list") if name != "temp"]
+    table_columns = {}
+
+    def columns_of(schema, table):
+        # 没有写库名时按 SQLite 的查找顺序（主库、附加的库）
+        for name in ([schema] if schema else databases):
+            key = (name.lower(), table.lower())
+            if key not in table_columns:
+                try:
+                    info = conn.execute(f"PRAGMA {schema_prefix(name)}table_info({quote_identifier(table)})").fetchall()
+                except sqlite3.Error:
+                    info = []
+                table_columns[key] = (name, [row[1] for row in info],
+                                      next((row[1] for row in info if row[5] == 1 and row[2].upper() == "INTEGER"
+                                            and sum(r[5] > 0 for r in info) == 1), None)) if info else None
+            if table_columns[key] is not None:
+                return table_columns[key]
+        return None
+
+    whatif = None
+    candidates = {}  # (库, 表, 列) -> [覆盖, 语句列表, 之前的计划列表]
+    try:
+        for done, statement in enumerate(statements):
+            if cancelled():
+                raise IndexAdvisorCancelled()
+            if progress is not None:
+                progress(done, len(statements))
+            try:
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement.sql}", statement.params)]
+            except sqlite3.Error:
+                continue  # 表已不存在、参数不匹配等
+            scanned = _scan_names(plan)
+            sorts = any(detail.startswith("USE TEMP B-TREE") for detail in plan)
+            if not scanned and not sorts:
+                continue
+            parsed = StatementColumns(statement.sql, lambda schema, table: (columns_of(schema, table) or (None, None))[1])
+            refs = [parsed.ref(name) for name in scanned]
+            if sorts and parsed.sorted_by is not None:
+                refs.append(parsed.ref(parsed.sorted_by))
+            for ref in dict.fromkeys(ref for ref in refs if ref is not None):
+                schema, all_columns, rowid_column = columns_of(ref.schema, ref.table)
+                proposal = parsed.candidate(ref, all_columns, rowid_column)
+                if proposal is None:
+                    continue
+                columns, covering = proposal
+                entry = candidates.setdefault((schema, ref.table, tuple(columns)), [covering, [], [], []])
+                entry[1].append(statement)
+                entry[2].append(plan)
+                entry[3].append(ref)
+
+        suggestions = []
+        row_counts = {}
+        for (schema, table, columns), (covering, benefiting, plans, refs) in candidates.items():
+            if cancelled():
+                raise IndexAdvisorCancelled()
+            if whatif is None:
+                whatif = _WhatIfDatabase(conn)
+            if (schema, table) not in row_counts:
+                row_counts[schema, table] = _row_count(conn, schema, table)
+            stats = _index_stats(conn, schema, table, columns, row_counts[schema, table])
+            index_name, new_plans = whatif.plans_with_index(schema, table, columns, stats, benefiting)
+            accepted = []
+            for statement, plan, new_plan, ref in zip(benefiting, plans, new_plans, refs):
+                if new_plan is None or not any(index_name in detail for detail in new_plan):
+                    continue
+                before = [detail for detail in plan if is_full_scan_step(detail)]
+                after = [detail for detail in new_plan if is_full_scan_step(detail)]
+                if len(after) < len(before):
+                    accepted.append((statement, plan, new_plan, ref))
+            if not accepted:
+                continue
+            statement, plan, new_plan, ref = accepted[0]
+            rows_before = stats[0] if any(name.lower() in (ref.alias.lower(), f"{schema}.{table}".lower())
+                                          for name in _scan_names(plan)) else None
+            removes_sort = (any(detail.startswith("USE TEMP B-TREE") for detail in plan) and
+                            not any(detail.startswith("USE TEMP B-TREE") for detail in new_plan))
+            name = "idx_" + "_".join([table] + list(columns))
+            create_sql = (f"CREATE INDEX IF NOT EXISTS {schema_prefix(schema)}{quote_identifier(name)} "
+                          f"ON {quote_identifier(table)} ({', '.join(quote_identifier(c) for c in columns)})")
+            suggestions.append(IndexSuggestion(
+                schema, table, columns, covering, create_sql, [item[0] for item in accepted],
+                sum(item[0].count for item in accepted), rows_before,
+                _estimated_rows(new_plan, ref.alias, index_name, stats), removes_sort,
+                plan, [detail.replace(index_name, name) for detail in new_plan]))
+    finally:
+        if whatif is not None:
+            whatif.close()
+        conn.set_progress_handler(None, 0)
+
+    # 列是另一条建议的前缀时，较长的索引同样能用于这些语句，合并为一条
+    merged = []
+    for suggestion in sorted(suggestions, key=lambda s: len(s.columns), reverse=True):
+        wider = next((i for i, other in enumerate(merged)
+                      if (other.schema, other.table) == (suggestion.schema, suggestion.table)
+                      and other.columns[:len(suggestion.columns)] == suggestion.columns), None)
+        if wider is None:
+            merged.append(suggestion)
+            continue
+        other = merged[wider]
+        merged[wider] = other._replace(statements=other.statements + suggestion.statements,
+                                       executions=other.executions + suggestion.executions)
+
+    def saving(suggestion):
+        before = suggestion.rows_before or 0
+        after = suggestion.rows_after if suggestion.rows_after is not None else 0
+        return suggestion.executions * max(before - after, 0), suggestion.executions
+    return sorted(merged, key=saving, reverse=True)
+
+
+def time_statement(conn, sql, params=(), repeat=3, should_cancel=None):
+    """
+    执行只读语句 repeat 次并读取全部结果，返回最短的耗时（秒）；不是只读语句时返回 None
+    should_cancel() 返回 True 时中止并抛出 IndexAdvisorCancelled
+    """
+    if not is_read_only_query(sql):
+        return None
+    steps = StepCounter(should_cancel=should_cancel)
+    steps.attach(conn)
+    best = None
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor = conn.execute(sql, params)
+            while cursor.fetchmany(1000):
+                pass
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    except sqlite3.OperationalError as e:
+        if should_cancel is not None and should_cancel():
+            raise IndexAdvisorCancelled() from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    return best
+
+
+def create_suggested_index(conn, suggestion, should_cancel=None):
+    """
+    在写连接上创建建议的索引并立即生效（自动提交），返回用时（秒）
+    conn 上有未提交的修改时抛出 OperationalError：索引会留在事务中，其他连接看不到它
+    """
+    if conn.in_transaction:
+        raise sqlite3.OperationalError("请先保存或回滚未提交的修改，再创建索引")
+    steps = StepCounter(should_cancel=should_cancel)
+    steps.attach(conn)
+    start = time.perf_counter()
+    try:
+        conn.execute(suggestion.create_sql)
+    except sqlite3.OperationalError as e:
+        if should_cancel is not None and should_cancel():
+            raise IndexAdvisorCancelled() from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    return time.perf_counter() - start
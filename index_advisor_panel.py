@@ -0,0 +1,203 @@
+from datetime import datetime
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QPlainTextEdit, QSplitter, QAbstractItemView)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from query_worker import IndexAdvisorWorker, IndexApplyWorker
+
+
+class IndexAdvisorPanel(QWidget):
+    """
+    索引建议面板：分析应用执行过的查询（WorkloadLog），列出能消除全表扫描或临时排序的索引，
+    一键创建所选的索引，并对比受益语句在创建前后的耗时
+    before_apply() 返回 False 时不创建（如还有未保存的修改）
+    """
+
+    indexCreated = pyqtSignal(str)  # 创建索引的语句
+
+    def __init__(self, workload, before_apply=None, parent=None):
+        super().__init__(parent)
+        self.workload = workload
+        self.before_apply = before_apply
+        self.db = None
+        self.worker = None
+        self.suggestions = []
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        button_layout = QHBoxLayout()
+        self.status_label = QLabel()
+        self.analyze_button = QPushButton("分析")
+        self.analyze_button.clicked.connect(self.analyze)
+        self.apply_button = QPushButton("创建所选索引")
+        self.apply_button.clicked.connect(self.apply_selected)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel)
+        clear_button = QPushButton("清空记录")
+        clear_button.clicked.connect(self.clear_workload)
+        button_layout.addWidget(self.status_label, stretch=1)
+        button_layout.addWidget(self.analyze_button)
+        button_layout.addWidget(self.apply_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(clear_button)
+        layout.addLayout(button_layout)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.suggestion_table = QTableWidget(0, 6)
+        self.suggestion_table.setHorizontalHeaderLabels(
+            ["表", "索引列", "覆盖索引", "执行次数", "估计读取行数", "消除排序"])
+        self.suggestion_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.suggestion_table.verticalHeader().hide()
+        self.suggestion_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.suggestion_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.suggestion_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.suggestion_table.itemSelectionChanged.connect(self.show_details)
+        self.details = QPlainTextEdit()
+        self.details.setReadOnly(True)
+        self.timing_table = QTableWidget(0, 4)
+        self.timing_table.setHorizontalHeaderLabels(["语句", "创建前 (ms)", "创建后 (ms)", "加速"])
+        self.timing_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.timing_table.verticalHeader().hide()
+        self.timing_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        splitter.addWidget(self.suggestion_table)
+        splitter.addWidget(self.details)
+        splitter.addWidget(self.timing_table)
+        layout.addWidget(splitter)
+
+        # 记录来自多个线程，定时刷新记录的语句数
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(1000)
+        self.status_timer.timeout.connect(self.update_controls)
+        self.status_timer.start()
+        self.update_controls()
+
+    def set_database(self, db):
+        """设置分析和创建索引使用的工作区（主库的 DBConnector），None 表示已关闭"""
+        if db is self.db:
+            return
+        self.stop()
+        self.db = db
+        self.suggestions = []
+        self.suggestion_table.setRowCount(0)
+        self.details.clear()
+        self.update_controls()
+
+    def update_controls(self):
+        running = self.worker is not None
+        if not running:
+            self.status_label.setText(f"已记录 {len(self.workload)} 类语句")
+        self.analyze_button.setEnabled(self.db is not None and not running and len(self.workload) > 0)
+        self.apply_button.setEnabled(self.db is not None and not running and not self.db.read_only
+                                     and self.selected() is not None)
+        self.cancel_button.setEnabled(running)
+
+    def selected(self):
+        rows = self.suggestion_table.selectionModel().selectedRows()
+        if not rows or rows[0].row() >= len(self.suggestions):
+            return None
+        return self.suggestions[rows[0].row()]
+
+    def analyze(self):
+        if self.db is None or self.worker is not None:
+            return
+        worker = IndexAdvisorWorker(self.db, self.workload.statements(), parent=self)
+        worker.progress.connect(lambda done, total: self.status_label.setText(f"正在分析 {done} / {total}..."))
+        worker.finished_ok.connect(self.on_analyzed)
+        worker.cancelled.connect(lambda: self.status_label.setText("已取消"))
+        worker.failed.connect(lambda message: self.details.setPlainText(f"分析失败: {message}"))
+        worker.finished.connect(self.on_worker_done)
+        self.start_worker(worker)
+
+    def on_analyzed(self, suggestions, elapsed):
+        self.suggestions = suggestions
+        self.suggestion_table.setRowCount(len(suggestions))
+        for row, suggestion in enumerate(suggestions):
+            rows = "" if suggestion.rows_before is None else f"{suggestion.rows_before}"
+            if suggestion.rows_after is not None:
+                rows += f" → {suggestion.rows_after}"
+            table = suggestion.table if suggestion.schema == "main" else f"{suggestion.schema}.{suggestion.table}"
+            values = [table, ", ".join(suggestion.columns), "是" if suggestion.covering else "",
+                      str(suggestion.executions), rows, "是" if suggestion.removes_sort else ""]
+            for column, value in enumerate(values):
+                self.suggestion_table.setItem(row, column, QTableWidgetItem(value))
+        self.details.setPlainText(f"分析完成，用时 {elapsed:.2f} 秒，" +
+                                  (f"共 {len(suggestions)} 条建议" if suggestions else "没有需要建立的索引"))
+        if suggestions:
+            self.suggestion_table.selectRow(0)
+
+    def show_details(self):
+        suggestion = self.selected()
+        self.update_controls()
+        if suggestion is None:
+            return
+        lines = [suggestion.create_sql + ";", "", "创建前的查询计划:"]
+        lines += [f"  {detail}" for detail in suggestion.plan_before]
+        lines += ["创建后的查询计划（按统计信息估计）:"]
+        lines += [f"  {detail}" for detail in suggestion.plan_after]
+        lines += ["", f"受益的语句（{len(suggestion.statements)} 类）:"]
+        lines += [f"  [{statement.count} 次] {statement.sql}" for statement in suggestion.statements]
+        self.details.setPlainText("\n".join(lines))
+
+    def apply_selected(self):
+        suggestion = self.selected()
+        if self.db is None or self.worker is not None or suggestion is None:
+            return
+        if self.before_apply is not None and not self.before_apply():
+            return
+        worker = IndexApplyWorker(self.db, suggestion, parent=self)
+        worker.progress.connect(self.status_label.setText)
+        worker.created.connect(lambda elapsed: self.on_created(suggestion, elapsed))
+        worker.finished_ok.connect(self.on_timed)
+        worker.cancelled.connect(lambda: self.details.appendPlainText(f"{datetime.now():%H:%M:%S} 已取消"))
+        worker.failed.connect(lambda message: self.details.appendPlainText(f"创建索引失败: {message}"))
+        worker.finished.connect(self.on_worker_done)
+        self.timing_table.setRowCount(0)
+        self.start_worker(worker)
+
+    def on_created(self, suggestion, elapsed):
+        if suggestion in self.suggestions:
+            row = self.suggestions.index(suggestion)
+            del self.suggestions[row]
+            self.suggestion_table.removeRow(row)
+        self.details.appendPlainText(f"{datetime.now():%H:%M:%S} 已创建索引，用时 {elapsed:.2f} 秒")
+        self.indexCreated.emit(suggestion.create_sql)
+
+    def on_timed(self, timings):
+        self.timing_table.setRowCount(len(timings))
+        for row, (statement, before, after) in enumerate(timings):
+            if before is None or after is None:
+                values = [statement.sql, "", "", "不是只读语句，未计时"]
+            else:
+                speedup = f"{before / after:.1f}x" if after > 0 else ""
+                values = [statement.sql, f"{before * 1000:.2f}", f"{after * 1000:.2f}", speedup]
+            for column, value in enumerate(values):
+                self.timing_table.setItem(row, column, QTableWidgetItem(value))
+
+    def start_worker(self, worker):
+        self.worker = worker
+        self.update_controls()
+        worker.start()
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText("正在取消...")
+
+    def stop(self):
+        """取消并等待正在执行的分析或创建结束"""
+        worker = self.worker
+        if worker is None:
+            return
+        worker.blockSignals(True)
+        worker.cancel()
+        worker.wait()
+        self.on_worker_done()
+
+    def on_worker_done(self):
+        if self.worker is not None:
+            self.worker.deleteLater()
+            self.worker = None
+        self.update_controls()
+
+    def clear_workload(self):
+        self.workload.clear()
+        self.update_controls()
@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from db_connector import format_size, quote_identifier, schema_prefix
+from profiler import StepCounter
+
+# 数据库文件的统计：大小为字节，fragmentation 为 B 树中与前一页不相邻的页所占的比例（无法统计时为 None）
+FileStats = namedtuple('FileStats', 'file_size wal_size page_size page_count freelist_count fragmentation auto_vacuum')
+
+_AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+# 维护操作: 名字 -> (说明, 是否需要写连接)
+MAINTENANCE_TASKS = {
+    "analyze": ("ANALYZE：完整更新 sqlite_stat1，改善查询计划", True),
+    "optimize": ("PRAGMA optimize：只重新分析统计信息可能已过时的表", True),
+    "vacuum": ("VACUUM：重建数据库文件，回收空闲页并消除碎片", True),
+    "vacuum_incremental": ("VACUUM 并启用增量自动清理 (auto_vacuum = INCREMENTAL)", True),
+    "incremental_vacuum": ("PRAGMA incremental_vacuum：归还空闲页（需要已启用增量自动清理）", True),
+    "wal_checkpoint": ("PRAGMA wal_checkpoint(TRUNCATE)：把 WAL 写回数据库文件并截断", True),
+    "quick_check": ("PRAGMA quick_check：快速检查（不检查索引内容）", False),
+    "integrity_check": ("PRAGMA integrity_check：完整检查数据库", False),
+}
+
+
+class MaintenanceCancelled(Exception):
+    """维护操作被用户取消"""
+
+
+class MaintenanceProgress(StepCounter):
+    """
+    维护操作的进度：作为 SQLite 的进度回调统计虚拟机步数，
+    每隔 report_interval 秒调用一次 report(已完成, 总数, 已用秒数)，should_cancel() 返回 True 时中止语句
+    总数未知时（按虚拟机步数报告）为 0
+    """
+
+    def __init__(self, report=None, should_cancel=None, interval=10000, report_interval=0.2):
+        super().__init__(interval, should_cancel)
+        self.report = report
+        self.report_interval = report_interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def __call__(self):
+        self._report(self.steps, 0)
+        return super().__call__()
+
+    def advance(self, done, total):
+        """按已知的工作量报告进度（不经过 SQLite 的回调），返回是否应取消"""
+        self._report(done, total)
+        return self.should_cancel is not None and self.should_cancel()
+
+    def _report(self, done, total):
+        if self.report is not None:
+            now = time.perf_counter()
+            if now - self._last_report >= self.report_interval:
+                self._last_report = now
+                self.report(done, total, now - self.started)
+
+
+def file_stats(conn, db_path, schema_name="main", progress=None):
+    """
+    读取数据库文件的大小、页数、空闲页数和碎片率
+    碎片率通过 dbstat 虚拟表按 B 树的逻辑顺序遍历所有页得到（大文件上需要读取整个文件），
+    SQLite 编译时没有启用 dbstat 时为 None；progress 为 MaintenanceProgress，用于报告进度和取消
+    """
+    prefix = schema_prefix(schema_name)
+    page_size = conn.execute(f"PRAGMA {prefix}page_size").fetchone()[0]
+    page_count = conn.execute(f"PRAGMA {prefix}page_count").fetchone()[0]
+    freelist_count = conn.execute(f"PRAGMA {prefix}freelist_count").fetchone()[0]
+    auto_vacuum = _AUTO_VACUUM_MODES.get(conn.execute(f"PRAGMA {prefix}auto_vacuum").fetchone()[0], "?")
+    file_size = os.path.getsize(db_path) if os.path.exists(db_path) else page_size * page_count
+    wal_path = db_path + "-wal"
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+    fragmentation = None
+    if progress is not None:
+        progress.attach(conn)
+    try:
+        # dbstat 按路径顺序返回每个 B 树的页：下一页不是紧挨着的页时读取需要跳转
+        cursor = conn.execute("SELECT name, pageno FROM dbstat WHERE schema = ?", (schema_name,))
+        previous_name = previous_page = None
+        scattered = total = 0
+        for name, page in cursor:
+            if name == previous_name and page != previous_page + 1:
+                scattered += 1
+            previous_name, previous_page = name, page
+            total += 1
+        fragmentation = scattered / total if total else 0.0
+    except sqlite3.OperationalError as e:
+        if progress is not None and progress.should_cancel is not None and progress.should_cancel():
+            raise MaintenanceCancelled() from e
+        # 没有 dbstat 虚拟表
+    finally:
+        if progress is not None:
+            conn.set_progress_handler(None, 0)
+    return FileStats(file_size, wal_size, page_size, page_count, freelist_count, fragmentation, auto_vacuum)
+
+
+def describe_stats(before, after=None):
+    """把维护前后的统计转换为 (项目, 执行前, 执行后, 变化) 行，用于界面和命令行输出"""
+    def size(value):
+        return format_size(value)
+
+    def percent(value):
+        return "未知" if value is None else f"{value * 100:.1f}%"
+
+    def free_ratio(stats):
+        return stats.freelist_count / stats.page_count if stats.page_count else 0.0
+
+    items = [
+        ("文件大小", lambda s: s.file_size, size),
+        ("WAL 大小", lambda s: s.wal_size, size),
+        ("页大小", lambda s: s.page_size, size),
+        ("页数", lambda s: s.page_count, str),
+        ("空闲页", lambda s: s.freelist_count, str),
+        ("空闲页比例", free_ratio, percent),
+        ("碎片率", lambda s: s.fragmentation, percent),
+        ("自动清理", lambda s: s.auto_vacuum, str),
+    ]
+    rows = []
+    for title, getter, fmt in items:
+        old = getter(before)
+        if after is None:
+            rows.append((title, fmt(old), "", ""))
+            continue
+        new = getter(after)
+        change = ""
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old != new:
+            delta = new - old
+            if fmt is size:
+                change = ("+" if delta > 0 else "-") + format_size(abs(delta))
+            elif fmt is percent:
+                change = f"{delta * 100:+.1f}%" if abs(delta) >= 0.0005 else ""
+            else:
+                change = f"{delta:+d}"
+        elif old != new:
+            change = "已改变"
+        rows.append((title, fmt(old), fmt(new), change))
+    return rows
+
+
+def maintenance_statements(task, schema_name="main", pages=0):
+    """返回执行维护操作的语句；pages 为 incremental_vacuum 最多归还的页数，0 表示全部"""
+    prefix = schema_prefix(schema_name)
+    schema = quote_identifier(schema_name)  # 不带库名的 ANALYZE 会分析所有附加的数据库
+    if task == "analyze":
+        return ["PRAGMA analysis_limit = 0", f"ANALYZE {schema}"]
+    if task == "optimize":
+        return [f"PRAGMA {prefix}optimize"]
+    if task == "vacuum":
+        return [f"VACUUM {schema}"]
+    if task == "vacuum_incremental":
+        # 修改 auto_vacuum 要在 VACUUM 重建文件后才生效
+        return [f"PRAGMA {prefix}auto_vacuum = INCREMENTAL", f"VACUUM {schema}"]
+    if task == "incremental_vacuum":
+        return [f"PRAGMA {prefix}incremental_vacuum({int(pages)})" if pages else f"PRAGMA {prefix}incremental_vacuum"]
+    if task == "wal_checkpoint":
+        return [f"PRAGMA {prefix}wal_checkpoint(TRUNCATE)"]
+    if task in ("quick_check", "integrity_check"):
+        return [f"PRAGMA {prefix}{task}"]
+    raise ValueError(f"未知的维护操作: {task}")
+
+
+def run_maintenance(conn, task, schema_name="main", pages=0, progress=None):
+    """
+    在 conn 上执行维护操作，返回输出的消息列表（检查操作的结果，其他操作为空）
+    语句在自动提交模式下执行，完成即生效；VACUUM 等不能在事务中执行，conn 上有未提交的修改时抛出 OperationalError；
+    progress 为 MaintenanceProgress，取消时语句被中止（修改全部回滚）并抛出 MaintenanceCancelled
+    """
+    if MAINTENANCE_TASKS[task][1] and conn.in_transaction:
+        raise sqlite3.OperationalError("请先保存或回滚未提交的修改，再执行维护操作")
+    if task == "incremental_vacuum":
+        return _incremental_vacuum(conn, schema_name, pages, progress)
+    messages = []
+    if progress is not None:
+        progress.attach(conn)
+    try:
+        for sql in maintenance_statements(task, schema_name, pages):
+            for row in conn.execute(sql):
+                if task in ("quick_check", "integrity_check"):
+                    messages.append(row[0])
+                elif task == "wal_checkpoint":
+                    busy, log_pages, _ = row
+                    if log_pages < 0:
+                        messages.append("数据库不在 WAL 模式")
+                    elif busy:
+                        messages.append("有其他连接正在读取，WAL 未能完全写回和截断")
+                    else:
+                        messages.append("WAL 已写回数据库文件并截断")
+    except sqlite3.OperationalError as e:
+        if progress is not None and progress.should_cancel is not None and progress.should_cancel():
+            raise MaintenanceCancelled() from e
+        raise
+    finally:
+        if progress is not None:
+            conn.set_progress_handler(None, 0)
+    return messages
+
+
+def _incremental_vacuum(conn, schema_name, pages, progress):
+    # Python 的 sqlite3 对不返回列的语句只执行一步，每次 PRAGMA incremental_vacuum 只能归还一页，
+    # 因此在一个事务中逐页执行（每页只需几十微秒），总页数已知，可以报告准确的进度
+    prefix = schema_prefix(schema_name)
+    if conn.execute(f"PRAGMA {prefix}auto_vacuum").fetchone()[0] != 2:
+        return ["没有启用增量自动清理 (auto_vacuum = INCREMENTAL)，请先执行“VACUUM 并启用增量自动清理”"]
+    free_pages = conn.execute(f"PRAGMA {prefix}freelist_count").fetchone()[0]
+    total = min(free_pages, pages) if pages else free_pages
+    conn.execute("BEGIN")
+    try:
+        for done in range(total):
+            if progress is not None and progress.advance(done, total):
+                raise MaintenanceCancelled()
+            conn.execute(f"PRAGMA {prefix}incremental_vacuum(1)")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return [f"已归还 {total} 个空闲页"]
@@ -0,0 +1,190 @@
+import os
+from datetime import datetime
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton, QSpinBox,
+                             QProgressBar, QTableWidget, QTableWidgetItem, QHeaderView, QPlainTextEdit,
+                             QSplitter)
+from PyQt5.QtCore import Qt, pyqtSignal
+from maintenance import MAINTENANCE_TASKS, describe_stats
+from query_worker import MaintenanceWorker
+
+
+class MaintenancePanel(QWidget):
+    """
+    数据库维护面板：在后台线程中执行 ANALYZE、VACUUM、PRAGMA optimize、incremental_vacuum 和完整性检查，
+    显示进度（SQLite 进度回调报告的虚拟机步数）并可以取消，完成后对比执行前后的文件统计
+    before_start(task) 返回 False 时不执行（如还有未保存的修改）
+    """
+
+    maintenanceFinished = pyqtSignal(str)  # 操作名，数据库内容或统计信息可能已变化
+
+    def __init__(self, before_start=None, parent=None):
+        super().__init__(parent)
+        self.before_start = before_start
+        self.db = None
+        self.worker = None
+        self._before = None
+        self._next_db = None  # 操作执行期间切换的数据库，完成后再切换过去
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.database_label = QLabel("没有打开的数据库")
+        layout.addWidget(self.database_label)
+
+        task_layout = QHBoxLayout()
+        self.task_combo = QComboBox()
+        for task, (description, _) in MAINTENANCE_TASKS.items():
+            self.task_combo.addItem(description, task)
+        self.task_combo.currentIndexChanged.connect(self.update_controls)
+        self.pages_spin = QSpinBox()
+        self.pages_spin.setRange(0, 1 << 30)
+        self.pages_spin.setSpecialValueText("全部")
+        self.pages_spin.setSuffix(" 页")
+        self.pages_spin.setToolTip("incremental_vacuum 最多归还的空闲页数")
+        self.run_button = QPushButton("执行")
+        self.run_button.clicked.connect(self.start)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel)
+        stats_button = QPushButton("刷新统计")
+        stats_button.clicked.connect(lambda: self.start(stats_only=True))
+        self.stats_button = stats_button
+        task_layout.addWidget(self.task_combo, stretch=1)
+        task_layout.addWidget(self.pages_spin)
+        task_layout.addWidget(self.run_button)
+        task_layout.addWidget(self.cancel_button)
+        task_layout.addWidget(stats_button)
+        layout.addLayout(task_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        self.progress_label = QLabel()
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.stats_table = QTableWidget(0, 4)
+        self.stats_table.setHorizontalHeaderLabels(["项目", "执行前", "执行后", "变化"])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.stats_table.verticalHeader().hide()
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.log = QPlainTextEdit()
+        self.log.setReadOnly(True)
+        splitter.addWidget(self.stats_table)
+        splitter.addWidget(self.log)
+        layout.addWidget(splitter)
+        self.update_controls()
+
+    def set_database(self, db):
+        """
+        切换到另一个数据库；正在执行的操作继续针对原来的数据库，完成后再切换
+        db 为 None 表示数据库已关闭（或将被分离），正在执行的操作会被取消
+        """
+        if db is not None and self.worker is not None:
+            self._next_db = db
+            return
+        self._next_db = None
+        if db is self.db:
+            return
+        self.stop()
+        self.db = db
+        self._before = None
+        self.stats_table.setRowCount(0)
+        if db is None:
+            self.database_label.setText("没有打开的数据库")
+        else:
+            self.database_label.setText(f"{db.schema_name}: {os.path.basename(db.db_path)}")
+        self.update_controls()
+
+    def update_controls(self, *args):
+        running = self.worker is not None
+        # 只读打开的数据库只能执行检查
+        writes = MAINTENANCE_TASKS[self.task_combo.currentData()][1]
+        self.run_button.setEnabled(self.db is not None and not running and not (writes and self.db.read_only))
+        self.stats_button.setEnabled(self.db is not None and not running)
+        self.cancel_button.setEnabled(running)
+        self.task_combo.setEnabled(not running)
+        self.pages_spin.setEnabled(not running and self.task_combo.currentData() == "incremental_vacuum")
+
+    def start(self, stats_only=False):
+        if self.db is None or self.worker is not None:
+            return
+        task = self.task_combo.currentData()
+        if not stats_only and self.before_start is not None and not self.before_start(task):
+            return
+        worker = MaintenanceWorker(self.db, None if stats_only else task, self.pages_spin.value(), parent=self)
+        worker.statsReady.connect(self.on_stats_ready)
+        worker.progress.connect(self.on_progress)
+        worker.finished_ok.connect(self.on_finished)
+        worker.cancelled.connect(lambda: self.append_log(
+            "已取消，未完成的修改已回滚" if MAINTENANCE_TASKS[task][1] else "已取消"))
+        worker.failed.connect(lambda message: self.append_log(f"失败: {message}"))
+        worker.finished.connect(self.on_worker_done)
+        self.worker = worker
+        self._before = None
+        self.progress_bar.setRange(0, 0)  # 总量未知时显示忙碌状态
+        self.progress_label.setText("正在统计文件..." if stats_only else "正在执行...")
+        if not stats_only:
+            self.append_log(f"开始: {self.task_combo.currentText()}")
+        self.update_controls()
+        worker.start()
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.progress_label.setText("正在取消...")
+
+    def stop(self):
+        """取消并等待正在执行的操作结束"""
+        worker = self.worker
+        if worker is None:
+            return
+        for signal in (worker.statsReady, worker.progress, worker.finished_ok, worker.cancelled,
+                       worker.failed, worker.finished):
+            signal.disconnect()
+        worker.cancel()
+        worker.wait()
+        self.on_worker_done()
+
+    def on_stats_ready(self, phase, stats):
+        if phase == "before":
+            self._before = stats
+            rows = describe_stats(stats)
+        else:
+            rows = describe_stats(self._before, stats)
+        self.stats_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.stats_table.setItem(row, column, QTableWidgetItem(value))
+
+    def on_progress(self, done, total, elapsed):
+        if total:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+            self.progress_label.setText(f"{done} / {total}，用时 {elapsed:.1f} 秒")
+        else:
+            self.progress_label.setText(f"已执行 {done} 步，用时 {elapsed:.1f} 秒")
+
+    def on_finished(self, messages, elapsed):
+        worker = self.sender()
+        if worker.task is None:
+            return
+        for message in messages[:100]:
+            self.append_log(f"  {message}")
+        if len(messages) > 100:
+            self.append_log(f"  ……共 {len(messages)} 条")
+        self.append_log(f"完成，用时 {elapsed:.2f} 秒")
+        self.maintenanceFinished.emit(worker.task)
+
+    def on_worker_done(self):
+        if self.worker is not None:
+            self.worker.deleteLater()
+            self.worker = None
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        self.progress_label.clear()
+        self.update_controls()
+        if self._next_db is not None:
+            self.set_database(self._next_db)
+
+    def append_log(self, text):
+        self.log.appendPlainText(f"{datetime.now():%H:%M:%S} {text}")
@@ -0,0 +1,39 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QFormLayout, QLineEdit, QLabel, QDialogButtonBox
+from saved_queries import parameter_value
+
+
+class ParameterDialog(QDialog):
+    """
+    执行带命名参数的查询前填写参数值；previous 为 {参数名: 上次输入的文本}，作为默认值
+    值按 saved_queries.parameter_value() 转换后以参数绑定，不拼接到 SQL 中
+    """
+
+    def __init__(self, names, previous=None, title="查询参数", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        previous = previous or {}
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.inputs = {}
+        for name in names:
+            edit = QLineEdit(previous.get(name, ""))
+            self.inputs[name] = edit
+            form.addRow(f":{name}", edit)
+        layout.addLayout(form)
+
+        note = QLabel("NULL 表示空值，数字按数值绑定，用单引号括起来的按原样作为文本（如 '007'）")
+        note.setWordWrap(True)
+        layout.addWidget(note)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def texts(self):
+        """{参数名: 输入的文本}"""
+        return {name: edit.text() for name, edit in self.inputs.items()}
+
+    def values(self):
+        """{参数名: 绑定值}，可以直接作为 sqlite3 的命名参数"""
+        return {name: parameter_value(text) for name, text in self.texts().items()}
@@ -0,0 +1,206 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, deque, namedtuple
+from db_connector import is_full_scan_step
+from result_cache import normalize_sql
+
+# 一次查询执行的性能数据
+QueryProfile = namedtuple('QueryProfile', 'sql timestamp wall_time first_row_time vm_steps '
+                                          'rows_returned rows_scanned plan')
+# 工作负载中的一类语句：最近一次执行的语句和参数（用于 EXPLAIN 和计时）、执行次数、最近执行时间
+LoggedStatement = namedtuple('LoggedStatement', 'sql params count last_time')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|x'[0-9a-fA-F]*'")
+_SCAN_TABLE = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+
+def statement_shape(sql):
+    """把字面量替换为 ?，用于把只有参数不同的语句归为一类（发现 N+1 查询）"""
+    return _LITERALS.sub("?", normalize_sql(sql))
+
+
+def estimate_rows_scanned(plan, row_counts):
+    """
+    估算查询扫描的行数：计划中每个全表扫描步骤按该表的行数计
+    Python 的 sqlite3 模块无法读取 sqlite3_stmt_scanstatus，只能这样估算；未知行数的表不计入
+    """
+    total = 0
+    known = False
+    for _, _, detail in plan:
+        if not is_full_scan_step(detail):
+            continue
+        match = _SCAN_TABLE.match(detail)
+        if match and match.group(1) in row_counts:
+            total += row_counts[match.group(1)]
+            known = True
+    return total if known else None
+
+
+class StepCounter:
+    """
+    作为 set_progress_handler 的回调，统计虚拟机执行的指令数
+    SQLite 每执行 interval 条指令调用一次回调，因此步数 = 调用次数 * interval（精度为 interval）
+    should_cancel() 返回 True 时让 SQLite 中止当前语句
+    """
+
+    def __init__(self, interval=1000, should_cancel=None):
+        self.interval = interval
+        self.calls = 0
+        self.should_cancel = should_cancel
+
+    def __call__(self):
+        self.calls += 1
+        if self.should_cancel is not None and self.should_cancel():
+            return 1
+        return 0
+
+    @property
+    def steps(self):
+        return self.calls * self.interval
+
+    def attach(self, conn):
+        conn.set_progress_handler(self, self.interval)
+
+
+class ProfileHistory:
+    """按语句保存最近几次执行的性能数据，便于比较建索引前后的差异"""
+
+    def __init__(self, max_statements=200, runs_per_statement=20):
+        self.max_statements = max_statements
+        self.runs_per_statement = runs_per_statement
+        self._runs = OrderedDict()
+
+    def add(self, profile):
+        key = normalize_sql(profile.sql)
+        runs = self._runs.pop(key, None)
+        if runs is None:
+            runs = deque(maxlen=self.runs_per_statement)
+        runs.append(profile)
+        self._runs[key] = runs
+        while len(self._runs) > self.max_statements:
+            self._runs.popitem(last=False)
+
+    def runs(self, sql):
+        return list(self._runs.get(normalize_sql(sql), ()))
+
+
+class WorkloadLog:
+    """
+    记录应用通过 DBConnector 执行的查询（SQL 框中的语句、表格的分页查询），作为索引建议的输入
+    与 StatementTracer 不同，这里保存绑定参数，并按语句形状归类计数；可以在多个线程中记录
+    """
+
+    def __init__(self, max_statements=500):
+        self.max_statements = max_statements
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, sql, params=()):
+        key = statement_shape(sql)
+        with self._lock:
+            entry = self._statements.pop(key, None)
+            count = entry.count + 1 if entry is not None else 1
+            params = dict(params) if isinstance(params, dict) else tuple(params)
+            self._statements[key] = LoggedStatement(sql, params, count, time.time())
+            while len(self._statements) > self.max_statements:
+                self._statements.popitem(last=False)
+
+    def statements(self):
+        """按最近执行的顺序返回所有 LoggedStatement"""
+        with self._lock:
+            return list(reversed(self._statements.values()))
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class _ConnectionTrace:
+    """
+    一个连接上的跟踪回调，每次回调都原样记录；同时统计语句的编译次数：
+    SQLite 只在编译语句时调用授权回调，两次跟踪回调之间调用过授权回调的执行算作一次编译
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.compiled = False
+
+    def authorize(self, *args):
+        self.compiled = True
+        return sqlite3.SQLITE_OK
+
+    def trace(self, sql):
+        compiled, self.compiled = self.compiled, False
+        self.tracer.count_execution(compiled)
+        self.tracer.record(sql)
+
+
+class StatementTracer:
+    """
+    通过 set_trace_callback 记录应用自身执行的每一条语句
+    可以挂到多个连接上（包括后台线程的连接），记录保存在有上限的队列中；
+    同时统计跟踪回调和编译的次数（不受 enabled 影响），用来估计语句缓存 (cached_statements) 的效果
+    """
+
+    def __init__(self, max_entries=5000):
+        self.entries = deque(maxlen=max_entries)  # (时间, 线程名, 语句)
+        self.recorded = 0  # 累计记录的条数，用于增量读取
+        self.enabled = True
+        self.executions = 0
+        self.compiles = 0
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        trace = _ConnectionTrace(self)
+        conn.set_authorizer(trace.authorize)
+        conn.set_trace_callback(trace.trace)
+
+    def count_execution(self, compiled):
+        with self._lock:
+            self.executions += 1
+            self.compiles += compiled
+
+    def cache_stats(self):
+        """
+        返回 (执行次数, 编译次数)，都是估计值：执行次数为跟踪回调的次数，
+        触发器中的语句会以外层语句的文本再回调一次，因此带触发器的修改会多算；
+        没有编译的执行大致就是复用了缓存的语句
+        """
+        with self._lock:
+            return self.executions, self.compiles
+
+    def record(self, sql):
+        if self.enabled:
+            entry = (time.time(), threading.current_thread().name, sql)
+            with self._lock:
+                self.entries.append(entry)
+                self.recorded += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.recorded = 0
+            self.executions = 0
+            self.compiles = 0
+
+    def entries_since(self, recorded):
+        """返回 (当前累计条数, recorded 之后新增且仍在队列中的记录)"""
+        with self._lock:
+            new_count = min(self.recorded - recorded, len(self.entries))
+            if new_count <= 0:
+                return self.recorded, []
+            return self.recorded, list(self.entries)[-new_count:]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.entries)
+
+    def repeated_statements(self, min_count=2):
+        """按语句形状统计执行次数，次数多的通常就是 N+1 查询"""
+        counts = Counter(statement_shape(sql) for _, _, sql in self.snapshot())
+        return [(shape, count) for shape, count in counts.most_common() if count >= min_count]
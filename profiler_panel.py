@@ -0,0 +1,152 @@
+from datetime import datetime
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTabWidget, QTreeWidget, QTreeWidgetItem,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QLabel, QPlainTextEdit,
+                             QPushButton, QSplitter, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
+from db_connector import is_full_scan_step
+
+
+class ProfilerPanel(QWidget):
+    """
+    查询性能分析面板
+    显示最近一次查询的 EXPLAIN QUERY PLAN 树和各项耗时、同一语句的历史执行记录，
+    以及应用自身执行的所有语句的跟踪日志和语句缓存的命中率
+    """
+
+    def __init__(self, history, tracer, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.tracer = tracer
+        self.current_sql = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        tabs = QTabWidget()
+        layout.addWidget(tabs)
+
+        # 查询计划和指标
+        plan_widget = QWidget()
+        plan_layout = QVBoxLayout(plan_widget)
+        self.metrics_label = QLabel("执行查询后在此显示性能数据")
+        self.metrics_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.plan_tree = QTreeWidget()
+        self.plan_tree.setHeaderLabel("EXPLAIN QUERY PLAN")
+        plan_layout.addWidget(self.metrics_label)
+        plan_layout.addWidget(self.plan_tree)
+        tabs.addTab(plan_widget, "查询计划")
+
+        # 同一语句的历史执行记录
+        self.history_table = QTableWidget(0, 6)
+        self.history_table.setHorizontalHeaderLabels(["时间", "总耗时 (ms)", "首行 (ms)", "VM 步数", "返回行数", "估计扫描行数"])
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.history_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        tabs.addTab(self.history_table, "历史")
+
+        # 语句跟踪
+        trace_widget = QWidget()
+        trace_layout = QVBoxLayout(trace_widget)
+        trace_buttons = QHBoxLayout()
+        self.trace_enabled = QCheckBox("记录语句")
+        self.trace_enabled.setChecked(tracer.enabled)
+        self.trace_enabled.toggled.connect(self.set_trace_enabled)
+        clear_button = QPushButton("清空")
+        clear_button.clicked.connect(self.clear_trace)
+        # 语句缓存 (cached_statements) 的命中情况，按跟踪回调和授权回调估计
+        self.cache_label = QLabel()
+        self.cache_label.setToolTip("执行次数按跟踪回调计，触发器中的语句会以外层语句再回调一次，带触发器的修改会多算")
+        trace_buttons.addWidget(self.trace_enabled)
+        trace_buttons.addWidget(self.cache_label)
+        trace_buttons.addStretch()
+        trace_buttons.addWidget(clear_button)
+        trace_splitter = QSplitter(Qt.Vertical)
+        self.trace_log = QPlainTextEdit()
+        self.trace_log.setReadOnly(True)
+        self.trace_log.setMaximumBlockCount(tracer.entries.maxlen or 5000)
+        self.repeated_table = QTableWidget(0, 2)
+        self.repeated_table.setHorizontalHeaderLabels(["语句形状", "次数"])
+        self.repeated_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.repeated_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        trace_splitter.addWidget(self.trace_log)
+        trace_splitter.addWidget(self.repeated_table)
+        trace_layout.addLayout(trace_buttons)
+        trace_layout.addWidget(trace_splitter)
+        tabs.addTab(trace_widget, "语句跟踪")
+
+        # 跟踪记录来自多个线程，定时刷新而不是逐条更新界面
+        self._shown_entries = 0
+        self.trace_timer = QTimer(self)
+        self.trace_timer.setInterval(1000)
+        self.trace_timer.timeout.connect(self.refresh_trace)
+        self.trace_timer.start()
+
+    def show_profile(self, profile):
+        """显示一次查询的性能数据，并记入历史"""
+        self.history.add(profile)
+        self.current_sql = profile.sql
+
+        scanned = "未知" if profile.rows_scanned is None else f"{profile.rows_scanned}"
+        self.metrics_label.setText(
+            f"总耗时 {profile.wall_time * 1000:.1f} ms    首行 {profile.first_row_time * 1000:.1f} ms    "
+            f"VM 步数 ≈{profile.vm_steps}    返回 {profile.rows_returned} 行    估计扫描 {scanned} 行")
+
+        self.plan_tree.clear()
+        items = {}
+        for node_id, parent_id, detail in profile.plan:
+            parent = items.get(parent_id, self.plan_tree)
+            item = QTreeWidgetItem(parent)
+            item.setText(0, detail)
+            if is_full_scan_step(detail):
+                item.setForeground(0, Qt.red)
+            items[node_id] = item
+        self.plan_tree.expandAll()
+        self.refresh_history()
+
+    def refresh_history(self):
+        runs = self.history.runs(self.current_sql) if self.current_sql else []
+        self.history_table.setRowCount(len(runs))
+        for row, run in enumerate(reversed(runs)):
+            values = [datetime.fromtimestamp(run.timestamp).strftime("%H:%M:%S"),
+                      f"{run.wall_time * 1000:.1f}", f"{run.first_row_time * 1000:.1f}",
+                      str(run.vm_steps), str(run.rows_returned),
+                      "" if run.rows_scanned is None else str(run.rows_scanned)]
+            for col, value in enumerate(values):
+                self.history_table.setItem(row, col, QTableWidgetItem(value))
+
+    def refresh_trace(self):
+        if not self.isVisible():
+            return
+        self.refresh_cache_stats()
+        if self.tracer.recorded < self._shown_entries:
+            self._shown_entries = 0  # 跟踪记录已被清空
+            self.trace_log.clear()
+        self._shown_entries, new_entries = self.tracer.entries_since(self._shown_entries)
+        if not new_entries:
+            return
+        self.trace_log.appendPlainText("\n".join(
+            f"{datetime.fromtimestamp(ts).strftime('%H:%M:%S.%f')[:-3]} [{thread}] {sql}"
+            for ts, thread, sql in new_entries))
+
+        repeated = self.tracer.repeated_statements()
+        self.repeated_table.setRowCount(len(repeated))
+        for row, (shape, count) in enumerate(repeated):
+            self.repeated_table.setItem(row, 0, QTableWidgetItem(shape))
+            self.repeated_table.setItem(row, 1, QTableWidgetItem(str(count)))
+
+    def refresh_cache_stats(self):
+        executions, compiles = self.tracer.cache_stats()
+        if not executions:
+            self.cache_label.setText("语句缓存: 还没有执行语句")
+            return
+        reused = executions - compiles
+        self.cache_label.setText(f"语句缓存（估计）: 执行约 {executions} 次，编译 {compiles} 次，"
+                                 f"约 {reused * 100 / executions:.1f}% 复用缓存的语句")
+
+    def set_trace_enabled(self, enabled):
+        self.tracer.enabled = enabled
+
+    def clear_trace(self):
+        self.tracer.clear()
+        self._shown_entries = 0
+        self.trace_log.clear()
+        self.repeated_table.setRowCount(0)
+        self.refresh_cache_stats()
@@ -0,0 +1,503 @@
+import sqlite3
+import time
+from contextlib import nullcontext
+from PyQt5.QtCore import QThread, pyqtSignal
+from exporter import export_query, ExportCancelled
+from importer import import_file, ImportCancelled
+from index_advisor import IndexAdvisorCancelled, create_suggested_index, suggest_indexes, time_statement
+from maintenance import MAINTENANCE_TASKS, MaintenanceCancelled, MaintenanceProgress, file_stats, run_maintenance
+from profiler import QueryProfile, StepCounter, estimate_rows_scanned
+from result_cache import ChunkedResult, ColumnarResult
+from search_index import SearchCancelled, SearchIndex, sidecar_path
+from table_diff import DiffCancelled, PatchWriter, compare_tables
+
+
+class QueryWorker(QThread):
+    """
+    在后台线程中执行只读查询
+    使用从连接池借用的只读连接，结果按批在后台线程中转换为列式存储 (ColumnarResult)，通过信号流式发送回界面；
+    cancel() 通过 Connection.interrupt() 和进度回调中止正在执行的语句
+    执行完成后通过 profiled 信号发送查询计划、耗时、首行时间和虚拟机步数；
+    结果不超过 cache_rows 行时还把各批组成 ChunkedResult 通过 resultReady 发送，供结果缓存使用（与界面共用同一组块）
+    注意：独立连接只能看到已提交的数据
+    """
+
+    headersReady = pyqtSignal(list)
+    rowsReady = pyqtSignal(object)  # ColumnarResult
+    progress = pyqtSignal(int, float)  # 已读取行数, 已用时间（秒）
+    finished_ok = pyqtSignal(int, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal(int, float)
+    profiled = pyqtSignal(object)  # QueryProfile
+    resultReady = pyqtSignal(object)  # ChunkedResult
+
+    def __init__(self, db, query, params=(), batch_size=1000, row_counts=None, cache_rows=0, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.query = query
+        self.params = params
+        self.batch_size = batch_size
+        self.row_counts = dict(row_counts or {})  # 用于估算扫描行数
+        self.cache_rows = cache_rows
+        self.cache_version = None  # 开始执行前读取的 DBConnector.cache_version()
+        self.rows_fetched = 0
+        self._conn = None
+        self._cancel_requested = False
+
+    def cancel(self):
+        """请求中止查询（可在任意线程调用）"""
+        self._cancel_requested = True
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass  # 连接已关闭
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            with self.db.pool.reading() as conn:
+                self._conn = conn
+                try:
+                    self._execute(conn)
+                finally:
+                    self._conn = None
+        except sqlite3.OperationalError as e:
+            elapsed = time.perf_counter() - start
+            if self._cancel_requested:
+                self.cancelled.emit(self.rows_fetched, elapsed)
+            else:
+                self.failed.emit(str(e))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _execute(self, conn):
+        try:
+            plan = [(row[0], row[1], row[3]) for row in
+                    conn.execute(f"EXPLAIN QUERY PLAN {self.query}", self.params)]
+        except sqlite3.Error:
+            plan = []
+        # 进度回调统计虚拟机步数；返回非零值会让 SQLite 中止当前语句，作为 interrupt() 之外的保险
+        steps = StepCounter(should_cancel=lambda: self._cancel_requested)
+        steps.attach(conn)
+
+        self.db.record_statement(self.query, self.params)
+        start = time.perf_counter()
+        cursor = conn.execute(self.query, self.params)
+        first_row_time = None
+        headers = [description[0] for description in cursor.description or []]
+        self.headersReady.emit(headers)
+        cached = ChunkedResult(headers) if self.cache_rows else None
+        while not self._cancel_requested:
+            batch = cursor.fetchmany(self.batch_size)
+            if first_row_time is None:
+                first_row_time = time.perf_counter() - start
+            if not batch:
+                break
+            self.rows_fetched += len(batch)
+            chunk = ColumnarResult.from_rows(headers, batch)
+            if cached is not None:
+                cached.append(chunk)
+                if cached.row_count > self.cache_rows:
+                    cached = None  # 结果太大，不缓存
+            self.rowsReady.emit(chunk)
+            self.progress.emit(self.rows_fetched, time.perf_counter() - start)
+        cursor.close()
+
+        elapsed = time.perf_counter() - start
+        if self._cancel_requested:
+            self.cancelled.emit(self.rows_fetched, elapsed)
+        else:
+            self.profiled.emit(QueryProfile(
+                self.query, time.time(), elapsed, first_row_time or elapsed, steps.steps,
+                self.rows_fetched, estimate_rows_scanned(plan, self.row_counts), plan))
+            if cached is not None and headers:
+                self.resultReady.emit(cached)
+            self.finished_ok.emit(self.rows_fetched, elapsed)
+
+
+class RowCountWorker(QThread):
+    """
+    在后台线程中逐个统计表的行数，统计完一个表就发送一次结果
+    data_version 为开始统计前在界面线程读取的 DBConnector.data_version()，结果按它缓存
+    """
+
+    countReady = pyqtSignal(str, int)  # 表名, 行数
+
+    def __init__(self, db, table_names, data_version=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.table_names = list(table_names)
+        self.data_version = data_version
+        self._conn = None
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def run(self):
+        try:
+            with self.db.pool.reading() as conn:
+                self._conn = conn
+                try:
+                    for name in self.table_names:
+                        if self._cancel_requested:
+                            break
+                        try:
+                            count = conn.execute(f"SELECT COUNT(*) FROM {self.db.table_sql(name)}").fetchone()[0]
+                        except sqlite3.Error:
+                            continue  # 单个表统计失败（或被中止）不影响其他表
+                        self.countReady.emit(name, count)
+                finally:
+                    self._conn = None
+        except sqlite3.Error:
+            pass
+
+
+class ExportWorker(QThread):
+    """在后台线程中把表或查询结果流式导出到文件"""
+
+    totalKnown = pyqtSignal(int)  # 估计的总行数（仅导出整表时），实际行数超过估计时随进度增大
+    progress = pyqtSignal(int)  # 已写入行数
+    finished_ok = pyqtSignal(int, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, query, path, fmt, estimated_rows=None, parent=None):
+        """estimated_rows 为 DBConnector.estimate_row_count() 的估计值，只用于显示进度，不为此扫描表"""
+        super().__init__(parent)
+        self.db = db
+        self.query = query
+        self.path = path
+        self.fmt = fmt
+        self.estimated_rows = estimated_rows
+        self._conn = None
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def run(self):
+        start = time.perf_counter()
+        total = self.estimated_rows
+
+        def report(rows):
+            nonlocal total
+            if total is not None and rows > total:
+                total = rows * 2  # 估计偏小
+                self.totalKnown.emit(total)
+            self.progress.emit(rows)
+
+        try:
+            with self.db.pool.reading() as conn:
+                self._conn = conn
+                try:
+                    if total:
+                        self.totalKnown.emit(total)
+                    rows = export_query(conn, self.query, self.path, self.fmt, progress=report,
+                                        should_cancel=lambda: self._cancel_requested)
+                finally:
+                    self._conn = None
+            self.finished_ok.emit(rows, time.perf_counter() - start)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except sqlite3.OperationalError as e:
+            if self._cancel_requested:
+                self.cancelled.emit()
+            else:
+                self.failed.emit(str(e))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ImportWorker(QThread):
+    """在后台线程中通过共享的写连接把 CSV / JSON Lines 文件批量导入到表中"""
+
+    progress = pyqtSignal(int, float)  # 已导入行数, 每秒行数
+    finished_ok = pyqtSignal(int, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal(int)
+
+    def __init__(self, db, path, table_name, fmt=None, column_types=None, fast=False, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.path = path
+        self.table_name = table_name
+        self.fmt = fmt
+        self.column_types = column_types
+        self.fast = fast
+        self.rows_imported = 0
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def run(self):
+        def report(rows, rate):
+            self.rows_imported = rows
+            self.progress.emit(rows, rate)
+
+        try:
+            # 导入期间独占写连接，界面上的写操作会得到 WriterBusyError 而不是阻塞
+            with self.db.writing() as conn:
+                rows, elapsed = import_file(self.db.db_path, self.path, self.table_name, fmt=self.fmt,
+                                            column_types=self.column_types, fast=self.fast, progress=report,
+                                            should_cancel=lambda: self._cancel_requested, conn=conn)
+            self.finished_ok.emit(rows, elapsed)
+        except ImportCancelled:
+            self.cancelled.emit(self.rows_imported)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class MaintenanceWorker(QThread):
+    """
+    在后台线程中执行 ANALYZE、VACUUM、PRAGMA optimize、incremental_vacuum 或完整性检查，
+    执行前后各统计一次文件大小、空闲页和碎片率；task 为 None 时只统计
+    检查只读取数据库，在只读连接上执行；其他操作独占写连接，期间界面上的保存会得到 WriterBusyError，
+    表格浏览改用只读连接，因此界面不会被阻塞；取消时通过进度回调中止语句，修改全部回滚
+    """
+
+    statsReady = pyqtSignal(str, object)  # "before" 或 "after", FileStats
+    progress = pyqtSignal(int, int, float)  # 已完成, 总数（未知时为 0，按虚拟机步数报告）, 已用秒数
+    finished_ok = pyqtSignal(list, float)  # 输出的消息, 用时
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, task, pages=0, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.task = task
+        self.pages = pages
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def _progress(self):
+        return MaintenanceProgress(report=self.progress.emit, should_cancel=lambda: self._cancel_requested)
+
+    def _stats(self):
+        with self.db.pool.reading() as conn:
+            return file_stats(conn, self.db.db_path, self.db.schema_name, progress=self._progress())
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.statsReady.emit("before", self._stats())
+            if self.task is None:
+                self.finished_ok.emit([], time.perf_counter() - start)
+                return
+            if MAINTENANCE_TASKS[self.task][1]:
+                # 界面线程读取数据时会短暂持有写连接的锁，后台任务可以等待（最多 busy_timeout）
+                timeout = self.db.pool.settings.busy_timeout / 1000
+                with self.db.pool.writing(timeout=timeout) as conn:
+                    messages = run_maintenance(conn, self.task, self.db.schema_name, self.pages, self._progress())
+            else:
+                with self.db.pool.reading() as conn:
+                    messages = run_maintenance(conn, self.task, self.db.schema_name, self.pages, self._progress())
+            elapsed = time.perf_counter() - start
+            self.statsReady.emit("after", self._stats())
+            self.finished_ok.emit(messages, elapsed)
+        except MaintenanceCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class IndexAdvisorWorker(QThread):
+    """在后台线程中用只读连接分析记录的语句，给出索引建议（见 index_advisor.suggest_indexes）"""
+
+    progress = pyqtSignal(int, int)  # 已分析语句数, 总数
+    finished_ok = pyqtSignal(list, float)  # IndexSuggestion 列表, 用时
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, statements, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.statements = list(statements)
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            with self.db.pool.reading() as conn:
+                suggestions = suggest_indexes(conn, self.statements, progress=self.progress.emit,
+                                              should_cancel=lambda: self._cancel_requested)
+            self.finished_ok.emit(suggestions, time.perf_counter() - start)
+        except IndexAdvisorCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class IndexApplyWorker(QThread):
+    """
+    创建建议的索引，并在创建前后各计时一次受益的只读语句（在只读连接上执行，每条取 repeat 次中最快的一次）
+    创建索引时独占写连接，等待界面线程释放它（最多 busy_timeout）；在创建过程中取消时索引被回滚，
+    之后取消则索引保留，只是不再计时
+    """
+
+    progress = pyqtSignal(str)  # 当前步骤
+    created = pyqtSignal(float)  # 索引已创建, 用时
+    finished_ok = pyqtSignal(list)  # [(LoggedStatement, 创建前秒数, 创建后秒数)]，不是只读语句时秒数为 None
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, suggestion, repeat=3, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.suggestion = suggestion
+        self.repeat = repeat
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def _time_all(self):
+        with self.db.pool.reading() as conn:
+            return [time_statement(conn, statement.sql, statement.params, self.repeat,
+                                   should_cancel=lambda: self._cancel_requested)
+                    for statement in self.suggestion.statements]
+
+    def run(self):
+        statements = self.suggestion.statements
+        try:
+            self.progress.emit("正在计时创建索引前的语句...")
+            before = self._time_all()
+            self.progress.emit("正在创建索引...")
+            timeout = self.db.pool.settings.busy_timeout / 1000
+            with self.db.pool.writing(timeout=timeout) as conn:
+                elapsed = create_suggested_index(conn, self.suggestion,
+                                                 should_cancel=lambda: self._cancel_requested)
+            self.created.emit(elapsed)
+            self.progress.emit("正在计时创建索引后的语句...")
+            after = self._time_all()
+            self.finished_ok.emit(list(zip(statements, before, after)))
+        except IndexAdvisorCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class SearchIndexWorker(QThread):
+    """
+    在后台线程中用只读连接同步数据库的全局搜索索引（见 search_index.SearchIndex.sync），
+    tables 不为 None 时先修改要索引的表，changes 不为 None 时只同步其中的表和 rowid 所在的块；
+    索引文件使用 WAL，同步期间界面仍可搜索已提交的部分
+    """
+
+    progress = pyqtSignal(object)  # SyncProgress
+    finished_ok = pyqtSignal(int, float)  # 重建的块数, 用时
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, tables=None, changes=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.tables = tables
+        self.changes = changes
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def run(self):
+        start = time.perf_counter()
+        should_cancel = lambda: self._cancel_requested
+        try:
+            index = SearchIndex(sidecar_path(self.db.db_path))
+            try:
+                if self.tables is not None:
+                    index.set_tables(self.tables)
+                with self.db.pool.reading() as conn:
+                    # 大表按键排序可能需要较长时间，通过进度回调及时响应取消
+                    StepCounter(10000, should_cancel).attach(conn)
+                    try:
+                        rebuilt = index.sync(conn, self.db.schema_name, progress=self.progress.emit,
+                                             should_cancel=should_cancel, changes=self.changes)
+                    finally:
+                        conn.set_progress_handler(None, 0)
+            finally:
+                index.close()
+            self.finished_ok.emit(rebuilt, time.perf_counter() - start)
+        except SearchCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class TableDiffWorker(QThread):
+    """
+    在后台线程中比较工作区中的两个库（见 table_diff.TableDiff），可同时把补丁写入文件
+    两个库在同一个只读事务中读取，比较的是同一时刻的快照；每个表最多把 max_rows 行差异发送给界面，补丁中包含全部差异
+    """
+
+    progress = pyqtSignal(str, int, int)  # 表名, 已比较的旧库行数, 旧库总行数
+    tableDone = pyqtSignal(object, list, list, list)  # DiffSummary, 列名, 键列, DiffRow 列表（最多 max_rows 行）
+    finished_ok = pyqtSignal(float)  # 用时
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db, old_schema, new_schema, tables=None, patch_path=None, max_rows=100000, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.old_schema = old_schema
+        self.new_schema = new_schema
+        self.tables = tables
+        self.patch_path = patch_path
+        self.max_rows = max_rows
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def run(self):
+        start = time.perf_counter()
+        should_cancel = lambda: self._cancel_requested
+        try:
+            with self.db.pool.reading() as conn:
+                StepCounter(10000, should_cancel).attach(conn)
+                conn.execute("BEGIN")
+                try:
+                    diffs = compare_tables(conn, self.old_schema, self.new_schema, self.tables)
+                    with PatchWriter(self.patch_path) if self.patch_path else nullcontext() as patch:
+                        for diff in diffs:
+                            self._diff_table(diff, patch, should_cancel)
+                finally:
+                    conn.rollback()
+                    conn.set_progress_handler(None, 0)
+            self.finished_ok.emit(time.perf_counter() - start)
+        except DiffCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _diff_table(self, diff, patch, should_cancel):
+        if patch is not None:
+            patch.start_table(diff)
+        rows = []
+        for row in diff.rows(progress=lambda done, total: self.progress.emit(diff.table_name, done, total),
+                             should_cancel=should_cancel):
+            if patch is not None:
+                patch.write(diff, row)
+            if len(rows) < self.max_rows:
+                rows.append(row)
+        self.tableDone.emit(diff.summary(), diff.headers, list(diff.key_columns), rows)
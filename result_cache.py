@@ -0,0 +1,319 @@
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+_NONE_TYPE = type(None)
+
+# 每次执行结果可能不同的函数和日期时间写法：random()、randomblob()、changes() 等，
+# 'now' 日期修饰符、不带参数的 date() 等（默认为 'now'）、只有格式参数的 strftime()
+# 和 CURRENT_TIMESTAMP 等关键字；带引号的标识符和注释先整体匹配跳过
+_NON_DETERMINISTIC_TOKENS = re.compile(
+    r"'now'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)"
+    r"|\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)"
+    r"|\bstrftime\s*\(\s*(?:'(?:[^']|'')*'|[^,()'])*\)"
+    r"|\bcurrent_(?:date|time|timestamp)\b", re.S | re.I)
+
+
+def normalize_sql(sql):
+    """
+    规范化 SQL 作为缓存键：去掉注释和末尾的分号，字符串和带引号的标识符之外的连续空白合并为一个空格，
+    关键字等不区分大小写的部分统一为小写
+    """
+    result = []
+    i = 0
+    n = len(sql)
+    pending_space = False
+    while i < n:
+        ch = sql[i]
+        if ch in "'\"`[":
+            end_char = "]" if ch == "[" else ch
+            j = i + 1
+            while j < n:
+                if sql[j] == end_char:
+                    if end_char != "]" and j + 1 < n and sql[j + 1] == end_char:
+                        j += 2  # 转义的引号
+                        continue
+                    break
+                j += 1
+            token = sql[i:j + 1]
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j
+            pending_space = True
+            continue
+        elif sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        else:
+            j = i
+            while j + 1 < n and not sql[j + 1].isspace() and sql[j + 1] not in "'\"`[" \
+                    and not sql.startswith("--", j + 1) and not sql.startswith("/*", j + 1):
+                j += 1
+            token = sql[i:j + 1].lower()
+        if pending_space and result:
+            result.append(" ")
+        pending_space = False
+        result.append(token)
+        i = j + 1
+    return "".join(result).rstrip("; ")
+
+
+def is_cacheable_query(sql):
+    """
+    查询结果是否可以缓存：调用了 random()、changes() 等函数或使用 'now' 取当前时间的查询
+    在数据没有变化时结果也可能不同，不缓存
+    """
+    for match in _NON_DETERMINISTIC_TOKENS.finditer(sql):
+        token = match.group(0)
+        if token.lower() == "'now'" or token[0] not in "'\"`[-/":
+            return False
+    return True
+
+
+class TextColumn:
+    """
+    按偏移量存储的文本列：所有字符串连接为一个 str，第 i 行为 data[offsets[i]:offsets[i + 1]]
+    省去每个字符串对象约 50 字节的固定开销；读取时切片得到新的字符串
+    （连接后的字符串按其中最宽的字符存储，含中文时每个字符 2 字节）
+    """
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, values):
+        self.data = "".join(values)
+        self.offsets = array("q", [0])
+        self.offsets.extend(accumulate(map(len, values)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.data[self.offsets[row]:self.offsets[row + 1]]
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class DictionaryColumn:
+    """
+    字典编码的列：不同的值只保存一个对象，每行只存编号（array('B')、array('H') 或 array('I')）
+    用于重复值多的列（如状态、类别），NULL 也作为一个值编码
+    """
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values, index=None):
+        # 按 (类型, 值) 区分，避免 1、1.0 和 True 被合并为同一个值
+        index = index if index is not None else _value_index(values)
+        self.values = tuple(value for _, value in index)
+        typecode = "B" if len(index) <= 0x100 else "H" if len(index) <= 0x10000 else "I"
+        self.codes = array(typecode, (index[(type(value), value)] for value in values))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    @property
+    def nbytes(self):
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+def _value_index(values):
+    index = {}
+    for value in values:
+        index.setdefault((type(value), value), len(index))
+    return index
+
+
+class ColumnarResult:
+    """
+    按列存储的一组行（查询结果或表格的一页）
+    全是整数的列存为 array('q')，全是浮点数的列存为 array('d')，NULL 另用每行一个字节的标记记录；
+    全是文本的列在重复值多时字典编码 (DictionaryColumn)，否则按偏移量连接存储 (TextColumn)；
+    其他列（BLOB、被截断的大值、混合类型）存为元组，重复的字符串/字节串只保留一个对象
+    比逐行的元组列表占用的内存少得多；nbytes 为估计的内存占用，用于结果缓存的容量限制
+    """
+
+    __slots__ = ("headers", "columns", "nulls", "row_count", "nbytes")
+
+    def __init__(self, headers, columns, nulls, row_count, nbytes):
+        self.headers = list(headers)
+        self.columns = columns
+        self.nulls = nulls  # 每列的 NULL 标记 (bytearray，只用于数值列和按偏移量存储的文本列)，没有时为 None
+        self.row_count = row_count
+        self.nbytes = nbytes
+
+    @classmethod
+    def from_rows(cls, headers, rows):
+        columns = []
+        nulls = []
+        nbytes = 0
+        for values in (zip(*rows) if rows else [()] * len(headers)):
+            column, column_nulls, size = cls._pack_column(values)
+            columns.append(column)
+            nulls.append(column_nulls)
+            nbytes += size
+        return cls(headers, columns, nulls, len(rows), nbytes)
+
+    @staticmethod
+    def _pack_column(values):
+        value_types = set(map(type, values))
+        null_flags = None
+        null_size = 0
+        if _NONE_TYPE in value_types:
+            value_types.discard(_NONE_TYPE)
+            null_flags = bytearray(value is None for value in values)
+            null_size = sys.getsizeof(null_flags)
+        if value_types == {int} or value_types == {float}:
+            try:
+                packed = array("q" if int in value_types else "d",
+                               values if null_flags is None else (0 if value is None else value for value in values))
+                return packed, null_flags, packed.itemsize * len(packed) + null_size
+            except OverflowError:
+                pass  # 超出 64 位的整数
+
+        if values and value_types <= {str}:  # 文本列（包括全是 NULL 的列）
+            index = _value_index(values)
+            if len(index) * 2 <= len(values):
+                packed = DictionaryColumn(values, index)
+                return packed, None, packed.nbytes
+            packed = TextColumn(["" if value is None else value for value in values])
+            return packed, null_flags, packed.nbytes + null_size
+
+        # 其他列：相同的字符串/字节串共用一个对象
+        shared = {}
+        packed = tuple(shared.setdefault(value, value) if isinstance(value, (str, bytes)) else value
+                       for value in values)
+        size = sys.getsizeof(packed) + sum(sys.getsizeof(value) for value in shared.values())
+        size += sum(sys.getsizeof(value) for value in packed if isinstance(value, (int, float)))
+        return packed, None, size
+
+    def value(self, row, column):
+        column_nulls = self.nulls[column]
+        if column_nulls is not None and column_nulls[row]:
+            return None
+        return self.columns[column][row]
+
+    def row(self, row):
+        return tuple(self.value(row, column) for column in range(len(self.columns)))
+
+    def rows(self):
+        """逐行返回元组"""
+        for row in range(self.row_count):
+            yield self.row(row)
+
+
+class ChunkedResult:
+    """
+    由若干 ColumnarResult 块依次组成的结果：后台查询每读取一批行就在工作线程中转换为一块，
+    界面线程只追加块，按行号读取时二分查找所在的块
+    """
+
+    def __init__(self, headers, chunks=()):
+        self.headers = list(headers)
+        self.chunks = []
+        self._starts = []  # 各块第一行的行号
+        self.row_count = 0
+        self.nbytes = 0
+        for chunk in chunks:
+            self.append(chunk)
+
+    def append(self, chunk):
+        if not chunk.row_count:
+            return
+        self._starts.append(self.row_count)
+        self.chunks.append(chunk)
+        self.row_count += chunk.row_count
+        self.nbytes += chunk.nbytes
+
+    def value(self, row, column):
+        index = bisect_right(self._starts, row) - 1
+        return self.chunks[index].value(row - self._starts[index], column)
+
+    def rows(self):
+        """逐行返回元组"""
+        for chunk in self.chunks:
+            yield from chunk.rows()
+
+
+class ResultCache:
+    """
+    查询结果的 LRU 缓存，按规范化的 SQL 和参数查找
+    version 为调用方读取的数据版本（DBConnector.cache_version()）：版本变化时整个缓存失效，
+    总大小超过 max_bytes 或条目数超过 max_entries 时淘汰最久没有使用的结果
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=100):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self):
+        self._entries = OrderedDict()  # (规范化 SQL, 参数) -> ChunkedResult
+        self._version = None
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(sql, params=()):
+        # 命名参数 (:name) 以字典绑定，按名字排序后作为键的一部分；
+        # 值的类型也是键的一部分：1、1.0 和 True 相等，但 typeof(?) 等的结果不同
+        if isinstance(params, dict):
+            return normalize_sql(sql), tuple((name, type(value), value) for name, value in sorted(params.items()))
+        return normalize_sql(sql), tuple((type(value), value) for value in params)
+
+    def get(self, sql, params, version):
+        """返回缓存的 ChunkedResult，没有、已失效或查询不可缓存时返回 None"""
+        if not is_cacheable_query(sql):
+            return None
+        self._check_version(version)
+        key = self.key(sql, params)
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, sql, params, version, result):
+        """
+        缓存查询结果，version 应为当前的数据版本（调用方确认查询执行期间数据没有变化）
+        单个结果超过 max_bytes 或查询不可缓存（is_cacheable_query()）时不缓存，返回是否已缓存
+        """
+        if result.nbytes > self.max_bytes or not is_cacheable_query(sql):
+            return False
+        self._check_version(version)
+        key = self.key(sql, params)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._entries[key] = result
+        self.nbytes += result.nbytes
+        while self.nbytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return True
+
+    def _check_version(self, version):
+        if version != self._version:
+            self.clear()
+            self._version = version
@@ -0,0 +1,83 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+# 一条命名查询：SQL 中可以有 :name（或 @name、$name）形式的命名参数，执行前在对话框中填写
+SavedQuery = namedtuple('SavedQuery', 'name sql')
+
+# 字符串、带引号的标识符和注释中的 :name 不是参数，先整体匹配跳过
+_PARAMETER_TOKENS = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)"
+    r"|[:@$]([A-Za-z_][A-Za-z0-9_]*)", re.S)
+
+
+def saved_queries_path(db_path):
+    """数据库文件对应的命名查询文件"""
+    return db_path + ".queries.json"
+
+
+def query_parameters(sql):
+    """按出现顺序返回 SQL 中的命名参数名（不含前缀，同名参数只返回一次），与 sqlite3 按字典绑定时的键相同"""
+    names = []
+    for match in _PARAMETER_TOKENS.finditer(sql):
+        name = match.group(1)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def parameter_value(text):
+    """
+    把参数框中的文本转换为绑定值：NULL 为 None，整数和小数按数值绑定，
+    用单引号括起来的按原样作为文本（如 '007'），其余按文本绑定
+    """
+    stripped = text.strip()
+    if stripped.upper() == "NULL":
+        return None
+    if len(stripped) >= 2 and stripped[0] == stripped[-1] == "'":
+        return stripped[1:-1].replace("''", "'")
+    for convert in (int, float):
+        try:
+            return convert(stripped)
+        except ValueError:
+            pass
+    return text
+
+
+class SavedQueryStore:
+    """
+    保存在数据库文件旁 JSON 文件（data.db.queries.json）中的命名查询，不修改数据库文件本身
+    每次修改后整体写回（先写临时文件再替换），文件不存在时为空
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queries = {}  # 名字 -> SQL，按保存的顺序
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for entry in json.load(f).get("queries", []):
+                    self._queries[entry["name"]] = entry["sql"]
+
+    def names(self):
+        return list(self._queries)
+
+    def get(self, name):
+        sql = self._queries.get(name)
+        return None if sql is None else SavedQuery(name, sql)
+
+    def save(self, name, sql):
+        """保存（或覆盖）名为 name 的查询"""
+        self._queries[name] = sql
+        self._write()
+
+    def remove(self, name):
+        if self._queries.pop(name, None) is not None:
+            self._write()
+
+    def _write(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"queries": [{"name": name, "sql": sql} for name, sql in self._queries.items()]},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from db_connector import is_rowid_key, may_hold_large_values, quote_identifier, schema_prefix
+
+# 一条搜索结果：key 为行的键值列表（rowid 或主键各列），snippet 为匹配处前后的文本，匹配部分用【】标出
+SearchHit = namedtuple('SearchHit', 'table key column snippet')
+
+# 同步进度：当前表、已读取行数、已重建的块数
+SyncProgress = namedtuple('SyncProgress', 'table rows chunks')
+
+CHUNK_ROWS = 1000  # 每块的行数（rowid 表为 rowid 范围的宽度），按块比较摘要、按块重建
+MAX_INDEXED_CHARS = 4096  # 每个值只索引开头这么多字符
+COMMIT_CHUNKS = 50  # 每重建这么多块提交一次，搜索可以看到已建好的部分
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_tables (
+    name TEXT PRIMARY KEY,
+    columns TEXT NOT NULL,      -- 索引的列（JSON 列表）
+    key_columns TEXT NOT NULL   -- 定位行使用的键列（JSON 列表）
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    tbl TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (tbl, chunk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY,     -- 与 fts 的 rowid 相同
+    tbl TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    key TEXT NOT NULL,          -- 行的键（JSON 列表）
+    col TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cells_chunk ON cells (tbl, chunk);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(value, tokenize = 'trigram');
+"""
+
+
+class SearchCancelled(Exception):
+    """建立搜索索引被用户取消（已提交的部分保留，下次同步时继续）"""
+
+
+def sidecar_path(db_path):
+    """数据库文件对应的搜索索引文件"""
+    return db_path + ".fts"
+
+
+def searchable_columns(db, table_name):
+    """表中可能存放文本的列（TEXT 亲和性或没有声明类型的列）"""
+    return [column.name for column in db.get_table_schema(table_name).columns if may_hold_large_values(column.type)]
+
+
+def _fts_phrase(text):
+    # 作为一个短语匹配，trigram 分词器按子串匹配，与 LIKE '%x%' 相同（不区分大小写）
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like_snippet(value, text, width=30):
+    # LIKE 匹配时没有 snippet()，在 Python 中截取匹配处前后的文本
+    position = value.lower().find(text.lower())
+    if position < 0:
+        return value[:width * 2]
+    start = max(0, position - width)
+    end = position + len(text)
+    return (("…" if start else "") + value[start:position] + "【" + value[position:end] + "】" +
+            value[end:end + width] + ("…" if end + width < len(value) else ""))
+
+
+def integer_primary_key(db, table_name):
+    """rowid 表中作为 rowid 别名的 INTEGER PRIMARY KEY 列名，没有时返回 None"""
+    schema = db.get_table_schema(table_name)
+    if not is_rowid_key(schema.key_columns) or len(schema.primary_key) != 1:
+        return None
+    column = next(column for column in schema.columns if column.name == schema.primary_key[0])
+    return column.name if column.type.upper() == "INTEGER" else None
+
+
+def changed_rowids(keys, inserts, rowid_alias=None):
+    """
+    把 EditBuffer.touched_rows() 中 rowid 表的一项转换为 rowid 集合，供 SearchIndex.sync(changes=...) 使用
+    rowid_alias 为 INTEGER PRIMARY KEY 列名（见 integer_primary_key()）；
+    插入时没有给出 rowid 的行排在表的末尾，由同步时总是重新读取的最后一块覆盖
+    """
+    rowids = {key[0] for key in keys if isinstance(key[0], int)}
+    for column_names, values in inserts:
+        for column, value in zip(column_names, values):
+            is_rowid = is_rowid_key((column,)) or rowid_alias is not None and column.lower() == rowid_alias.lower()
+            if is_rowid and isinstance(value, int):
+                rowids.add(value)
+    return rowids
+
+
+class SearchIndex:
+    """
+    保存在数据库文件旁边 (data.db.fts) 的 FTS5 全文索引，不修改用户的数据库文件
+    每个单元格的文本是 fts 中的一行 (trigram 分词，按子串匹配)，cells 记录它所在的表、行的键和列；
+    表按块 (CHUNK_ROWS 行) 记录内容的摘要，同步时只重建摘要变化的块，
+    因此本程序或其他程序修改数据后都能增量更新
+    每个线程应使用自己的 SearchIndex（各自的连接）；索引文件使用 WAL，建索引时也可以搜索
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=5)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")  # 索引可以随时重建，不需要每次提交都同步到磁盘
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def indexed_tables(self):
+        """{表名: (索引的列, 键列)}"""
+        return {name: (json.loads(columns), json.loads(key_columns)) for name, columns, key_columns in
+                self.conn.execute("SELECT name, columns, key_columns FROM indexed_tables ORDER BY name")}
+
+    def set_tables(self, tables):
+        """
+        设置要索引的表 {表名: (列, 键列)}：删除不再索引的表的全部内容，
+        列或键列变化的表清空后在下次同步时重建
+        """
+        tables = {name: (list(columns), list(key_columns)) for name, (columns, key_columns) in tables.items()}
+        current = self.indexed_tables()
+        with self.conn:
+            for name, definition in current.items():
+                if tables.get(name) != definition:
+                    self._clear_table(name)
+            for name, (columns, key_columns) in tables.items():
+                if current.get(name) != (columns, key_columns):
+                    self.conn.execute("INSERT OR REPLACE INTO indexed_tables VALUES (?, ?, ?)",
+                                      (name, json.dumps(list(columns)), json.dumps(list(key_columns))))
+
+    def _clear_table(self, name):
+        self.conn.execute("DELETE FROM fts WHERE rowid IN (SELECT id FROM cells WHERE tbl = ?)", (name,))
+        self.conn.execute("DELETE FROM cells WHERE tbl = ?", (name,))
+        self.conn.execute("DELETE FROM chunks WHERE tbl = ?", (name,))
+        self.conn.execute("DELETE FROM indexed_tables WHERE name = ?", (name,))
+
+    def search(self, text, limit=200):
+        """
+        搜索包含 text 的单元格，返回最多 limit 个 SearchHit（按表和行的顺序）
+        三个字符以上时使用 FTS5 的 trigram 索引；更短的文本无法使用 trigram，退化为扫描索引中的文本
+        """
+        text = text.strip()
+        if not text:
+            return []
+        if len(text) >= 3:
+            rows = self.conn.execute(
+                "SELECT c.tbl, c.key, c.col, snippet(fts, 0, '【', '】', '…', 16) "
+                "FROM fts JOIN cells c ON c.id = fts.rowid WHERE fts MATCH ? LIMIT ?",
+                (_fts_phrase(text), limit)).fetchall()
+        else:
+            # 一元 + 让 SQLite 不把 LIKE 交给 FTS5（旧版本对少于 3 个字符的非 ASCII 模式会漏掉结果）
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = [(tbl, key, col, _like_snippet(value, text)) for tbl, key, col, value in self.conn.execute(
+                "SELECT c.tbl, c.key, c.col, fts.value FROM fts JOIN cells c ON c.id = fts.rowid "
+                "WHERE +fts.value LIKE ? ESCAPE '\\' LIMIT ?", (f"%{escaped}%", limit))]
+        return [SearchHit(tbl, json.loads(key), col, snippet) for tbl, key, col, snippet in rows]
+
+    def sync(self, source, schema_name="main", progress=None, should_cancel=None, changes=None):
+        """
+        按源数据库 (source 为只读连接) 的当前内容更新所有索引的表，返回重建的块数
+        changes 不为 None 时只同步其中的表 {表名: 修改过的 rowid 集合}：rowid 表只重新读取这些 rowid 所在的块
+        和最后一块及之后的部分（新插入的行）；集合为 None 或不是 rowid 表时同步整个表
+        progress(SyncProgress) 报告进度；should_cancel() 返回 True 时提交已完成的块并抛出 SearchCancelled
+        源表已不存在时删除它的索引
+        """
+        rebuilt = 0
+        for name, (columns, key_columns) in self.indexed_tables().items():
+            if changes is not None and name not in changes:
+                continue
+            rowids = changes.get(name) if changes is not None and is_rowid_key(key_columns) else None
+            chunks = None if rowids is None else {rowid // CHUNK_ROWS for rowid in rowids}
+            try:
+                rebuilt += self._sync_table(source, schema_name, name, columns, key_columns, progress, should_cancel,
+                                            chunks)
+            except sqlite3.OperationalError as e:
+                if should_cancel is not None and should_cancel():
+                    raise SearchCancelled() from e
+                if "no such" not in str(e):
+                    raise
+                with self.conn:
+                    self._clear_table(name)
+        return rebuilt
+
+    def _sync_table(self, source, schema_name, name, columns, key_columns, progress, should_cancel, chunks=None):
+        # chunks 为 rowid 表中要重新读取的块号（None 表示整个表），最后一块及之后的部分总是重新读取
+        keys = [key if is_rowid_key((key,)) else quote_identifier(key) for key in key_columns]
+        values = [f"CASE WHEN typeof({quote_identifier(column)}) = 'text' "
+                  f"THEN substr({quote_identifier(column)}, 1, {MAX_INDEXED_CHARS}) END" for column in columns]
+        by_rowid = is_rowid_key(key_columns)
+        stored = dict(self.conn.execute("SELECT chunk, digest FROM chunks WHERE tbl = ?", (name,)))
+        where, params = "", []
+        if chunks is not None:
+            tail = max(stored, default=0)
+            chunks = {number for number in chunks if number < tail}
+            ranges = [f"({keys[0]} >= ? AND {keys[0]} < ?)" for _ in chunks] + [f"{keys[0]} >= ?"]
+            where = "WHERE " + " OR ".join(ranges)
+            for number in sorted(chunks):
+                params += [number * CHUNK_ROWS, (number + 1) * CHUNK_ROWS]
+            params.append(tail * CHUNK_ROWS)
+        cursor = source.execute(f"SELECT {', '.join(keys + values)} FROM {schema_prefix(schema_name)}"
+                                f"{quote_identifier(name)} {where} ORDER BY {', '.join(keys)}", params)
+        next_id = (self.conn.execute("SELECT max(id) FROM cells").fetchone()[0] or 0) + 1
+        key_count = len(keys)
+        seen = set()
+        rebuilt = rows_read = 0
+        chunk_no, chunk_rows = None, []
+
+        def flush():
+            # 比较一块的摘要，有变化时重建这一块
+            nonlocal next_id, rebuilt
+            seen.add(chunk_no)
+            digest = hashlib.blake2b(repr(chunk_rows).encode("utf-8"), digest_size=16).digest()
+            if stored.get(chunk_no) == digest:
+                return
+            self._delete_chunk(name, chunk_no)
+            cells = []
+            for row in chunk_rows:
+                key = json.dumps(list(row[:key_count]), default=str)
+                for column, value in zip(columns, row[key_count:]):
+                    if value is not None and value.strip():
+                        cells.append((next_id, name, chunk_no, key, column, value))
+                        next_id += 1
+            self.conn.executemany("INSERT INTO cells VALUES (?, ?, ?, ?, ?)", (cell[:5] for cell in cells))
+            self.conn.executemany("INSERT INTO fts (rowid, value) VALUES (?, ?)", ((cell[0], cell[5]) for cell in cells))
+            self.conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", (name, chunk_no, digest))
+            rebuilt += 1
+            if rebuilt % COMMIT_CHUNKS == 0:
+                self.conn.commit()
+
+        try:
+            for position, row in enumerate(cursor):
+                # rowid 表按 rowid 范围分块，插入新行只影响所在的块；其他表按行的顺序分块
+                number = row[0] // CHUNK_ROWS if by_rowid else position // CHUNK_ROWS
+                if number != chunk_no:
+                    if chunk_rows:
+                        flush()
+                        if should_cancel is not None and should_cancel():
+                            raise SearchCancelled()
+                        if progress is not None:
+                            progress(SyncProgress(name, rows_read, rebuilt))
+                    chunk_no, chunk_rows = number, []
+                chunk_rows.append(row)
+                rows_read += 1
+            if chunk_rows:
+                flush()
+            for number in set(stored) - seen:
+                if chunks is None or number in chunks or number >= tail:
+                    self._delete_chunk(name, number)  # 整块的行都已删除
+            self.conn.commit()
+        except BaseException:
+            self.conn.commit()  # 已重建的块连同摘要一起提交，下次同步时跳过
+            raise
+        if progress is not None:
+            progress(SyncProgress(name, rows_read, rebuilt))
+        return rebuilt
+
+    def _delete_chunk(self, name, chunk_no):
+        self.conn.execute("DELETE FROM fts WHERE rowid IN (SELECT id FROM cells WHERE tbl = ? AND chunk = ?)",
+                          (name, chunk_no))
+        self.conn.execute("DELETE FROM cells WHERE tbl = ? AND chunk = ?", (name, chunk_no))
+        self.conn.execute("DELETE FROM chunks WHERE tbl = ? AND chunk = ?", (name, chunk_no))
+
+    def size(self):
+        """索引文件（含 WAL）的字节数"""
+        return sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
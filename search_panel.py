@@ -0,0 +1,306 @@
+import os
+import time
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox,
+                             QTreeWidget, QTreeWidgetItem, QDialog, QDialogButtonBox, QListWidget,
+                             QListWidgetItem, QHeaderView)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from db_connector import format_size, is_rowid_key
+from query_worker import SearchIndexWorker
+from search_index import SearchIndex, changed_rowids, integer_primary_key, searchable_columns, sidecar_path
+
+
+def _merge_changes(first, second):
+    """合并两次同步的范围（见 SearchIndex.sync 的 changes）：None 表示所有索引的表，表对应 None 表示整个表"""
+    if first is None or second is None:
+        return None
+    merged = dict(first)
+    for table, rowids in second.items():
+        if table not in merged:
+            merged[table] = rowids
+        elif merged[table] is None or rowids is None:
+            merged[table] = None
+        else:
+            merged[table] = merged[table] | rowids
+    return merged
+
+
+class SearchTablesDialog(QDialog):
+    """选择要建立搜索索引的表：只列出有文本列且能定位行（有 rowid 或主键）的表"""
+
+    def __init__(self, db, indexed, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"选择要搜索的表 - {db.schema_name}")
+        self.tables = {}
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("索引所选表的文本列（索引保存在数据库文件旁的 .fts 文件中）:"))
+        self.table_list = QListWidget()
+        for name in db.get_tables():
+            key_columns = db.get_row_key_columns(name)
+            columns = searchable_columns(db, name)
+            if not key_columns or not columns:
+                continue
+            self.tables[name] = (columns, key_columns)
+            item = QListWidgetItem(f"{name}  ({', '.join(columns)})")
+            item.setData(Qt.UserRole, name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in indexed else Qt.Unchecked)
+            self.table_list.addItem(item)
+        layout.addWidget(self.table_list)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def selected_tables(self):
+        """{表名: (列, 键列)}"""
+        selected = {}
+        for row in range(self.table_list.count()):
+            item = self.table_list.item(row)
+            if item.checkState() == Qt.Checked:
+                name = item.data(Qt.UserRole)
+                selected[name] = self.tables[name]
+        return selected
+
+
+class SearchPanel(QWidget):
+    """
+    全局搜索面板：在工作区中所有已建立索引的数据库里搜索文本，结果按表和行分组，双击结果跳转到该行
+    索引在后台线程中建立和增量同步（一次同步一个数据库），界面线程用各库自己的连接只读索引文件
+    """
+
+    rowActivated = pyqtSignal(str, str, object)  # 库名, 表名, 行的键（列表）
+
+    MAX_HITS = 200  # 每个数据库最多显示的结果数
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.databases = {}  # 库名 -> DBConnector
+        self.indexes = {}  # 库名 -> SearchIndex（界面线程中使用）
+        self.worker = None
+        self._pending = {}  # 等待同步的库名 -> 同步范围（见 SearchIndex.sync 的 changes）
+        self._stale = {}  # 库名 -> 下次搜索前要同步的范围
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索所有已索引表中的文本（至少 3 个字符时使用全文索引）")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.returnPressed.connect(self.search)
+        layout.addWidget(self.search_edit)
+
+        index_layout = QHBoxLayout()
+        self.database_combo = QComboBox()
+        self.tables_button = QPushButton("选择表...")
+        self.tables_button.clicked.connect(self.choose_tables)
+        self.sync_button = QPushButton("更新索引")
+        self.sync_button.clicked.connect(lambda: self.sync(self.database_combo.currentData()))
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel)
+        index_layout.addWidget(self.database_combo, stretch=1)
+        index_layout.addWidget(self.tables_button)
+        index_layout.addWidget(self.sync_button)
+        index_layout.addWidget(self.cancel_button)
+        layout.addLayout(index_layout)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.result_tree = QTreeWidget()
+        self.result_tree.setHeaderLabels(["表 / 行", "列", "内容"])
+        self.result_tree.header().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.result_tree.itemActivated.connect(self.on_item_activated)
+        layout.addWidget(self.result_tree)
+
+        # 输入停顿后再搜索，避免每输入一个字符都查询一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.update_controls()
+
+    def set_databases(self, databases):
+        """
+        设置工作区中的数据库 {库名: DBConnector}（空字典表示已关闭）
+        新加入的库如果已有索引文件，打开它并在后台同步（数据可能已被其他程序修改）
+        """
+        for name in list(self.indexes):
+            if self.databases.get(name) is not databases.get(name):
+                if self.worker is not None and self.worker.db is self.databases.get(name):
+                    self.stop()
+                self.indexes.pop(name).close()
+        self._pending = {name: changes for name, changes in self._pending.items() if name in databases}
+        self._stale = {name: changes for name, changes in self._stale.items() if name in databases}
+        added = [name for name, db in databases.items() if self.databases.get(name) is not db]
+        self.databases = dict(databases)
+        self.database_combo.clear()
+        for name, db in self.databases.items():
+            self.database_combo.addItem(f"{name}: {os.path.basename(db.db_path)}", name)
+        for name in added:
+            if os.path.exists(sidecar_path(self.databases[name].db_path)):
+                self._open_index(name)
+                self.sync(name)
+        self.result_tree.clear()
+        self.update_controls()
+
+    def _open_index(self, name):
+        if name not in self.indexes:
+            self.indexes[name] = SearchIndex(sidecar_path(self.databases[name].db_path))
+        return self.indexes[name]
+
+    def update_controls(self):
+        running = self.worker is not None
+        has_database = self.database_combo.count() > 0
+        self.tables_button.setEnabled(has_database and not running)
+        self.sync_button.setEnabled(has_database and not running)
+        self.cancel_button.setEnabled(running)
+        if not running:
+            indexed = sum(len(index.indexed_tables()) for index in self.indexes.values())
+            self.status_label.setText(f"已索引 {indexed} 个表" if indexed else "还没有建立索引，请先选择要搜索的表")
+
+    def choose_tables(self):
+        name = self.database_combo.currentData()
+        if name is None or self.worker is not None:
+            return
+        index = self.indexes.get(name)
+        indexed = index.indexed_tables() if index is not None else {}
+        dialog = SearchTablesDialog(self.databases[name], indexed, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self._open_index(name)
+        self.sync(name, dialog.selected_tables())
+
+    def sync(self, name=None, tables=None, changes=None):
+        """
+        在后台同步数据库 name 的索引（None 表示所有已有索引的库），tables 不为 None 时先修改要索引的表，
+        changes 不为 None 时只同步其中的表和块（见 SearchIndex.sync）
+        已有同步在执行时排队（同一个库的范围合并），完成后再同步
+        """
+        if name is None:
+            for name in self.indexes:
+                self.sync(name)
+            return
+        if name not in self.databases:
+            return
+        if self.worker is not None:
+            self._pending[name] = _merge_changes(self._pending[name], changes) if name in self._pending else changes
+            return
+        worker = SearchIndexWorker(self.databases[name], tables, changes, parent=self)
+        worker.progress.connect(lambda progress: self.status_label.setText(
+            f"{name}: 正在索引 {progress.table}，已读取 {progress.rows} 行，重建 {progress.chunks} 块..."))
+        worker.finished_ok.connect(lambda chunks, elapsed: self.on_synced(name, chunks, elapsed))
+        worker.cancelled.connect(lambda: self.status_label.setText("已取消，已建好的部分可以搜索，下次更新时继续"))
+        if changes is not None:
+            # 保存后的同步被取消时留到下次搜索（取消整个库的同步则等用户再点"更新索引"）
+            worker.cancelled.connect(lambda: self._mark_stale(name, changes))
+        worker.failed.connect(lambda message: self.status_label.setText(f"{name}: 更新索引失败: {message}"))
+        worker.finished.connect(self.on_worker_done)
+        self.worker = worker
+        self.update_controls()
+        self.status_label.setText(f"{name}: 正在更新索引...")
+        worker.start()
+
+    def sync_saved(self, touched, modified=False):
+        """
+        保存后更新索引：touched 为 {库名: EditBuffer.touched_rows()}，只同步编辑过的已索引的表；
+        rowid 表只重建编辑过的行所在的块和末尾的块，其他表按行的位置分块，插入或删除会移动之后所有的块，
+        留到下次搜索时再同步整个表。modified 为 True 时还执行过修改数据的 SQL（范围未知），所有索引的表都留到下次搜索时同步
+        """
+        for name, index in self.indexes.items():
+            if modified:
+                self._mark_stale(name, None)
+            indexed = index.indexed_tables()
+            changes = {}
+            for table, (keys, inserts) in touched.get(name, {}).items():
+                if table not in indexed:
+                    continue
+                if is_rowid_key(indexed[table][1]):
+                    alias = integer_primary_key(self.databases[name], table)
+                    changes[table] = changed_rowids(keys, inserts, alias)
+                else:
+                    self._mark_stale(name, {table: None})
+            if changes:
+                self.sync(name, changes=changes)
+
+    def _mark_stale(self, name, changes):
+        self._stale[name] = _merge_changes(self._stale[name], changes) if name in self._stale else changes
+
+    def on_synced(self, name, chunks, elapsed):
+        index = self._open_index(name)
+        self.status_label.setText(f"{name}: 索引已更新，重建 {chunks} 块，用时 {elapsed:.1f} 秒，"
+                                  f"索引文件 {format_size(index.size())}")
+        if self.search_edit.text().strip():
+            self.search()
+
+    def on_worker_done(self):
+        worker = self.worker
+        if worker is not None:
+            worker.deleteLater()
+            self.worker = None
+        message = self.status_label.text()
+        self.update_controls()
+        self.status_label.setText(message)
+        if self._pending:
+            name = next(iter(self._pending))
+            self.sync(name, changes=self._pending.pop(name))
+
+    def cancel(self):
+        for name, changes in self._pending.items():
+            if changes is not None:
+                self._mark_stale(name, changes)
+        self._pending = {}
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText("正在取消...")
+
+    def stop(self):
+        """取消并等待正在执行的同步结束（排队的同步也一并取消）"""
+        self._pending = {}
+        worker = self.worker
+        if worker is None:
+            return
+        worker.blockSignals(True)
+        worker.cancel()
+        worker.wait()
+        self.on_worker_done()
+
+    def search(self):
+        self.search_timer.stop()
+        self.result_tree.clear()
+        text = self.search_edit.text()
+        if not text.strip() or not self.indexes:
+            return
+        # 保存时没有立即同步的表在这时同步，完成后 on_synced() 重新搜索
+        for name in list(self._stale):
+            self.sync(name, changes=self._stale.pop(name))
+        start = time.perf_counter()
+        total = 0
+        truncated = False
+        for name, index in self.indexes.items():
+            hits = index.search(text, self.MAX_HITS)
+            truncated = truncated or len(hits) >= self.MAX_HITS
+            groups = {}
+            for hit in hits:
+                groups.setdefault(hit.table, {}).setdefault(tuple(hit.key), []).append(hit)
+            for table, rows in groups.items():
+                count = sum(len(row_hits) for row_hits in rows.values())
+                total += count
+                title = table if name == "main" else f"{name}.{table}"
+                table_item = QTreeWidgetItem([f"{title} ({count})"])
+                for key, row_hits in rows.items():
+                    key_text = ", ".join(str(value) for value in key)
+                    for hit in row_hits:
+                        item = QTreeWidgetItem([key_text, hit.column, hit.snippet.replace("\n", " ")])
+                        item.setData(0, Qt.UserRole, (name, table, list(key)))
+                        table_item.addChild(item)
+                self.result_tree.addTopLevelItem(table_item)
+                table_item.setExpanded(True)
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.worker is None:
+            more = f"（每个数据库只显示前 {self.MAX_HITS} 处）" if truncated else ""
+            self.status_label.setText(f"找到 {total} 处{more}，用时 {elapsed:.1f} ms")
+        self.result_tree.resizeColumnToContents(0)
+
+    def on_item_activated(self, item, column):
+        data = item.data(0, Qt.UserRole)
+        if data:
+            self.rowActivated.emit(*data)
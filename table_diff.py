@@ -0,0 +1,292 @@
+"""
+比较同一连接上两个库（主库和附加的库，如昨天的副本和今天的文件）中的表，并生成把旧库变为新库的 SQL 补丁
+两边都按主键分块比较，比较在 SQLite 中完成，只有不同的行才读到 Python 中，内存占用与表的大小无关
+"""
+import sqlite3
+from collections import namedtuple
+from db_connector import is_rowid_key, quote_identifier, schema_prefix
+
+# 一行差异：kind 为 insert（只在新库）、update（两边都有但值不同）或 delete（只在旧库）；
+# key 为键值元组，old / new 为该行在两边的值（键列在前，其后是 TableDiff.columns），不存在的一边为 None
+DiffRow = namedtuple('DiffRow', 'kind key old new')
+
+# 一个表的比较结果：status 为 "compared"、"only_old"（新库中已删除的表）或 "only_new"（新建的表）
+DiffSummary = namedtuple('DiffSummary', 'table status rows_old rows_new inserted updated deleted only_old only_new')
+
+DIFF_KINDS = {"insert": "新增", "update": "修改", "delete": "删除"}
+
+CHUNK_ROWS = 100000  # 每块比较的旧库行数
+
+
+class DiffCancelled(Exception):
+    """比较被用户取消"""
+
+
+def _order_key(values):
+    # 与 SQLite 的 BINARY 排序一致：NULL < 数值 < 文本 < BLOB，Python 无法直接比较不同类型时使用
+    return tuple((0, 0) if value is None else (1, value) if isinstance(value, (int, float)) else
+                 (2, value) if isinstance(value, str) else (3, bytes(value)) for value in values)
+
+
+def _less(a, b):
+    try:
+        return a < b
+    except TypeError:
+        return _order_key(a if isinstance(a, tuple) else (a,)) < _order_key(b if isinstance(b, tuple) else (b,))
+
+
+def sql_literal(value):
+    """把值写成 SQL 字面量（用于补丁脚本）"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return "NULL"  # SQLite 把 NaN 存为 NULL
+        if value in (float("inf"), float("-inf")):
+            return "9e999" if value > 0 else "-9e999"
+        return repr(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "X'" + bytes(value).hex().upper() + "'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _table_info(conn, schema_name, table_name):
+    """返回 (建表语句, 列信息列表, 主键列)，表不存在时返回 None"""
+    row = conn.execute(f"SELECT sql FROM {schema_prefix(schema_name)}sqlite_master WHERE type = 'table' AND name = ?",
+                       (table_name,)).fetchone()
+    if row is None:
+        return None
+    columns = conn.execute(f"PRAGMA {schema_prefix(schema_name)}table_info({quote_identifier(table_name)})").fetchall()
+    primary_key = [column[1] for column in sorted((c for c in columns if c[5]), key=lambda c: c[5])]
+    return row[0], [column[1] for column in columns], primary_key
+
+
+def table_names(conn, schema_name):
+    """库中的所有表（不含 sqlite_ 开头的内部表）"""
+    return [row[0] for row in conn.execute(
+        f"SELECT name FROM {schema_prefix(schema_name)}sqlite_master "
+        "WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY name")]
+
+
+class TableDiff:
+    """
+    比较两个库中的同名表：按主键（没有主键时按 rowid）配对行，比较两边都有的列
+    只在一边存在的列在摘要中列出，不参与比较；没有主键的表在 VACUUM 后 rowid 可能重新编号，结果仅供参考
+    """
+
+    def __init__(self, conn, old_schema, new_schema, table_name):
+        self.conn = conn
+        self.old_schema = old_schema
+        self.new_schema = new_schema
+        self.table_name = table_name
+        old = _table_info(conn, old_schema, table_name)
+        new = _table_info(conn, new_schema, table_name)
+        if old is None and new is None:
+            raise ValueError(f"两个库中都没有表 {table_name}")
+        self.status = "compared" if old and new else ("only_old" if new is None else "only_new")
+        self.create_sql = (new or old)[0]
+        old_columns = old[1] if old else new[1]
+        new_columns = new[1] if new else old[1]
+        old_key = old[2] if old else new[2]
+        new_key = new[2] if new else old[2]
+        if old_key != new_key:
+            raise ValueError(f"{table_name} 在两个库中的主键不同 ({', '.join(old_key) or 'rowid'} / "
+                             f"{', '.join(new_key) or 'rowid'})，无法按行比较")
+        self.key_columns = new_key or ["rowid"]
+        common = set(old_columns) & set(new_columns)
+        self.columns = [name for name in new_columns if name in common and name not in self.key_columns]
+        self.only_old = [name for name in old_columns if name not in common]
+        self.only_new = [name for name in new_columns if name not in common]
+        self.chunk_rows = CHUNK_ROWS
+        self.rows_old = self.rows_new = 0
+        self.counts = {kind: 0 for kind in DIFF_KINDS}
+
+    @property
+    def headers(self):
+        """DiffRow.old / new 中各值对应的列名"""
+        return list(self.key_columns) + self.columns
+
+    def _key_exprs(self, alias):
+        return [f"{alias}.{key}" if is_rowid_key((key,)) else f"{alias}.{quote_identifier(key)}"
+                for key in self.key_columns]
+
+    def _value_exprs(self, alias):
+        return self._key_exprs(alias) + [f"{alias}.{quote_identifier(column)}" for column in self.columns]
+
+    def _range(self, alias, low, high):
+        # 键在 (low, high] 中的行，None 表示不限
+        keys = self._key_exprs(alias)
+        key_list = f"({', '.join(keys)})" if len(keys) > 1 else keys[0]
+        placeholders = f"({', '.join(['?'] * len(keys))})" if len(keys) > 1 else "?"
+        conditions, params = [], []
+        if low is not None:
+            conditions.append(f"{key_list} > {placeholders}")
+            params.extend(low)
+        if high is not None:
+            conditions.append(f"{key_list} <= {placeholders}")
+            params.extend(high)
+        return " AND ".join(conditions) or "1", params
+
+    def _chunk_end(self, table, low):
+        # 旧库中从 low 之后数 chunk_rows 行的最后一个键，剩下的行不足 chunk_rows 时返回 None（最后一块）
+        where, params = self._range("o", low, None)
+        keys = self._key_exprs("o")
+        row = self.conn.execute(f"SELECT {', '.join(keys)} FROM {table} o WHERE {where} "
+                                f"ORDER BY {', '.join(keys)} LIMIT 1 OFFSET ?", params + [self.chunk_rows - 1]).fetchone()
+        return tuple(row) if row is not None else None
+
+    def rows(self, progress=None, should_cancel=None):
+        """
+        按键的顺序产生 DiffRow；表只在旧库中时不产生行（补丁中整表删除），只在新库中时所有行都是新增
+        旧库按键分成 chunk_rows 行一块，每块用两条语句在 SQLite 中完成比较（LEFT JOIN 找出修改和删除的行，
+        NOT EXISTS 找出新增的行），只有不同的行才返回到 Python；
+        每块完成后调用 progress(已比较的旧库行数, 旧库总行数)，should_cancel() 返回 True 时抛出 DiffCancelled
+        """
+        old_table = schema_prefix(self.old_schema) + quote_identifier(self.table_name)
+        new_table = schema_prefix(self.new_schema) + quote_identifier(self.table_name)
+        if self.status == "only_old":
+            self.rows_old = self.conn.execute(f"SELECT count(*) FROM {old_table}").fetchone()[0]
+            return
+        try:
+            self.rows_new = self.conn.execute(f"SELECT count(*) FROM {new_table}").fetchone()[0]
+            if self.status == "only_new":
+                cursor = self.conn.execute(f"SELECT {', '.join(self._value_exprs('n'))} FROM {new_table} n "
+                                           f"ORDER BY {', '.join(self._key_exprs('n'))}")
+                for row in cursor:
+                    self.counts["insert"] += 1
+                    yield DiffRow("insert", row[:len(self.key_columns)], None, row)
+                return
+            self.rows_old = self.conn.execute(f"SELECT count(*) FROM {old_table}").fetchone()[0]
+            low, done = None, 0
+            while True:
+                if should_cancel is not None and should_cancel():
+                    raise DiffCancelled()
+                high = self._chunk_end(old_table, low)
+                yield from self._diff_chunk(old_table, new_table, low, high)
+                done = min(done + self.chunk_rows, self.rows_old) if high is not None else self.rows_old
+                if progress is not None:
+                    progress(done, self.rows_old)
+                if high is None:
+                    break
+                low = high
+        except sqlite3.OperationalError as e:
+            if should_cancel is not None and should_cancel():
+                raise DiffCancelled() from e
+            raise
+
+    def _diff_chunk(self, old_table, new_table, low, high):
+        key_count = len(self.key_columns)
+        old_keys, new_keys = self._key_exprs("o"), self._key_exprs("n")
+        join = " AND ".join(f"{n} = {o}" for n, o in zip(new_keys, old_keys))
+        # 一元 + 去掉列的亲和性，'1' 与 1 不会被当作相等；BINARY 让只有大小写不同的值也算作修改
+        compared = list(zip(self._value_exprs("o"), self._value_exprs("n")))
+        if is_rowid_key(self.key_columns):
+            compared = compared[1:]
+        differs = " OR ".join([f"{new_keys[0]} IS NULL"] +
+                              [f"(+{o}) IS NOT (+{n}) COLLATE BINARY" for o, n in compared])
+        where, params = self._range("o", low, high)
+        changed = self.conn.execute(
+            f"SELECT {', '.join(self._value_exprs('o') + self._value_exprs('n'))}, {new_keys[0]} IS NULL "
+            f"FROM {old_table} o LEFT JOIN {new_table} n ON {join} WHERE {where} AND ({differs}) "
+            f"ORDER BY {', '.join(old_keys)}", params)
+        where, params = self._range("n", low, high)
+        inserted = self.conn.execute(
+            f"SELECT {', '.join(self._value_exprs('n'))} FROM {new_table} n WHERE {where} AND NOT EXISTS "
+            f"(SELECT 1 FROM {old_table} o WHERE {join}) ORDER BY {', '.join(new_keys)}", params)
+
+        width = len(self.headers)
+        change = next(changed, None)
+        insert = next(inserted, None)
+        while change is not None or insert is not None:
+            if insert is None or (change is not None and not _less(insert[:key_count], change[:key_count])):
+                old = change[:width]
+                if change[-1]:
+                    self.counts["delete"] += 1
+                    yield DiffRow("delete", old[:key_count], old, None)
+                else:
+                    new = change[width:2 * width]
+                    self.counts["update"] += 1
+                    yield DiffRow("update", new[:key_count], old, new)
+                change = next(changed, None)
+            else:
+                self.counts["insert"] += 1
+                yield DiffRow("insert", insert[:key_count], None, insert)
+                insert = next(inserted, None)
+
+    def summary(self):
+        return DiffSummary(self.table_name, self.status, self.rows_old, self.rows_new, self.counts["insert"],
+                           self.counts["update"], self.counts["delete"], self.only_old, self.only_new)
+
+    def changed_columns(self, row):
+        """update 行中值不同的列序号（对应 headers）"""
+        return [i for i in range(len(row.new)) if row.old[i] != row.new[i] or type(row.old[i]) != type(row.new[i])]
+
+    def _where(self, key):
+        return " AND ".join(f"{quote_identifier(name)} IS NULL" if value is None else
+                            f"{quote_identifier(name)} = {sql_literal(value)}"
+                            for name, value in zip(self.key_columns, key))
+
+    def patch_statement(self, row):
+        """把旧库中的这一行改为新库中的样子的 SQL 语句"""
+        table = quote_identifier(self.table_name)
+        if row.kind == "insert":
+            columns = ", ".join(quote_identifier(name) for name in self.headers)
+            return f"INSERT INTO {table} ({columns}) VALUES ({', '.join(sql_literal(v) for v in row.new)});"
+        if row.kind == "delete":
+            return f"DELETE FROM {table} WHERE {self._where(row.key)};"
+        headers = self.headers
+        assignments = ", ".join(f"{quote_identifier(headers[i])} = {sql_literal(row.new[i])}"
+                                for i in self.changed_columns(row))
+        return f"UPDATE {table} SET {assignments} WHERE {self._where(row.old[:len(self.key_columns)])};"
+
+
+def compare_tables(conn, old_schema, new_schema, tables=None):
+    """
+    为两个库中的表建立 TableDiff（默认为两边所有表的并集），按表名排序
+    主键不同等无法比较的表抛出 ValueError
+    """
+    if tables is None:
+        tables = sorted(set(table_names(conn, old_schema)) | set(table_names(conn, new_schema)))
+    return [TableDiff(conn, old_schema, new_schema, name) for name in tables]
+
+
+class PatchWriter:
+    """
+    把差异写成 SQL 脚本，在旧库上执行后内容与新库相同（只修改数据：新建和删除整个表，但不修改已有表的列）
+    脚本在一个事务中执行，外键检查推迟到提交时
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="\n")
+        self.file.write("BEGIN;\nPRAGMA defer_foreign_keys = ON;\n")
+
+    def start_table(self, diff):
+        table = quote_identifier(diff.table_name)
+        self.file.write(f"\n-- {diff.table_name}\n")
+        if diff.status == "only_old":
+            self.file.write(f"DROP TABLE {table};\n")
+        elif diff.status == "only_new":
+            self.file.write(f"{diff.create_sql};\n")
+        if diff.only_old or diff.only_new:
+            self.file.write(f"-- 两边的列不同（只在旧库: {', '.join(diff.only_old) or '无'}；"
+                            f"只在新库: {', '.join(diff.only_new) or '无'}），补丁只同步共有的列\n")
+
+    def write(self, diff, row):
+        self.file.write(diff.patch_statement(row))
+        self.file.write("\n")
+
+    def close(self, commit=True):
+        if commit:
+            self.file.write("\nCOMMIT;\n")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        # 中途出错或取消时不写 COMMIT，执行不完整的脚本会在结束时回滚
+        self.close(commit=exc_type is None)
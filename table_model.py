@@ -0,0 +1,484 @@
+import random
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor, QFont
+from db_connector import LargeValue, format_size
+from result_cache import ChunkedResult, ColumnarResult
+from table_diff import DIFF_KINDS
+
+# 待保存修改的显示颜色
+DIRTY_CELL_BRUSH = QBrush(QColor(255, 243, 176))
+DELETED_ROW_BRUSH = QBrush(QColor(255, 205, 205))
+INSERTED_ROW_BRUSH = QBrush(QColor(205, 240, 205))
+# 监视表时被其他连接修改过的行
+EXTERNAL_CHANGE_BRUSH = QBrush(QColor(205, 225, 255))
+
+_SQL_TYPE_NAMES = {type(None): "NULL", int: "INTEGER", float: "REAL", str: "TEXT", bytes: "BLOB"}
+
+DISPLAY_TEXT_LIMIT = 1000  # 查询结果中的长文本只显示开头部分
+
+
+def display_text(value):
+    """
+    单元格的显示文本
+    BLOB 显示为十六进制（小值）或 <BLOB 大小> 占位符，被截断的 TEXT 显示开头部分和总字符数，
+    完整内容在值预览面板中查看
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, LargeValue):
+        if value.kind == 'blob':
+            return f"<BLOB {format_size(value.size)}>"
+        return f"{value.prefix}… <共 {value.size} 字符>"
+    if isinstance(value, bytes):
+        if len(value) <= 32:
+            return "x'" + value.hex() + "'"
+        return f"<BLOB {format_size(len(value))}>"
+    text = str(value)
+    if len(text) > DISPLAY_TEXT_LIMIT:
+        return f"{text[:DISPLAY_TEXT_LIMIT]}… <共 {len(text)} 字符>"
+    return text
+
+
+def is_large_value(value):
+    """是否不能在表格中直接编辑（BLOB 和被截断的 TEXT 只能在值预览面板中替换）"""
+    return isinstance(value, (LargeValue, bytes))
+
+
+class PagedTableModel(QAbstractTableModel):
+    """
+    基于键集分页的懒加载表格模型
+    行按页从 SQLite 读取，只在视图滚动到时才加载 (canFetchMore/fetchMore)，
+    已加载的页放在有上限的 LRU 缓存中，被淘汰的页在再次访问时按记录的起始键重新读取，
+    因此无论表有多大，内存占用只与缓存页数有关；每页的行和键都按列存储 (ColumnarResult)，显示时直接从中读取
+    知道表的总行数（set_table_rows）后，行数直接设为总行数，滚动条一开始就对应整个表；
+    跳到还没读过的页时按 OFFSET 读取，之后相邻的页再按键集继续
+    编辑不直接写入数据库，而是记录到 EditBuffer，并在显示时叠加待保存的值
+    监视表的变化时由 apply_changes() 只替换已加载的页中变化的行
+    """
+
+    cellEdited = pyqtSignal(str, str)  # 表名, 列名
+
+    def __init__(self, db, table_name, edit_buffer, page_size=500, max_cached_pages=20, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.table_name = table_name
+        self.edit_buffer = edit_buffer
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+
+        self.headers = [name for name, _ in db.get_columns(table_name)]
+        self.key_columns = db.get_row_key_columns(table_name)
+
+        # 排序和过滤都下推到 SQL 中执行
+        self.order_by = None
+        self.descending = False
+        self.filters = []  # ColumnFilter 列表
+        self.table_rows = None  # 表的精确总行数（后台统计得到），只在没有过滤条件时使用
+
+        self._reset_pages()
+
+    def _reset_pages(self):
+        self._pages = OrderedDict()  # 页号 -> (keys, rows)
+        # 已知的各页起始游标（上一页最后一行的排序值和键），用于读取被淘汰的页和相邻的页
+        self._page_starts = {0: None}
+        self._row_count = 0
+        self._exhausted = False
+        # 监视表时其他连接修改过和删除的行的键，重新加载后清空
+        self._changed_keys = set()
+        self._removed_keys = set()
+
+    def set_query(self, order_by=None, descending=False, filters=()):
+        """修改排序和过滤条件，并从第一页重新加载"""
+        self.beginResetModel()
+        self.order_by = order_by
+        self.descending = descending
+        self.filters = list(filters)
+        self._reset_pages()
+        self.endResetModel()
+        self.fetchMore()
+        if self.table_rows is not None:
+            self.set_table_rows(self.table_rows)
+
+    def set_table_rows(self, count):
+        """
+        记录表的精确总行数；没有过滤条件时把行数设为总行数，不再通过 fetchMore 逐页增加
+        数据在统计之后发生变化时，已删除的行显示为空，新增的行要在重新统计后才会显示
+        """
+        self.table_rows = count
+        if self.filters:
+            return  # 过滤后的行数未知，仍逐页加载
+        if count > self._row_count:
+            self.beginInsertRows(QModelIndex(), self._row_count, count - 1)
+            self._row_count = count
+            self._exhausted = True
+            self.endInsertRows()
+        elif count < self._row_count:
+            self.beginRemoveRows(QModelIndex(), count, self._row_count - 1)
+            self._row_count = count
+            self._exhausted = True
+            self.endRemoveRows()
+        else:
+            self._exhausted = True
+
+    @property
+    def editable(self):
+        return bool(self.key_columns) and not self.db.read_only
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else QVariant()
+        return section + 1
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if not self.editable or not self.has_row(index.row()):
+            return flags
+        if not is_large_value(self.raw_value(index)) and not self.is_removed(index.row()):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def is_removed(self, row):
+        """该行是否已被其他连接删除（监视表时，刷新前仍显示在原位）"""
+        return bool(self._removed_keys) and self.row_key(row) in self._removed_keys
+
+    def raw_value(self, index):
+        """单元格的原始值（含待保存的修改），大值为 LargeValue"""
+        page_no, offset = divmod(index.row(), self.page_size)
+        value = self._page(page_no)[1].value(offset, index.column())
+        if self.editable:
+            dirty, pending = self.edit_buffer.pending_value(
+                self.table_name, self.row_key(index.row()), self.headers[index.column()])
+            if dirty:
+                value = pending
+        return value
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        row = index.row()
+        if not self.has_row(row):
+            return QVariant()  # 统计行数之后被删除的行
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            value = self.raw_value(index)
+            if role == Qt.DisplayRole or is_large_value(value):
+                return display_text(value)
+            return "" if value is None else str(value)
+        if role not in (Qt.BackgroundRole, Qt.FontRole, Qt.ToolTipRole):
+            return QVariant()
+        key = self.row_key(row)
+        if key in self._removed_keys:
+            if role == Qt.ToolTipRole:
+                return "该行已被其他连接删除，刷新 (F5) 后不再显示"
+            if role == Qt.BackgroundRole:
+                return DELETED_ROW_BRUSH
+            font = QFont()
+            font.setStrikeOut(True)
+            return font
+        external = role == Qt.BackgroundRole and key in self._changed_keys
+        if not self.editable or role == Qt.ToolTipRole:
+            return EXTERNAL_CHANGE_BRUSH if external else QVariant()
+
+        # 标记待保存的修改
+        if self.edit_buffer.is_deleted(self.table_name, key):
+            if role == Qt.BackgroundRole:
+                return DELETED_ROW_BRUSH
+            font = QFont()
+            font.setStrikeOut(True)
+            return font
+        if role == Qt.BackgroundRole and self.edit_buffer.pending_value(
+                self.table_name, key, self.headers[index.column()])[0]:
+            return DIRTY_CELL_BRUSH
+        return EXTERNAL_CHANGE_BRUSH if external else QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or not self.editable or not self.has_row(index.row()):
+            return False
+        if is_large_value(self.raw_value(index)):
+            return False  # 大值只能在值预览面板中替换
+        if value == self.data(index, Qt.EditRole):
+            return False  # 值没有变化
+        column_name = self.headers[index.column()]
+        self.edit_buffer.set_cell(self.table_name, self.key_columns, self.row_key(index.row()),
+                                  column_name, value)
+        self.dataChanged.emit(index, index)
+        self.cellEdited.emit(self.table_name, column_name)
+        return True
+
+    def refresh_pending(self):
+        """待保存修改变化（删除、撤销、重做）后重绘已加载的行"""
+        if self._row_count and self.headers:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._row_count - 1, len(self.headers) - 1))
+
+    def reload_pages(self):
+        """丢弃缓存的页（行数和各页起始游标不变），在值被直接写入数据库后重新读取"""
+        self._pages = OrderedDict()
+        self.refresh_pending()
+
+    def apply_changes(self, changes):
+        """
+        把其他连接对表的修改 (change_tracker.TableChanges) 应用到已加载的页上，不重新加载整个表：
+        修改过的行按键重新读取并替换，删除的行留在原位显示为删除线，直到刷新；
+        按键排序且没有过滤条件时（新行总在末尾）直接追加新增的行
+        返回没有显示出来的新增行数（需要刷新才能看到）
+        """
+        wanted = changes.updated | changes.deleted
+        if not self.key_columns or not wanted:
+            return changes.inserted
+        positions = {}  # 页号 -> [(页内行号, 键)]，只查找已缓存的页
+        for page_no, (keys, _) in self._pages.items():
+            for offset in range(keys.row_count):
+                key = keys.row(offset)
+                if key in wanted:
+                    positions.setdefault(page_no, []).append((offset, key))
+        refetch = [key for found in positions.values() for _, key in found if key in changes.updated]
+        rows = self.db.fetch_rows(self.table_name, self.key_columns, refetch) if refetch else {}
+        # 读取之前又被删除的行同样按删除处理
+        removed = changes.deleted | (set(refetch) - set(rows))
+        self._removed_keys |= removed
+        self._changed_keys = (self._changed_keys - removed) | set(rows)
+        for page_no, found in positions.items():
+            keys, page = self._pages[page_no]
+            replaced = [(offset, rows[key]) for offset, key in found if key in rows]
+            if replaced:
+                page_rows = list(page.rows())
+                for offset, row in replaced:
+                    page_rows[offset] = row
+                self._pages[page_no] = (keys, ColumnarResult.from_rows(self.headers, page_rows))
+            first = page_no * self.page_size + min(offset for offset, _ in found)
+            last = page_no * self.page_size + max(offset for offset, _ in found)
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.headers) - 1))
+        if changes.inserted and not self.order_by and not self.filters and self._exhausted:
+            self._append_new_rows(changes.inserted)
+            return 0
+        return changes.inserted
+
+    def _append_new_rows(self, count):
+        # 重新读取最后一页，再继续读取之后的页，直到多出 count 行或读到表的末尾（新增的行都已读到）
+        start = self._row_count
+        page_no = max(self._row_count - 1, 0) // self.page_size
+        self._pages.pop(page_no, None)
+        rows = self._load_page(page_no)[1]
+        end = page_no * self.page_size + rows.row_count
+        if end > self._row_count:
+            self.beginInsertRows(QModelIndex(), self._row_count, end - 1)
+            self._row_count = end
+            self.endInsertRows()
+        elif end < self._row_count:
+            # 最后一页中被删除的行在重新读取后不再显示
+            self.beginRemoveRows(QModelIndex(), end, self._row_count - 1)
+            self._row_count = end
+            self.endRemoveRows()
+        else:
+            self.dataChanged.emit(self.index(page_no * self.page_size, 0),
+                                  self.index(max(end - 1, 0), len(self.headers) - 1))
+        self._exhausted = rows.row_count < self.page_size
+        while not self._exhausted and self._row_count - start < count:
+            self.fetchMore()
+        if self.table_rows is not None:
+            self.table_rows += self._row_count - start
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page_no = self._row_count // self.page_size
+        rows = self._load_page(page_no)[1]
+        if rows.row_count < self.page_size:
+            self._exhausted = True
+        if not rows.row_count:
+            return
+
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + rows.row_count - 1)
+        self._row_count += rows.row_count
+        self.endInsertRows()
+
+    def locate(self, key):
+        """
+        返回键为 key 的行的行号（按当前的排序和过滤条件），行不存在或被过滤掉时返回 None
+        行还没有加载时直接读取它所在的页（按 OFFSET），并把行数增加到该页末尾
+        """
+        if not self.key_columns:
+            return None
+        position = self.db.row_position(self.table_name, self.key_columns, key, order_by=self.order_by,
+                                        descending=self.descending, filters=self.filters)
+        if position is None:
+            return None
+        if position >= self._row_count:
+            if self._exhausted:
+                return None  # 统计行数之后新增的行
+            page_no = position // self.page_size
+            rows = self._load_page(page_no)[1]
+            end = page_no * self.page_size + rows.row_count
+            if rows.row_count < self.page_size:
+                self._exhausted = True
+            if end <= position:
+                return None
+            self.beginInsertRows(QModelIndex(), self._row_count, end - 1)
+            self._row_count = end
+            self.endInsertRows()
+        return position
+
+    def row_values(self, row):
+        page_no, offset = divmod(row, self.page_size)
+        return self._page(page_no)[1].row(offset)
+
+    def row_key(self, row):
+        """返回某行的真实键（rowid 或主键值组成的元组），无法定位行时返回 None"""
+        page_no, offset = divmod(row, self.page_size)
+        keys = self._page(page_no)[0]
+        return keys.row(offset) if keys is not None else None
+
+    def sample_row_indices(self, count=200):
+        """从已缓存的页中随机抽取行号（不读取数据库），供列宽估算使用"""
+        rows = [page_no * self.page_size + offset
+                for page_no, (_, page_rows) in self._pages.items() for offset in range(page_rows.row_count)]
+        return sorted(random.sample(rows, min(count, len(rows))))
+
+    def has_row(self, row):
+        page_no, offset = divmod(row, self.page_size)
+        return offset < self._page(page_no)[1].row_count
+
+    def _page(self, page_no):
+        page = self._pages.get(page_no)
+        if page is not None:
+            self._pages.move_to_end(page_no)
+            return page
+        # 该页已被淘汰或还没有读过
+        self._load_page(page_no)
+        return self._pages[page_no]
+
+    def _load_page(self, page_no):
+        # 知道起始游标时按键集读取，否则按 OFFSET 读取；读完后记下下一页的起始游标
+        after = self._page_starts.get(page_no)
+        keys, rows, next_after = self._read_page(page_no, after)
+        if len(rows) == self.page_size and self.key_columns:
+            self._page_starts[page_no + 1] = next_after
+        return self._store_page(page_no, keys, rows)
+
+    def _read_page(self, page_no, after):
+        return self.db.fetch_page(self.table_name, self.key_columns, after=after,
+                                  limit=self.page_size, offset=page_no * self.page_size,
+                                  order_by=self.order_by, descending=self.descending, filters=self.filters)
+
+    def _store_page(self, page_no, keys, rows):
+        # 按列存储，fetch_page 返回的元组随即释放
+        page = (None if keys is None else ColumnarResult.from_rows(self.key_columns, keys),
+                ColumnarResult.from_rows(self.headers, rows))
+        self._pages[page_no] = page
+        self._pages.move_to_end(page_no)
+        while len(self._pages) > self.max_cached_pages:
+            self._pages.popitem(last=False)
+        return page
+
+
+class ResultTableModel(QAbstractTableModel):
+    """
+    自定义 SQL 查询结果的只读表格模型
+    结果按列存储在 ChunkedResult 中（后台查询的每批行为一块），显示时直接从中读取，不展开为行；
+    结果来自结果缓存时与缓存共用同一个 ChunkedResult
+    """
+
+    def __init__(self, headers, rows=None, query=None, result=None, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.result = result if result is not None else ChunkedResult(headers)
+        if rows:
+            self.result.append(ColumnarResult.from_rows(headers, rows))
+        self.query = query  # 产生这些结果的查询，用于导出
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.result.row_count
+
+    def value(self, row, column):
+        return self.result.value(row, column)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else QVariant()
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return QVariant()
+        value = self.value(index.row(), index.column())
+        if role == Qt.DisplayRole:
+            return display_text(value)
+        return "" if value is None else str(value)
+
+    def append_rows(self, chunk):
+        # 追加后台查询流式返回的一批行（已在工作线程中转换为 ColumnarResult）
+        if not chunk.row_count:
+            return
+        self.beginInsertRows(QModelIndex(), self.result.row_count, self.result.row_count + chunk.row_count - 1)
+        self.result.append(chunk)
+        self.endInsertRows()
+
+    def sample_row_indices(self, count=200):
+        rows = self.rowCount()
+        return sorted(random.sample(range(rows), min(count, rows)))
+
+
+class DiffTableModel(ResultTableModel):
+    """
+    两个库中一个表的差异（table_diff.DiffRow 列表）：第一列为变化类型，其后是该行在新库中的值（删除的行为旧库中的值）
+    新增的行显示为绿色，删除的行为红色加删除线，修改的单元格为黄色，鼠标悬停显示原值
+    """
+
+    def __init__(self, headers, key_columns, rows, parent=None):
+        super().__init__(["变化"] + list(headers), parent=parent)
+        self.rows = list(rows)
+        self.key_columns = list(key_columns)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def value(self, row, column):
+        diff = self.rows[row]
+        if column == 0:
+            return DIFF_KINDS[diff.kind]
+        return (diff.old if diff.kind == "delete" else diff.new)[column - 1]
+
+    def _changed(self, diff, column):
+        if diff.kind != "update" or column == 0:
+            return False
+        old, new = diff.old[column - 1], diff.new[column - 1]
+        return old != new or type(old) != type(new)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return super().data(index, role)
+        diff = self.rows[index.row()]
+        if role == Qt.BackgroundRole:
+            if diff.kind == "insert":
+                return INSERTED_ROW_BRUSH
+            if diff.kind == "delete":
+                return DELETED_ROW_BRUSH
+            return DIRTY_CELL_BRUSH if self._changed(diff, index.column()) else QVariant()
+        if role == Qt.FontRole and diff.kind == "delete":
+            font = QFont()
+            font.setStrikeOut(True)
+            return font
+        if role == Qt.ToolTipRole and self._changed(diff, index.column()):
+            old, new = diff.old[index.column() - 1], diff.new[index.column() - 1]
+            if type(old) != type(new):
+                return f"原值: {display_text(old)}（{_SQL_TYPE_NAMES.get(type(old), '?')}）"
+            return f"原值: {display_text(old)}"
+        return QVariant()
@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connector import DBConnector  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """一个小的测试库：items 表（rowid 表，score 列含 NULL）"""
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, score INTEGER)")
+    conn.executemany("INSERT INTO items (id, name, score) VALUES (?, ?, ?)",
+                     [(i, f"item{i}", None if i % 4 == 0 else i % 7) for i in range(1, 31)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    connector = DBConnector(db_path)
+    yield connector
+    connector.close()
+
+
+def read_all(path, sql, params=()):
+    """用独立的连接读取，只能看到已提交的数据"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
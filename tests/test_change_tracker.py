@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import change_tracker
+from change_tracker import OWNER, ChangeTracker, changelog_name, remove_stale_objects, trigger_names
+from conftest import read_all
+
+
+def watch_objects(path):
+    return {name for name, in read_all(path, "SELECT name FROM sqlite_master WHERE name LIKE '\\_dbviewer%' ESCAPE '\\'")}
+
+
+def install_foreign_triggers(path, owner):
+    """模拟另一个程序（owner）监视 items 表时留下的触发器和日志表"""
+    conn = sqlite3.connect(path)
+    log = changelog_name(owner)
+    conn.execute(f'CREATE TABLE "{log}" (seq INTEGER PRIMARY KEY, tbl, op, key)')
+    conn.execute(f'CREATE TRIGGER "{trigger_names("items", owner)[0]}" AFTER INSERT ON items BEGIN '
+                 f'INSERT INTO "{log}" (tbl, op, key) VALUES (\'items\', \'insert\', NEW.id); END')
+    conn.commit()
+    conn.close()
+    return {log, trigger_names("items", owner)[0]}
+
+
+def dead_owner():
+    process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    return f"{OWNER.partition('p')[0]}p{int(process.stdout)}"
+
+
+def test_read_changes_counts_inserts_and_updates_separately(db, db_path):
+    tracker = ChangeTracker(db, "items")
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE items SET name = 'x' WHERE id IN (1, 2)")
+    conn.execute("INSERT INTO items (id, name) VALUES (100, 'new')")
+    conn.execute("UPDATE items SET name = 'y' WHERE id = 100")
+    conn.execute("DELETE FROM items WHERE id = 3")
+    conn.commit()
+    conn.close()
+    changes = tracker.read_changes()
+    assert changes.updated == {(1,), (2,), (100,)}
+    assert changes.deleted == {(3,)}
+    assert (changes.inserted, changes.modified) == (1, 2)
+    assert tracker.close()
+    assert watch_objects(db_path) == set()
+
+
+def test_close_with_pending_transaction_leaves_triggers_until_commit(db, db_path):
+    tracker = ChangeTracker(db, "items")
+    db.conn.execute("UPDATE items SET name = 'pending' WHERE id = 1")
+    assert not tracker.close()
+    assert remove_stale_objects(db) is None
+    db.rollback()
+    assert set(trigger_names("items")) <= watch_objects(db_path)
+    assert remove_stale_objects(db) == 3
+    assert watch_objects(db_path) == set()
+
+
+def test_stale_cleanup_keeps_objects_of_running_programs(db, db_path):
+    alive = install_foreign_triggers(db_path, f"{OWNER.partition('p')[0]}p{os.getppid()}")
+    other_host = install_foreign_triggers(db_path, f"{'0' * 8}p1")
+    gone = install_foreign_triggers(db_path, dead_owner())
+    legacy = "_dbviewer_watch_items_insert"
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TRIGGER {legacy} AFTER INSERT ON items BEGIN SELECT 1; END")
+    conn.commit()
+    conn.close()
+    ChangeTracker(db, "items")  # 本程序仍在监视
+    assert remove_stale_objects(db, keep=("items",)) == 1
+    objects = watch_objects(db_path)
+    assert alive <= objects and other_host <= objects and legacy in objects
+    assert not gone & objects
+    assert set(trigger_names("items")) | {changelog_name()} <= objects
+
+
+def test_process_alive():
+    assert change_tracker._process_alive(os.getpid())
+    assert not change_tracker._process_alive(int(dead_owner().partition("p")[2]))
@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import read_all
+from edit_buffer import EditBuffer
+
+
+def test_flush_does_not_commit(db, db_path):
+    buffer = EditBuffer()
+    buffer.set_cell("items", ["id"], (1,), "name", "CHANGED")
+    buffer.delete_rows("items", ["id"], [(2,)])
+    buffer.flush(db)
+    assert buffer.is_empty()
+    assert db.conn.in_transaction
+    db.rollback()
+    assert read_all(db_path, "SELECT name FROM items WHERE id = 1") == [("item1",)]
+    assert read_all(db_path, "SELECT count(*) FROM items") == [(30,)]
+
+
+def test_flush_then_commit_persists(db, db_path):
+    buffer = EditBuffer()
+    buffer.set_cell("items", ["id"], (1,), "name", "CHANGED")
+    buffer.insert_row("items", ["id", "name"], [100, "new"])
+    buffer.flush(db)
+    db.commit()
+    assert read_all(db_path, "SELECT name FROM items WHERE id IN (1, 100) ORDER BY id") == [("CHANGED",), ("new",)]
+
+
+def test_failed_flush_keeps_buffer_and_earlier_writes_uncommitted(db, db_path):
+    first = EditBuffer()
+    first.set_cell("items", ["id"], (1,), "name", "CHANGED")
+    first.flush(db)
+    second = EditBuffer()
+    second.set_cell("items", ["id"], (3,), "name", "ALSO CHANGED")
+    second.set_cell("items", ["id"], (2,), "name", None)  # 违反 NOT NULL
+    with pytest.raises(Exception):
+        second.flush(db)
+    assert not second.is_empty()
+    # 第二次写入回滚到保存点，第一次写入仍未提交，回滚后什么都没有保存
+    assert db.conn.in_transaction
+    db.rollback()
+    assert read_all(db_path, "SELECT name FROM items WHERE id IN (1, 2, 3) ORDER BY id") == [
+        ("item1",), ("item2",), ("item3",)]
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+
+import pytest
+
+from exporter import export_query
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a, b, c, d)")
+    yield conn
+    conn.close()
+
+
+def export(conn, tmp_path, batch_size=2):
+    path = str(tmp_path / "out.parquet")
+    statements = []
+    conn.set_trace_callback(statements.append)
+    rows = export_query(conn, "SELECT * FROM t ORDER BY rowid", path, "parquet", batch_size=batch_size)
+    conn.set_trace_callback(None)
+    assert len(statements) == 1  # 结果只读取一遍
+    assert sorted(os.listdir(tmp_path)) == ["out.parquet"]
+    return rows, pq.read_table(path)
+
+
+def test_types_from_first_batch(conn, tmp_path):
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", [(i, i / 2, f"s{i}", bytes([i])) for i in range(5)])
+    rows, table = export(conn, tmp_path)
+    assert rows == 5
+    assert [str(field.type) for field in table.schema] == ["int64", "double", "string", "binary"]
+    assert table.column("a").to_pylist() == [0, 1, 2, 3, 4]
+
+
+def test_later_batches_promote_written_columns(conn, tmp_path):
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", [
+        (1, 1, None, b"\x00"),
+        (2, 2.5, None, b"\x01"),
+        (3.5, 3, 7, b"\x02"),
+        (4, "x", None, "text"),
+    ])
+    rows, table = export(conn, tmp_path)
+    assert rows == 4
+    assert [str(field.type) for field in table.schema] == ["double", "string", "int64", "string"]
+    assert table.column("a").to_pylist() == [1.0, 2.0, 3.5, 4.0]
+    # float64 列改为文本时，原来的整数仍写成整数
+    assert table.column("b").to_pylist() == ["1", "2.5", "3", "x"]
+    assert table.column("c").to_pylist() == [None, None, 7, None]
+    assert table.column("d").to_pylist() == ["AA==", "AQ==", "Ag==", "text"]
+
+
+def test_large_integers_mixed_with_reals_become_text(conn, tmp_path):
+    conn.executemany("INSERT INTO t (a) VALUES (?)", [(1,), (2 ** 60,), (0.5,)])
+    _, table = export(conn, tmp_path, batch_size=1)
+    assert str(table.schema.field("a").type) == "string"
+    assert table.column("a").to_pylist() == ["1", str(2 ** 60), "0.5"]
+
+
+def test_empty_result_exports_text_columns(conn, tmp_path):
+    rows, table = export(conn, tmp_path)
+    assert rows == 0
+    assert table.num_rows == 0
+    assert [str(field.type) for field in table.schema] == ["string"] * 4
+
+
+def test_failed_export_leaves_no_files(conn, tmp_path):
+    conn.execute("INSERT INTO t (a) VALUES (1)")
+    with pytest.raises(sqlite3.OperationalError):
+        export_query(conn, "SELECT a, no_such_function(a) FROM t", str(tmp_path / "out.parquet"), "parquet")
+    assert os.listdir(tmp_path) == []
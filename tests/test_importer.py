@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from importer import import_file
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_text("id,name\n" + "".join(f"{i},name {i}\n" for i in range(1, 101)), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def target(tmp_path):
+    path = str(tmp_path / "target.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE INDEX items_name ON items (name)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_fast_import_keeps_journal_mode_while_others_are_connected(csv_path, target):
+    other = sqlite3.connect(target)
+    other.execute("SELECT count(*) FROM items").fetchone()
+    conn = sqlite3.connect(target, isolation_level=None)
+    try:
+        conn.execute("PRAGMA synchronous = FULL")
+        rows, _ = import_file(target, csv_path, "items", fast=True, conn=conn)
+        assert rows == 100
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+        assert other.execute("SELECT count(*) FROM items").fetchone()[0] == 100
+    finally:
+        conn.close()
+        other.close()
+
+
+def test_fast_import_rebuilds_indexes_and_restores_synchronous_on_failure(csv_path, target):
+    conn = sqlite3.connect(target, isolation_level=None)
+    try:
+        conn.execute("INSERT INTO items VALUES (50, 'taken')")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        with pytest.raises(sqlite3.IntegrityError):
+            import_file(target, csv_path, "items", fast=True, conn=conn)
+        assert conn.execute("SELECT count(*) FROM items").fetchone()[0] == 1
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert [row[1] for row in conn.execute("PRAGMA index_list(items)")] == ["items_name"]
+    finally:
+        conn.close()
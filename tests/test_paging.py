@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from db_connector import DBConnector, build_filter
+from conftest import read_all
+
+
+def page_through(db, table_name="items", key_columns=("rowid",), limit=7, **kwargs):
+    """按 after 游标逐页读取全部行，返回各行的键"""
+    keys, after = [], None
+    while True:
+        page_keys, rows, after = db.fetch_page(table_name, list(key_columns), after=after, limit=limit, **kwargs)
+        keys.extend(page_keys)
+        if len(rows) < limit:
+            return keys
+
+
+def expected(db_path, order_by=None, descending=False, where="1"):
+    direction = "DESC" if descending else "ASC"
+    order = f"{order_by} {direction}, id {direction}" if order_by else f"id {direction}"
+    return [row[0] for row in read_all(db_path, f"SELECT id FROM items WHERE {where} ORDER BY {order}")]
+
+
+CASES = [
+    (None, False, None, "1"),
+    (None, True, None, "1"),
+    ("score", False, None, "1"),  # score 含 NULL
+    ("score", True, None, "1"),
+    ("name", True, None, "1"),
+    ("score", False, ("name", "item1"), "name LIKE '%item1%'"),
+    ("score", True, ("score", ">=3"), "score >= 3"),
+    (None, True, ("score", "NULL"), "score IS NULL"),
+]
+
+
+@pytest.mark.parametrize("order_by, descending, filter_text, where", CASES)
+def test_fetch_page_visits_every_row_in_order(db, db_path, order_by, descending, filter_text, where):
+    filters = [build_filter(*filter_text)] if filter_text else []
+    keys = page_through(db, order_by=order_by, descending=descending, filters=filters)
+    assert [key[0] for key in keys] == expected(db_path, order_by, descending, where)
+
+
+@pytest.mark.parametrize("order_by, descending, filter_text, where", CASES)
+def test_row_position_matches_paging_order(db, db_path, order_by, descending, filter_text, where):
+    filters = [build_filter(*filter_text)] if filter_text else []
+    order = expected(db_path, order_by, descending, where)
+    for position, row_id in enumerate(order):
+        assert db.row_position("items", ["rowid"], (row_id,), order_by, descending, filters) == position
+    hidden = set(range(1, 31)) - set(order)
+    for row_id in hidden:
+        assert db.row_position("items", ["rowid"], (row_id,), order_by, descending, filters) is None
+
+
+def test_fetch_page_pages_without_rowid_tables_by_primary_key(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE pairs (a TEXT, b INTEGER, PRIMARY KEY (a, b)) WITHOUT ROWID")
+    conn.executemany("INSERT INTO pairs VALUES (?, ?)", [(a, b) for a in "xyz" for b in range(5)])
+    conn.commit()
+    conn.close()
+    db = DBConnector(db_path)
+    key_columns = db.get_row_key_columns("pairs")
+    assert key_columns == ["a", "b"]
+    assert page_through(db, "pairs", key_columns, limit=4) == [(a, b) for a in "xyz" for b in range(5)]
+    assert page_through(db, "pairs", key_columns, limit=4, order_by="b", descending=True) == \
+        [(a, b) for b in reversed(range(5)) for a in "zyx"]
+    db.close()
+
+
+def test_fetch_page_uses_offset_without_key_columns(db):
+    db.conn.execute("CREATE VIEW odd_items AS SELECT * FROM items WHERE id % 2 = 1")
+    assert db.get_row_key_columns("odd_items") == []
+    keys, rows, after = db.fetch_page("odd_items", [], limit=5, offset=5)
+    assert keys is None and after is None
+    assert [row[0] for row in rows] == [11, 13, 15, 17, 19]
+
+
+def test_paging_sees_uncommitted_edits(db, db_path):
+    with db.writing():
+        db.conn.execute("UPDATE items SET score = 100 WHERE id = 8")
+    assert page_through(db, order_by="score", descending=True)[0] == (8,)
+    assert db.row_position("items", ["rowid"], (8,), "score", True) == 0
+    db.rollback()
+    assert [key[0] for key in page_through(db, order_by="score", descending=True)] == expected(db_path, "score", True)
@@ -0,0 +1,62 @@
+import pytest
+
+from result_cache import ChunkedResult, ColumnarResult, ResultCache, is_cacheable_query
+
+
+def make_result(rows):
+    return ChunkedResult(["value"], [ColumnarResult.from_rows(["value"], rows)])
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT random()",
+    "SELECT randomblob(4)",
+    "SELECT changes(), total_changes(), last_insert_rowid()",
+    "SELECT strftime('%f', 'now')",
+    "SELECT date('NOW')",
+    "SELECT date()",
+    "SELECT datetime( )",
+    "SELECT time(), julianday(), unixepoch()",
+    "SELECT strftime('%s')",
+    "SELECT strftime(?)",
+    "SELECT CURRENT_TIMESTAMP",
+])
+def test_non_deterministic_queries_are_not_cacheable(sql):
+    assert not is_cacheable_query(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM orders",
+    "SELECT date(created) FROM orders",
+    "SELECT strftime('%Y', created) FROM orders",
+    "SELECT julianday('2024-01-01')",
+    "SELECT 'random()' -- random()",
+    "SELECT [current_time] FROM t",
+])
+def test_deterministic_queries_are_cacheable(sql):
+    assert is_cacheable_query(sql)
+
+
+def test_cache_hit_and_version_change():
+    cache = ResultCache()
+    result = make_result([(1,)])
+    assert cache.put("SELECT 1", (), 1, result)
+    assert cache.get("select  1;", (), 1) is result
+    assert cache.get("SELECT 1", (), 2) is None
+
+
+def test_non_deterministic_query_is_not_stored():
+    cache = ResultCache()
+    assert not cache.put("SELECT random()", (), 1, make_result([(1,)]))
+    assert cache.get("SELECT random()", (), 1) is None
+    assert len(cache) == 0
+
+
+def test_parameter_types_are_part_of_the_key():
+    cache = ResultCache()
+    cache.put("SELECT typeof(?)", (1,), 1, make_result([("integer",)]))
+    assert cache.get("SELECT typeof(?)", (1.0,), 1) is None
+    assert cache.get("SELECT typeof(?)", (True,), 1) is None
+    assert cache.get("SELECT typeof(?)", (1,), 1) is not None
+    cache.put("SELECT typeof(:v)", {"v": 1}, 1, make_result([("integer",)]))
+    assert cache.get("SELECT typeof(:v)", {"v": 1.0}, 1) is None
+    assert cache.get("SELECT typeof(:v)", {"v": 1}, 1) is not None
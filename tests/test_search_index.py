@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from edit_buffer import EditBuffer
+from search_index import SearchIndex, changed_rowids
+
+
+@pytest.fixture
+def source(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "source.db"))
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+    conn.executemany("INSERT INTO notes VALUES (?, ?)", [(i, f"note {i}") for i in range(1, 5001)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def index(tmp_path, source):
+    search_index = SearchIndex(str(tmp_path / "source.db.fts"))
+    search_index.set_tables({"notes": (["body"], ["rowid"])})
+    search_index.sync(source)
+    yield search_index
+    search_index.close()
+
+
+def found(index, text):
+    return sorted(hit.key[0] for hit in index.search(text))
+
+
+def test_sync_with_changes_rebuilds_only_the_touched_chunks(index, source):
+    source.execute("UPDATE notes SET body = 'alpha' WHERE id = 1500")
+    source.execute("UPDATE notes SET body = 'alpha' WHERE id = 3500")  # 不在 changes 中
+    source.execute("INSERT INTO notes (body) VALUES ('alpha')")  # 末尾的新行
+    source.commit()
+    assert index.sync(source, changes={"notes": {1500}}) == 2
+    assert found(index, "alpha") == [1500, 5001]
+    assert index.sync(source) == 1
+    assert found(index, "alpha") == [1500, 3500, 5001]
+
+
+def test_sync_with_changes_removes_deleted_chunks_in_range(index, source):
+    source.execute("DELETE FROM notes WHERE id BETWEEN 2000 AND 2999")
+    source.commit()
+    index.sync(source, changes={"notes": {2500}})
+    assert found(index, "note 2500") == []
+    assert found(index, "note 1999") == [1999]
+
+
+def test_sync_with_changes_skips_other_tables(index, source):
+    source.execute("UPDATE notes SET body = 'alpha' WHERE id = 10")
+    source.commit()
+    assert index.sync(source, changes={"other": None}) == 0
+    assert found(index, "alpha") == []
+
+
+def test_changed_rowids_from_edit_buffer():
+    buffer = EditBuffer()
+    buffer.set_cell("notes", ["rowid"], (7,), "body", "x")
+    buffer.delete_rows("notes", ["rowid"], [(8,)])
+    buffer.insert_row("notes", ["id", "body"], [9000, "y"])
+    buffer.insert_row("notes", ["body"], ["z"])
+    keys, inserts = buffer.touched_rows()["notes"]
+    assert changed_rowids(keys, inserts, "id") == {7, 8, 9000}
+    assert changed_rowids(keys, inserts) == {7, 8}
+
+
+def test_touched_rows_includes_new_key_after_key_edit():
+    buffer = EditBuffer()
+    buffer.set_cell("t", ["code"], ("a",), "code", "b")
+    assert buffer.touched_rows()["t"][0] == {("a",), ("b",)}
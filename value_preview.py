@@ -0,0 +1,230 @@
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPlainTextEdit,
+                             QStackedWidget, QScrollArea, QPushButton, QFileDialog, QMessageBox)
+from PyQt5.QtGui import QFontDatabase, QPixmap
+from PyQt5.QtCore import Qt, pyqtSignal
+from db_connector import format_size
+
+# 常见图片格式的文件头
+_IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a", b"GIF89a", b"BM")
+
+
+def format_hex(data, offset=0):
+    """按 "偏移  16 个字节的十六进制  ASCII" 的格式逐行显示"""
+    lines = []
+    for start in range(0, len(data), 16):
+        chunk = data[start:start + 16]
+        hex_part = " ".join(f"{byte:02x}" for byte in chunk)
+        text_part = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+        lines.append(f"{offset + start:08x}  {hex_part:<47}  {text_part}")
+    return "\n".join(lines)
+
+
+def looks_like_image(head):
+    return head.startswith(_IMAGE_SIGNATURES) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+
+
+def looks_like_text(head):
+    """开头部分是否为 UTF-8 文本（允许最后一个字符被截断）"""
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e.start >= len(head) - 3
+    return True
+
+
+class ValuePreviewPanel(QWidget):
+    """
+    单元格值预览面板
+    表中的值通过 DBConnector.open_value() 按需读取：十六进制只读取开头 HEX_BYTES，文本只读取开头 TEXT_BYTES，
+    只有切换到图片时才读取整个值（不超过 IMAGE_BYTES）；查询结果中的值已在内存中，直接显示
+    "从文件替换" 通过增量 BLOB I/O 写回（不提交），完成后发出 valueReplaced
+    """
+
+    valueReplaced = pyqtSignal(str)  # 表名
+
+    HEX_BYTES = 64 * 1024
+    TEXT_BYTES = 256 * 1024
+    IMAGE_BYTES = 32 * 1024 * 1024
+    MODES = ("自动", "十六进制", "文本", "图片")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.db = None
+        self._target = None  # (表名, 列名, 键列, 键)
+        self._value = None  # 查询结果中的值（bytes）
+        self._kind = None
+        self._size = 0
+        self._head = b""
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        top_layout = QHBoxLayout()
+        self.info_label = QLabel("选择单元格后在此预览")
+        self.info_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(self.MODES)
+        self.mode_combo.currentIndexChanged.connect(self.render)
+        top_layout.addWidget(self.info_label, stretch=1)
+        top_layout.addWidget(self.mode_combo)
+        layout.addLayout(top_layout)
+
+        self.text_view = QPlainTextEdit()
+        self.text_view.setReadOnly(True)
+        self.image_label = QLabel()
+        self.image_label.setAlignment(Qt.AlignCenter)
+        image_area = QScrollArea()
+        image_area.setWidgetResizable(True)
+        image_area.setWidget(self.image_label)
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.text_view)
+        self.stack.addWidget(image_area)
+        layout.addWidget(self.stack)
+
+        button_layout = QHBoxLayout()
+        self.note_label = QLabel()
+        self.save_button = QPushButton("保存到文件...")
+        self.save_button.clicked.connect(self.save_to_file)
+        self.replace_button = QPushButton("从文件替换...")
+        self.replace_button.clicked.connect(self.replace_from_file)
+        button_layout.addWidget(self.note_label, stretch=1)
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.replace_button)
+        layout.addLayout(button_layout)
+        self.clear()
+
+    def clear(self, message="选择单元格后在此预览"):
+        self._target = None
+        self._value = None
+        self._kind = None
+        self._size = 0
+        self._head = b""
+        self.info_label.setText(message)
+        self.note_label.clear()
+        self.text_view.clear()
+        self.image_label.clear()
+        self.stack.setCurrentIndex(0)
+        self.save_button.setEnabled(False)
+        self.replace_button.setEnabled(False)
+
+    def show_cell(self, db, table_name, column_name, key_columns, key, editable=True):
+        """预览表中的一个单元格，只读取开头部分"""
+        self.clear()
+        self.db = db
+        try:
+            with db.open_value(table_name, column_name, key_columns, key) as reader:
+                self._kind = reader.kind
+                self._size = reader.size
+                self._head = reader.read(0, max(self.HEX_BYTES, self.TEXT_BYTES))
+        except Exception as e:
+            self.clear(f"{table_name}.{column_name}: 无法读取 ({e})")
+            return
+        self._target = (table_name, column_name, tuple(key_columns), tuple(key))
+        self.info_label.setText(f"{table_name}.{column_name}  {self._kind.upper()}  {format_size(self._size)}")
+        self.save_button.setEnabled(True)
+        self.replace_button.setEnabled(editable)
+        self.render()
+
+    def show_value(self, title, value):
+        """预览已在内存中的值（查询结果）"""
+        self.clear()
+        if value is None:
+            self._kind, data = "null", b""
+        elif isinstance(value, bytes):
+            self._kind, data = "blob", value
+        else:
+            self._kind = "text" if isinstance(value, str) else type(value).__name__
+            data = str(value).encode("utf-8")
+        self._value = data
+        self._size = len(data)
+        self._head = data[:max(self.HEX_BYTES, self.TEXT_BYTES)]
+        self.info_label.setText(f"{title}  {self._kind.upper()}  {format_size(self._size)}")
+        self.save_button.setEnabled(True)
+        self.render()
+
+    def _read_all(self, limit):
+        if self._value is not None:
+            return self._value[:limit]
+        if self._size <= len(self._head):
+            return self._head
+        with self.db.open_value(*self._target) as reader:
+            chunks = []
+            for offset in range(0, min(self._size, limit), 1024 * 1024):
+                chunks.append(reader.read(offset, min(1024 * 1024, limit - offset)))
+            return b"".join(chunks)
+
+    def current_mode(self):
+        mode = self.MODES[self.mode_combo.currentIndex()]
+        if mode != "自动":
+            return mode
+        if self._kind == "blob" and looks_like_image(self._head[:16]):
+            return "图片"
+        if self._kind != "blob" or looks_like_text(self._head[:4096]):
+            return "文本"
+        return "十六进制"
+
+    def render(self, *args):
+        if self._kind is None:
+            return
+        mode = self.current_mode()
+        self.note_label.clear()
+        if mode == "图片":
+            self.stack.setCurrentIndex(1)
+            if self._size > self.IMAGE_BYTES:
+                self.image_label.setText(f"图片超过 {format_size(self.IMAGE_BYTES)}，请保存到文件后查看")
+                return
+            try:
+                data = self._read_all(self.IMAGE_BYTES)
+            except Exception as e:
+                self.image_label.setText(f"无法读取: {e}")
+                return
+            pixmap = QPixmap()
+            if pixmap.loadFromData(data):
+                self.image_label.setPixmap(pixmap)
+                self.note_label.setText(f"{pixmap.width()} x {pixmap.height()}")
+            else:
+                self.image_label.setText("无法识别的图片格式")
+            return
+
+        self.stack.setCurrentIndex(0)
+        font = QFontDatabase.systemFont(QFontDatabase.FixedFont) if mode == "十六进制" else self.font()
+        self.text_view.setFont(font)
+        self.text_view.setLineWrapMode(QPlainTextEdit.NoWrap if mode == "十六进制" else QPlainTextEdit.WidgetWidth)
+        limit = self.HEX_BYTES if mode == "十六进制" else self.TEXT_BYTES
+        data = self._head[:limit]
+        if mode == "十六进制":
+            self.text_view.setPlainText(format_hex(data))
+        else:
+            self.text_view.setPlainText(data.decode("utf-8", errors="replace"))
+        if self._size > len(data):
+            self.note_label.setText(f"只显示前 {format_size(len(data))}，完整内容请保存到文件")
+
+    def save_to_file(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "保存值到文件", "", "所有文件 (*)")
+        if not file_name:
+            return
+        try:
+            if self._value is not None:
+                with open(file_name, "wb") as f:
+                    f.write(self._value)
+            else:
+                self.db.save_value_to_file(*self._target, file_name)
+        except Exception as e:
+            QMessageBox.warning(self, "保存失败", str(e))
+
+    def replace_from_file(self):
+        if self._target is None:
+            return
+        file_name, _ = QFileDialog.getOpenFileName(self, "选择文件", "", "所有文件 (*)")
+        if not file_name:
+            return
+        table_name, column_name, key_columns, key = self._target
+        try:
+            self.db.write_value_from_file(table_name, column_name, key_columns, key, file_name,
+                                          as_text=self._kind == "text")
+        except Exception as e:
+            QMessageBox.warning(self, "替换失败", str(e))
+            return
+        self.show_cell(self.db, table_name, column_name, key_columns, key)
+        self.valueReplaced.emit(table_name)